@@ -0,0 +1,148 @@
+"""Login for the custom User table.
+
+``authenticate`` verifies a password with Django's hashers. Accounts still
+holding a legacy plaintext password are verified once by constant-time
+comparison and rehashed on that login; hashes made with outdated hasher
+parameters are upgraded the same way. An unknown username still pays for one
+hash, so every login attempt costs about one hasher run.
+
+``last_login`` is not written by the login request. ``last_login_writer``
+collects login times in memory and a background thread writes them in one
+UPDATE per ``FLUSH_INTERVAL`` (or per ``MAX_PENDING`` logins); it is flushed
+again at interpreter exit.
+"""
+import atexit
+import logging
+import threading
+
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5
+MAX_PENDING = 500
+
+
+class LoginError(Exception):
+    pass
+
+
+def is_hashed(password_hash):
+    try:
+        identify_hasher(password_hash)
+    except ValueError:
+        return False
+    return True
+
+
+def _store_hash(user, password):
+    # Only replaces the value that was verified, so a concurrent password
+    # change is never overwritten
+    new_hash = make_password(password)
+    User.objects.filter(user_id=user.user_id, password_hash=user.password_hash).update(password_hash=new_hash)
+    user.password_hash = new_hash
+
+
+def verify_password(user, password):
+    """Check ``password``; legacy plaintext and outdated hashes are rehashed"""
+    if not is_hashed(user.password_hash):
+        if not constant_time_compare(password, user.password_hash):
+            return False
+        _store_hash(user, password)
+        return True
+    return check_password(password, user.password_hash, setter=lambda raw: _store_hash(user, raw))
+
+
+def authenticate(username, password):
+    """The Active user with these credentials; LoginError otherwise"""
+    user = User.objects.only(
+        'user_id', 'username', 'password_hash', 'role', 'account_status'
+    ).filter(username=username).first()
+    if user is None:
+        # Same hasher cost as a real account
+        make_password(password)
+        raise LoginError('User not found')
+    if user.account_status != 'Active':
+        raise LoginError('Account is not active')
+    if not verify_password(user, password):
+        raise LoginError('Invalid password')
+    last_login_writer.record(user.user_id)
+    return user
+
+
+class LastLoginWriter:
+    """Buffers login times and writes them in batches from a background thread"""
+
+    def __init__(self, interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, when=None):
+        with self._lock:
+            self._pending[user_id] = when or timezone.now()
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='last-login-writer', daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every buffered login time in one UPDATE; returns rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        user_ids = list(pending)
+        cases = ' '.join(['WHEN %s THEN %s'] * len(user_ids))
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        # Stored the way the ORM stores User.last_login
+        params = [
+            value for user_id in user_ids
+            for value in (user_id, connection.ops.adapt_datetimefield_value(pending[user_id]))
+        ]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE User SET Last_Login = CASE User_ID {cases} END WHERE User_ID IN ({placeholders})',
+                    params + user_ids
+                )
+        except Exception:
+            # Kept for the next flush unless a newer login replaced it
+            with self._lock:
+                for user_id, when in pending.items():
+                    self._pending.setdefault(user_id, when)
+            raise
+        return len(user_ids)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write last_login batch')
+            finally:
+                close_old_connections()
+
+
+last_login_writer = LastLoginWriter()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        last_login_writer.flush()
+    except Exception:
+        logger.exception('Could not write last_login batch at exit')
@@ -0,0 +1,163 @@
+"""Allocation writes that stay correct under concurrent coordinators.
+
+Every transaction that changes an organ's allocation state locks rows in one
+order - the Organ row first, then its Organ_Allocation rows by id - so two
+writers on the same organ queue on the organ lock instead of deadlocking, and
+each re-checks status after acquiring it:
+
+* ``allocate`` locks the organ, checks it is still Available and viable,
+  inserts the Pending allocation and marks the organ Allocated;
+* ``respond`` locks the organ, then the allocation, and records the accept or
+  reject together with the organ's status.
+
+The expiry sweeper follows the same order. Deadlocks and lock-wait timeouts
+can still happen against writers outside this module (procedures, triggers),
+so both operations retry the whole transaction up to ``MAX_ATTEMPTS`` times
+with jittered exponential backoff.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.db.models.functions import Now
+
+from .models import Organ, OrganAllocation, Recipient, RecipientWaitlist
+from .signals import notify_tables_changed
+
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 0.02
+MAX_BACKOFF = 0.5
+# ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+RETRYABLE_ERRORS = (1213, 1205)
+RESPONSES = ('Accepted', 'Rejected')
+
+
+class AllocationError(Exception):
+    pass
+
+
+_stats_lock = threading.Lock()
+_stats = {'retries': 0, 'gave_up': 0}
+
+
+def allocation_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(field):
+    with _stats_lock:
+        _stats[field] += 1
+
+
+def retry_on_deadlock(func):
+    """Re-run ``func`` (which owns its transaction) when MySQL aborts it"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Inside an outer transaction the rollback would not restart anything
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if e.args[0] not in RETRYABLE_ERRORS:
+                    raise
+                if attempt == MAX_ATTEMPTS:
+                    _record('gave_up')
+                    raise
+                _record('retries')
+                backoff = min(BASE_BACKOFF * 2 ** (attempt - 1), MAX_BACKOFF)
+                time.sleep(random.uniform(0, backoff))
+    return wrapper
+
+
+def _lock_organ(organ_id):
+    organ = Organ.objects.select_for_update(of=('self',)).select_related('donor').annotate(
+        remaining=ExpressionWrapper(F('viability_expires_at') - Now(), output_field=DurationField())
+    ).filter(organ_id=organ_id).first()
+    if organ is None:
+        raise AllocationError('Organ not found')
+    return organ
+
+
+@retry_on_deadlock
+def allocate(organ_id, recipient_id):
+    """Pending allocation of an Available organ to a Waiting recipient
+    (the AllocateOrgan procedure, with the organ row locked)"""
+    with transaction.atomic():
+        organ = _lock_organ(organ_id)
+        if organ.status != 'Available':
+            raise AllocationError(f'Organ is not available. Current status: {organ.status}')
+        remaining_hours = organ.remaining.total_seconds() / 3600 if organ.remaining is not None else 0
+        if remaining_hours <= 0:
+            raise AllocationError('Organ has expired')
+
+        recipient_status = Recipient.objects.filter(recipient_id=recipient_id).values_list('status', flat=True).first()
+        if recipient_status is None:
+            raise AllocationError('Recipient not found')
+        if recipient_status != 'Waiting':
+            raise AllocationError(f'Recipient is not waiting. Current status: {recipient_status}')
+        if not RecipientWaitlist.objects.filter(
+            recipient_id=recipient_id, type_name_id=organ.type_name_id, status='Waiting'
+        ).exists():
+            raise AllocationError('Recipient is not on waitlist for this organ type')
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT CalculateCompatibilityScore(%s, %s, %s)',
+                [organ.donor_id, recipient_id, organ.type_name_id]
+            )
+            match_score = cursor.fetchone()[0]
+
+        allocation = OrganAllocation.objects.create(
+            organ_id=organ_id,
+            recipient_id=recipient_id,
+            allocation_date=Now(),
+            match_score=match_score,
+            status='Pending',
+            response_deadline=Now() + (organ.remaining / 2),
+        )
+        Organ.objects.filter(organ_id=organ_id).update(status='Allocated')
+        notify_tables_changed('organ_allocation', 'organ', recipient_ids={int(recipient_id)})
+    return allocation
+
+
+@retry_on_deadlock
+def respond(allocation_id, response):
+    """Accept or reject a Pending allocation and update its organ in the same transaction"""
+    if response not in RESPONSES:
+        raise AllocationError(f'Response must be one of: {", ".join(RESPONSES)}')
+
+    organ_id = OrganAllocation.objects.filter(allocation_id=allocation_id).values_list('organ_id', flat=True).first()
+    if organ_id is None:
+        raise AllocationError('Allocation not found')
+
+    with transaction.atomic():
+        organ = _lock_organ(organ_id)
+        allocation = OrganAllocation.objects.select_for_update().get(allocation_id=allocation_id)
+        if allocation.status != 'Pending':
+            raise AllocationError(f'Cannot respond - allocation is already {allocation.status}')
+
+        holders = OrganAllocation.objects.filter(organ_id=organ_id).exclude(allocation_id=allocation_id)
+        if response == 'Accepted':
+            if organ.status not in ('Available', 'Allocated'):
+                raise AllocationError(f'Organ is no longer available. Current status: {organ.status}')
+            if holders.filter(status='Accepted').exists():
+                raise AllocationError('Organ has already been accepted by another recipient')
+            organ_status = 'Allocated'
+        else:
+            # Offered again unless another allocation still holds it
+            organ_status = organ.status
+            if organ.status == 'Allocated' and not holders.filter(status__in=('Pending', 'Accepted')).exists():
+                organ_status = 'Available'
+
+        OrganAllocation.objects.filter(allocation_id=allocation_id).update(status=response)
+        if organ_status != organ.status:
+            Organ.objects.filter(organ_id=organ_id).update(status=organ_status)
+        notify_tables_changed('organ_allocation', 'organ', recipient_ids={allocation.recipient_id})
+    allocation.status = response
+    return allocation
@@ -0,0 +1,299 @@
+"""Versioned JSON API (``/api/v1/``) for OPO and hospital integrations.
+
+The views are ``async def`` so that under ASGI (``config/asgi.py``) a slow
+request does not pin a worker. Django's ORM and cursors are blocking, so every
+database or procedure call is a job on ``DB_EXECUTOR``: a fixed pool of
+``DB_THREADS`` threads, each with its own connection. Calls that do not depend
+on each other run as separate jobs gathered in one request - the organ detail
+loads the organ, calls ``CheckOrganViability`` and ranks recipients at the
+same time.
+
+At most ``MAX_IN_FLIGHT`` API requests are served at once per process; the
+next one gets 503 with ``Retry-After`` instead of queueing behind the pool.
+The counter is process-wide rather than an asyncio semaphore because under
+WSGI every async view runs in an event loop of its own.
+
+Authentication is the web session (same cookie as the HTML pages); errors are
+JSON ``{"error": ...}`` with 401/403/404/405/503.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+
+from .matching import DEFAULT_MATCH_LIMIT, cached_rank_recipients, remaining_viable_hours
+from .models import Organ, OrganAllocation, Recipient
+from .pagination import paginate_queryset, selected_filters
+from .procedures import cached_procedure_row
+from .views import ALLOCATION_FILTERS, VIABILITY_BUCKETS, organ_type_names, viability_bucket, viability_bucket_filter
+from .waitlist_queue import queue_page
+
+API_VERSION = 'v1'
+DB_THREADS = 8
+MAX_IN_FLIGHT = 64
+MAX_MATCH_LIMIT = 100
+MAX_RADIUS_MILES = 3000
+RETRY_AFTER = 1
+
+STAFF_ROLES = ('Medical_Staff', 'Coordinator', 'Administrator')
+ORGAN_STATUSES = ('Available', 'Allocated', 'Transplanted', 'Expired')
+
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='api-db')
+
+
+def _job(func, *args):
+    # Pool threads live across requests, so they get the request-boundary
+    # connection handling Django gives a request thread
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_db(func, *args):
+    """Run a blocking ORM/cursor call on the DB pool"""
+    return await sync_to_async(_job, thread_sensitive=False, executor=DB_EXECUTOR)(func, *args)
+
+
+# ==================== LIMITS & AUTH ====================
+class InFlight:
+    """Process-wide count of API requests being served"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.current = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.current >= self.limit:
+                return False
+            self.current += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.current -= 1
+
+
+in_flight = InFlight(MAX_IN_FLIGHT)
+
+
+def error(message, status, **headers):
+    response = JsonResponse({'error': message}, status=status)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+class NotFound(Exception):
+    pass
+
+
+def api_view(*allowed_roles):
+    """GET-only async view: concurrency limit, session auth, JSON errors"""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return error('Method not allowed', 405, Allow='GET')
+            if not in_flight.acquire():
+                return error('Too many concurrent API requests', 503, **{'Retry-After': str(RETRY_AFTER)})
+            try:
+                if not await request.session.aget('user_id'):
+                    return error('Authentication required', 401)
+                role = await request.session.aget('role')
+                if allowed_roles and role not in allowed_roles:
+                    return error(f'Only for: {", ".join(allowed_roles)}', 403)
+                return await view_func(request, *args, **kwargs)
+            except NotFound as e:
+                return error(str(e), 404)
+            finally:
+                in_flight.release()
+        return wrapper
+    return decorator
+
+
+# ==================== SERIALIZERS ====================
+def organ_json(organ):
+    return {
+        'organ_id': organ.organ_id,
+        'organ_type': organ.type_name_id,
+        'donor_id': organ.donor_id,
+        'donor_blood_type': organ.donor.blood_type,
+        'hla_type': organ.hla_type,
+        'procuring_hospital_id': organ.procuring_hospital_id,
+        'procurement_date': organ.procurement_date,
+        'procurement_time': organ.procurement_time,
+        'size_weight': organ.size_weight,
+        'status': organ.status,
+        'viability_expires_at': organ.viability_expires_at,
+    }
+
+
+def viability_json(organ):
+    remaining = remaining_viable_hours(organ)
+    return {
+        'remaining_hours': round(remaining, 1),
+        'max_hours': organ.type_name.typical_viability_hours,
+        'status': viability_bucket(remaining),
+    }
+
+
+def allocation_json(allocation):
+    return {
+        'allocation_id': allocation.allocation_id,
+        'organ_id': allocation.organ_id,
+        'organ_type': allocation.organ.type_name_id,
+        'recipient_id': allocation.recipient_id,
+        'recipient_name': allocation.recipient.name,
+        'allocation_date': allocation.allocation_date,
+        'match_score': allocation.match_score,
+        'status': allocation.status,
+        'response_deadline': allocation.response_deadline,
+    }
+
+
+def waitlist_json(entry):
+    return {
+        'recipient_id': entry.recipient_id,
+        'recipient_name': entry.recipient.name,
+        'blood_type': entry.recipient.blood_type,
+        'medical_urgency_level': entry.recipient.medical_urgency_level,
+        'organ_type': entry.type_name_id,
+        'priority_score': entry.priority_score,
+        'wait_list_date': entry.wait_list_date,
+        'meld_score': entry.meld_score,
+        'cpra_score': entry.cpra_score,
+    }
+
+
+def page_json(page, serialize):
+    """Keyset page as results plus the cursors for ?after= / ?before="""
+    return {
+        'results': [serialize(row) for row in page],
+        'next': page.next_cursor,
+        'previous': page.prev_cursor,
+    }
+
+
+# ==================== QUERIES ====================
+def _organs():
+    return Organ.objects.select_related('donor', 'type_name')
+
+
+def _get_organ(organ_id):
+    organ = _organs().filter(organ_id=organ_id).first()
+    if organ is None:
+        raise NotFound(f'Organ {organ_id} not found')
+    return organ
+
+
+def load_organ(organ_id):
+    organ = _get_organ(organ_id)
+    return {**organ_json(organ), 'viability': viability_json(organ)}
+
+
+def check_viability(organ_id):
+    return cached_procedure_row('CheckOrganViability', [organ_id])
+
+
+def load_matches(organ_id, limit, within_miles=None):
+    organ = _get_organ(organ_id)
+    if organ.status == 'Expired':
+        return []
+    return cached_rank_recipients(organ, limit=limit, within_miles=within_miles)
+
+
+def organ_page(query_params):
+    filters = (
+        ('status', 'Status', ORGAN_STATUSES),
+        ('organ_type', 'Organ', organ_type_names()),
+        ('viability', 'Viability', list(VIABILITY_BUCKETS)),
+    )
+    selected = selected_filters(query_params, filters)
+    organs = _organs()
+    if 'status' in selected:
+        organs = organs.filter(status=selected['status'])
+    if 'organ_type' in selected:
+        organs = organs.filter(type_name_id=selected['organ_type'])
+    if 'viability' in selected:
+        organs = organs.filter(viability_bucket_filter(selected['viability']))
+    page = paginate_queryset(organs, ['viability_expires_at', 'organ_id'], query_params)
+    return page_json(page, lambda organ: {**organ_json(organ), 'viability': viability_json(organ)})
+
+
+def allocation_page(query_params, role, user_id):
+    selected = selected_filters(query_params, ALLOCATION_FILTERS)
+    allocations = OrganAllocation.objects.filter(**selected).select_related('organ', 'recipient')
+    if role == 'Recipient':
+        allocations = allocations.filter(recipient__in=Recipient.objects.filter(user_id=user_id))
+    page = paginate_queryset(allocations, ['-allocation_date', '-allocation_id'], query_params)
+    return page_json(page, allocation_json)
+
+
+def waitlist_page(query_params):
+    page = queue_page(query_params, query_params.get('organ_type') or None)
+    return page_json(page, waitlist_json)
+
+
+def match_limit(query_params):
+    try:
+        limit = int(query_params.get('limit', DEFAULT_MATCH_LIMIT))
+    except ValueError:
+        limit = DEFAULT_MATCH_LIMIT
+    return min(max(limit, 1), MAX_MATCH_LIMIT)
+
+
+def match_radius(query_params):
+    """?within_miles= as a whole number of miles, or None for any distance"""
+    try:
+        miles = int(query_params.get('within_miles', ''))
+    except ValueError:
+        return None
+    return min(max(miles, 1), MAX_RADIUS_MILES)
+
+
+# ==================== VIEWS ====================
+@api_view(*STAFF_ROLES)
+async def organ_list(request):
+    """Organs by viability deadline; ?status=, ?organ_type=, ?viability="""
+    return JsonResponse(await run_db(organ_page, request.GET))
+
+
+@api_view(*STAFF_ROLES)
+async def organ_detail(request, organ_id):
+    """Organ, CheckOrganViability and top matches, fetched concurrently"""
+    organ, viability, matches = await asyncio.gather(
+        run_db(load_organ, organ_id),
+        run_db(check_viability, organ_id),
+        run_db(load_matches, organ_id, match_limit(request.GET), match_radius(request.GET)),
+    )
+    organ['viability']['procedure'] = viability
+    return JsonResponse({'organ': organ, 'matches': matches})
+
+
+@api_view(*STAFF_ROLES)
+async def organ_matches(request, organ_id):
+    """Ranked compatible recipients; ?limit= (max 100), ?within_miles= of the procuring hospital"""
+    matches = await run_db(load_matches, organ_id, match_limit(request.GET), match_radius(request.GET))
+    return JsonResponse({'organ_id': organ_id, 'matches': matches})
+
+
+@api_view()
+async def allocation_list(request):
+    """Recipients see their own, staff see all; ?status="""
+    role = await request.session.aget('role')
+    user_id = await request.session.aget('user_id')
+    return JsonResponse(await run_db(allocation_page, request.GET, role, user_id))
+
+
+@api_view()
+async def waitlist(request):
+    """Waiting entries in queue order; ?organ_type="""
+    return JsonResponse(await run_db(waitlist_page, request.GET))
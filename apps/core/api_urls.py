@@ -0,0 +1,12 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('organs/', api.organ_list, name='organ_list'),
+    path('organs/<int:organ_id>/', api.organ_detail, name='organ_detail'),
+    path('organs/<int:organ_id>/matches/', api.organ_matches, name='organ_matches'),
+    path('allocations/', api.allocation_list, name='allocation_list'),
+    path('waitlist/', api.waitlist, name='waitlist'),
+]
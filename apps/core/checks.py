@@ -0,0 +1,22 @@
+"""System checks for settings the in-process caches depend on."""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Backends whose entries are private to one process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f'The default cache ({backend}) is not shared between processes.',
+            hint='Table versions live in the default cache: writes made by other workers or management '
+                 'commands will not reach this process. Point CACHES at Redis or memcached.',
+            id='core.W001',
+        )]
+    return []
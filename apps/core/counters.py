@@ -0,0 +1,96 @@
+"""Aggregate counters for the dashboard tiles.
+
+Every registered counter becomes one scalar subquery of a single SELECT, so the
+whole dashboard costs one round trip however many tiles it has. The result is
+cached for ``COUNTER_TTL`` seconds and recomputed early when any table a
+counter reads changes (see signals.py).
+
+Add a tile by registering its queryset::
+
+    register_counter('pending_surgeries', Surgery.objects.filter(outcome__isnull=True))
+"""
+from django.core.cache import cache
+from django.db import connection
+
+from .models import (
+    Donor, Recipient, Organ, Hospital, MedicalStaff, Surgery, OrganAllocation, RecipientWaitlist
+)
+from .signals import table_versions
+
+COUNTER_TTL = 30
+CACHE_KEY = 'dashboard_counters'
+
+# Roles that see the staff-only tiles
+STAFF_ROLES = ('Administrator', 'Medical_Staff', 'Coordinator')
+
+
+class Counter:
+    """A named COUNT(*) over a queryset, optionally limited to some roles"""
+
+    def __init__(self, name, queryset, roles=None):
+        self.name = name
+        self.queryset = queryset
+        self.roles = roles
+
+    @property
+    def table(self):
+        return self.queryset.model._meta.db_table
+
+    def as_sql(self):
+        sql, params = self.queryset.order_by().values('pk').query.sql_with_params()
+        return f'(SELECT COUNT(*) FROM ({sql}) AS {self.name}_rows) AS {self.name}', params
+
+
+COUNTERS = {}
+
+
+def register_counter(name, queryset, roles=None):
+    COUNTERS[name] = Counter(name, queryset, roles)
+
+
+register_counter('total_donors', Donor.objects.all())
+register_counter('total_recipients', Recipient.objects.all())
+register_counter('total_organs', Organ.objects.all())
+register_counter('total_hospitals', Hospital.objects.all())
+register_counter('available_organs', Organ.objects.filter(status='Available'))
+register_counter('waiting_recipients', Recipient.objects.filter(status='Waiting'))
+register_counter('total_staff', MedicalStaff.objects.all(), roles=STAFF_ROLES)
+register_counter('total_surgeries', Surgery.objects.all(), roles=STAFF_ROLES)
+register_counter('pending_allocations', OrganAllocation.objects.filter(status='Pending'), roles=STAFF_ROLES)
+register_counter('active_waitlist', RecipientWaitlist.objects.filter(status='Waiting'), roles=STAFF_ROLES)
+
+
+def _tables():
+    return sorted({counter.table for counter in COUNTERS.values()})
+
+
+def compute_counters():
+    """Every registered counter in one query"""
+    columns, params = [], []
+    for counter in COUNTERS.values():
+        sql, counter_params = counter.as_sql()
+        columns.append(sql)
+        params.extend(counter_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(columns), params)
+        names = [col[0] for col in cursor.description]
+        return dict(zip(names, cursor.fetchone()))
+
+
+def dashboard_counters(role=None):
+    """Cached counter values, filtered to the tiles ``role`` may see"""
+    tables = _tables()
+    versions = table_versions(*tables)
+    cached = cache.get(CACHE_KEY)
+    if cached is None or cached[0] != (tables, versions) or set(cached[1]) != set(COUNTERS):
+        values = compute_counters()
+        cache.set(CACHE_KEY, ((tables, versions), values), COUNTER_TTL)
+    else:
+        values = cached[1]
+
+    return {
+        name: values[name]
+        for name, counter in COUNTERS.items()
+        if counter.roles is None or role in counter.roles
+    }
@@ -0,0 +1,481 @@
+"""Synthetic dataset generator for local load and benchmark runs.
+
+sample_dataset.sql has a handful of rows; this produces production-like
+volumes (up to millions of rows) that respect the schema's triggers:
+
+* organs are only inserted for Active/Deceased donors with a clearance date
+  (before_organ_insert), which stamps Viability_Expires_At;
+* transplants are written as a Pending offer plus a Surgery row, and
+  after_surgery_insert does the rest - organ and recipient to Transplanted,
+  waitlist rows removed, offer Accepted, first follow-up booked;
+* organs are never moved out of Transplanted/Expired (before_organ_update).
+
+Rows are written with bulk_create, i.e. multi-row INSERTs of ``batch_size``
+rows, one transaction per batch of donors. Keys are assigned up front from the
+current MAX of each table so related rows can be written without reading back
+generated ids. Everything is drawn from one seeded ``random.Random``, so the same
+seed and sizes give the same rows (apart from the keys' offset on a non-empty
+database and the "procured in the last few hours" organs, which are relative to
+now).
+"""
+import random
+from array import array
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.functions import Now
+
+from .hla import set_hla_bits
+from .matching import BLOOD_TYPES, blood_type_score
+from .models import (
+    CompatibilityTest, Donor, FollowUpAppointment, Hospital, HospitalCapabilities,
+    MedicalStaff, Medication, Organ, OrganAllocation, OrganType, Recipient,
+    RecipientMedication, RecipientWaitlist, Surgery,
+)
+from .priority import refresh_priorities
+from .signals import notify_tables_changed
+
+DEFAULT_SEED = 42
+DEFAULT_BATCH_SIZE = 5000
+
+# Same reference rows as sample_dataset.sql
+ORGAN_TYPES = (
+    ('Heart', 6, 4, 'Cardiac organ for heart transplantation', 'Requires specialized cardiac team'),
+    ('Kidney', 36, 30, 'Renal organ for kidney transplantation', 'Can be preserved longer than other organs'),
+    ('Liver', 24, 12, 'Hepatic organ for liver transplantation', 'Requires immediate surgical team availability'),
+    ('Lung', 8, 6, 'Pulmonary organ for lung transplantation', 'Highly time-sensitive'),
+    ('Pancreas', 12, 12, 'Pancreatic organ for diabetes treatment', 'Often transplanted with kidney'),
+)
+MEDICATIONS = (
+    ('Tacrolimus', 'Capsule', '5mg twice daily', 'Immunosuppressant', 'Tremors, headache', 'Astellas'),
+    ('Cyclosporine', 'Capsule', '100mg twice daily', 'Immunosuppressant', 'Kidney issues', 'Novartis'),
+    ('Prednisone', 'Tablet', '10mg daily', 'Corticosteroid', 'Weight gain', 'Pfizer'),
+    ('Mycophenolate', 'Tablet', '1000mg twice daily', 'Immunosuppressant', 'Nausea, diarrhea', 'Roche'),
+    ('Valganciclovir', 'Tablet', '900mg daily', 'Antiviral', 'Low blood counts', 'Genentech'),
+)
+
+# US population shares, in BLOOD_TYPES order
+BLOOD_WEIGHTS = (6.6, 37.4, 6.3, 35.7, 1.5, 8.5, 0.6, 3.4)
+URGENCY_WEIGHTS = (15, 25, 30, 20, 10)
+
+# Share of the waitlist per organ type
+NEED_WEIGHTS = {'Kidney': 60, 'Liver': 20, 'Heart': 7, 'Lung': 9, 'Pancreas': 4}
+# Organs recovered from a deceased donor: (type, probability)
+DECEASED_YIELD = (
+    ('Kidney', 0.9), ('Kidney', 0.85), ('Liver', 0.75),
+    ('Heart', 0.3), ('Lung', 0.25), ('Pancreas', 0.1),
+)
+# Share of hospitals with a transplant program per type (Kidney: all)
+PROGRAM_SHARE = {'Kidney': 1.0, 'Liver': 0.6, 'Heart': 0.35, 'Lung': 0.3, 'Pancreas': 0.4}
+ORGAN_WEIGHT_GRAMS = {'Heart': (250, 350), 'Kidney': (120, 170), 'Liver': (1200, 1600), 'Lung': (800, 1100), 'Pancreas': (70, 100)}
+SURGERY_HOURS = {'Heart': (4, 6), 'Kidney': (3, 4), 'Liver': (6, 12), 'Lung': (6, 10), 'Pancreas': (3, 6)}
+DIAGNOSES = {
+    'Heart': 'Dilated cardiomyopathy',
+    'Kidney': 'End-stage renal disease',
+    'Liver': 'Cirrhosis',
+    'Lung': 'Idiopathic pulmonary fibrosis',
+    'Pancreas': 'Type 1 diabetes',
+}
+
+LIVING_DONOR_SHARE = 0.35
+INACTIVE_DONOR_SHARE = 0.03
+# Organs procured within their viability window, i.e. still Available
+RECENT_ORGAN_SHARE = 0.03
+# Older organs that were transplanted rather than expired
+TRANSPLANT_SHARE = 0.75
+FOLLOW_UP_DAYS = (30, 90, 180, 365)
+
+FIRST_NAMES = ('James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Priya',
+               'Wei', 'Fatima', 'Hiroshi', 'Amara', 'Diego', 'Olga', 'Mohammed', 'Mei', 'Kwame', 'Ana')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+              'Lee', 'Patel', 'Nguyen', 'Kim', 'Chen', 'Singh', 'Okafor', 'Ivanova', 'Tanaka', 'Silva')
+# (city, state, zipcode, latitude, longitude of the zip centroid)
+CITIES = (('Boston', 'MA', '02114', '42.361200', '-71.068300'), ('Baltimore', 'MD', '21287', '39.297500', '-76.592700'),
+          ('Cleveland', 'OH', '44195', '41.502000', '-81.621000'), ('Rochester', 'MN', '55905', '44.022000', '-92.466300'),
+          ('Houston', 'TX', '77030', '29.707300', '-95.401000'), ('Los Angeles', 'CA', '90095', '34.068900', '-118.445200'),
+          ('Pittsburgh', 'PA', '15213', '40.444300', '-79.955300'), ('Chicago', 'IL', '60611', '41.894700', '-87.620500'),
+          ('Nashville', 'TN', '37232', '36.142000', '-86.802000'), ('Seattle', 'WA', '98195', '47.655300', '-122.303500'),
+          ('Atlanta', 'GA', '30322', '33.792500', '-84.324000'), ('Denver', 'CO', '80045', '39.746000', '-104.838000'))
+CAUSES_OF_DEATH = ('Traumatic brain injury', 'Stroke', 'Cardiac arrest', 'Anoxia', 'Motor vehicle accident')
+HLA_A = ('A1', 'A2', 'A3', 'A11', 'A24', 'A26', 'A68')
+HLA_B = ('B7', 'B8', 'B35', 'B44', 'B51', 'B57', 'B62')
+HLA_DR = ('DR1', 'DR3', 'DR4', 'DR7', 'DR11', 'DR13', 'DR15')
+
+
+def _next_id(model):
+    return (model.objects.aggregate(top=Max(model._meta.pk.attname))['top'] or 0) + 1
+
+
+def _chunks(start, count, size):
+    for offset in range(0, count, size):
+        yield range(start + offset, start + min(offset + size, count))
+
+
+class DatasetGenerator:
+    """Appends a synthetic dataset; ``run`` returns rows written per table"""
+
+    def __init__(self, seed=DEFAULT_SEED, batch_size=DEFAULT_BATCH_SIZE, log=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        # Procurement dates/times and the viability deadline are server-local
+        self.now = datetime.now().replace(microsecond=0)
+        self.today = self.now.date()
+        self.counts = {}
+
+    # ==================== HELPERS ====================
+    def _insert(self, model, rows):
+        if rows:
+            model.objects.bulk_create(rows, batch_size=self.batch_size)
+            table = model._meta.db_table
+            self.counts[table] = self.counts.get(table, 0) + len(rows)
+
+    def _name(self):
+        return f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}'
+
+    def _blood_type(self):
+        return self.rng.choices(BLOOD_TYPES, BLOOD_WEIGHTS)[0]
+
+    def _days_ago(self, days):
+        return self.today - timedelta(days=self.rng.randint(0, days))
+
+    def _time(self):
+        return time(self.rng.randint(0, 23), self.rng.choice((0, 15, 30, 45)))
+
+    def _server_time(self, day, at, later=timedelta(0)):
+        """``day`` ``at`` (+ ``later``) as NOW() minus its age, so past offers are
+        on the server clock like the Now() of current ones and the procedures"""
+        return Now() - (self.now - datetime.combine(day, at) - later)
+
+    def _hla(self):
+        return f'{self.rng.choice(HLA_A)}-{self.rng.choice(HLA_B)}-{self.rng.choice(HLA_DR)}'
+
+    # ==================== REFERENCE DATA ====================
+    def _reference_data(self):
+        OrganType.objects.bulk_create(
+            [OrganType(type_name=name, typical_viability_hours=hours, cold_ischemia_time_max=cold,
+                       description=description, special_requirements=requirements)
+             for name, hours, cold, description, requirements in ORGAN_TYPES],
+            ignore_conflicts=True,
+        )
+        self.viability_hours = dict(OrganType.objects.values_list('type_name', 'typical_viability_hours'))
+        if not Medication.objects.exists():
+            self._insert(Medication, [
+                Medication(name=name, dosage_form=form, typical_dosage=dosage, purpose=purpose,
+                           side_effects=side_effects, manufacturer=manufacturer)
+                for name, form, dosage, purpose, side_effects, manufacturer in MEDICATIONS
+            ])
+        self.medication_ids = list(Medication.objects.order_by('medication_id').values_list('medication_id', flat=True))
+        # Centroids already loaded (load_zip_centroids) are kept
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT IGNORE INTO Zip_Centroid (Zipcode, Latitude, Longitude) VALUES (%s, %s, %s)',
+                [(zipcode, lat, lon) for _, _, zipcode, lat, lon in CITIES],
+            )
+
+    def _hospitals(self, count):
+        """Hospitals with transplant programs and staff; fills self.centres"""
+        hospital_id = _next_id(Hospital)
+        staff_id = _next_id(MedicalStaff)
+        hospitals, capabilities, staff = [], [], []
+        self.centres = {type_name: [] for type_name in NEED_WEIGHTS}
+        self.nephrologists = {}
+        self.hospital_ids = range(hospital_id, hospital_id + count)
+
+        for i, hospital_id in enumerate(self.hospital_ids):
+            city, state, zipcode, _, _ = self.rng.choice(CITIES)
+            street_number, street_name = str(self.rng.randint(1, 2000)), f'{self.rng.choice(LAST_NAMES)} St'
+            hospitals.append(Hospital(
+                hospital_id=hospital_id, name=f'{city} {self.rng.choice(LAST_NAMES)} Medical Center {hospital_id}',
+                address=f'{street_number} {street_name}', street_number=street_number, street_name=street_name,
+                city=city, state=state, zipcode=zipcode, phone=f'555-{hospital_id % 10000:04d}',
+                trauma_level=self.rng.randint(1, 3), opo_affiliation=f'OPO-{state}',
+            ))
+            surgeons = []
+            for specialization in ('Transplant_Surgeon',) * 3 + ('Coordinator', 'Nephrologist'):
+                staff.append(MedicalStaff(
+                    staff_id=staff_id, hospital_id=hospital_id, name=f'Dr. {self._name()}',
+                    specialization=specialization, license_number=f'SYN-{staff_id:08d}',
+                    certification_date=self._days_ago(20 * 365), certification_level='Board Certified',
+                ))
+                if specialization == 'Transplant_Surgeon':
+                    surgeons.append(staff_id)
+                elif specialization == 'Nephrologist':
+                    self.nephrologists[hospital_id] = staff_id
+                staff_id += 1
+            # The first hospital runs every program so each type has a centre
+            for type_name, share in PROGRAM_SHARE.items():
+                if i == 0 or self.rng.random() < share:
+                    capabilities.append(HospitalCapabilities(hospital_id=hospital_id, type_name_id=type_name))
+                    self.centres[type_name].append((hospital_id, surgeons))
+
+        with transaction.atomic():
+            self._insert(Hospital, hospitals)
+            self._insert(HospitalCapabilities, capabilities)
+            self._insert(MedicalStaff, staff)
+
+    # ==================== RECIPIENTS ====================
+    def _recipients(self, count):
+        """Recipients and their waitlist entries; fills the transplant pools.
+
+        self.pools maps (organ type, blood type) to Waiting recipient ids with
+        the longest-waiting last, so pop() hands out the next in line.
+        """
+        first_id = _next_id(Recipient)
+        self.first_recipient_id = first_id
+        self.wait_ordinals = array('i')
+        self.pools = {}
+        need_types = list(NEED_WEIGHTS)
+        need_weights = list(NEED_WEIGHTS.values())
+
+        for ids in _chunks(first_id, count, self.batch_size):
+            recipients, waitlist = [], []
+            for recipient_id in ids:
+                blood_type = self._blood_type()
+                needs = self.rng.choices(need_types, need_weights)
+                if needs[0] == 'Pancreas' or (needs[0] == 'Kidney' and self.rng.random() < 0.03):
+                    needs = ['Kidney', 'Pancreas']
+                registered = self._days_ago(5 * 365)
+                wait_list_date = min(registered + timedelta(days=self.rng.randint(0, 30)), self.today)
+                self.wait_ordinals.append(wait_list_date.toordinal())
+
+                recipients.append(Recipient(
+                    recipient_id=recipient_id, name=self._name(),
+                    date_of_birth=self._days_ago(70 * 365) - timedelta(days=18 * 365),
+                    blood_type=blood_type, gender=self.rng.choice(('M', 'F')),
+                    contact_info=f'555-{self.rng.randint(0, 9999):04d}',
+                    primary_diagnosis=DIAGNOSES[needs[-1]],
+                    medical_urgency_level=self.rng.choices(range(1, 6), URGENCY_WEIGHTS)[0],
+                    registration_date=registered, status='Waiting',
+                    insurance_info=self.rng.choice(('Medicare', 'Medicaid', 'Private', 'Private')),
+                    hla_type=self._hla(),
+                    listing_hospital_id=self.rng.choice(self.centres[needs[-1]])[0],
+                ))
+                set_hla_bits(recipients[-1])
+                for type_name in needs:
+                    status = 'On Hold' if self.rng.random() < 0.05 else 'Waiting'
+                    waitlist.append(RecipientWaitlist(
+                        recipient_id=recipient_id, type_name_id=type_name, wait_list_date=wait_list_date,
+                        status=status,
+                        meld_score=Decimal(self.rng.randint(6, 40)) if type_name == 'Liver' else None,
+                        cpra_score=(Decimal(self.rng.choice((0, self.rng.randint(1, 100)))) if type_name == 'Kidney'
+                                    else None),
+                    ))
+                    if status == 'Waiting':
+                        self.pools.setdefault((type_name, blood_type), []).append(recipient_id)
+
+            with transaction.atomic():
+                self._insert(Recipient, recipients)
+                self._insert(RecipientWaitlist, waitlist)
+            self.log(f'recipients: {ids.stop - first_id}/{count}')
+
+        for pool in self.pools.values():
+            pool.sort(key=lambda recipient_id: -self.wait_ordinals[recipient_id - first_id])
+        self.transplanted = set()
+
+    def _wait_ordinal(self, recipient_id):
+        return self.wait_ordinals[recipient_id - self.first_recipient_id]
+
+    def _next_recipient(self, type_name, donor_blood, procured):
+        """Longest-waiting compatible recipient listed before ``procured``"""
+        best = None
+        for recipient_blood in BLOOD_TYPES:
+            if not blood_type_score(donor_blood, recipient_blood):
+                continue
+            pool = self.pools.get((type_name, recipient_blood))
+            while pool and pool[-1] in self.transplanted:
+                pool.pop()
+            if pool and self._wait_ordinal(pool[-1]) <= procured.toordinal():
+                if best is None or self._wait_ordinal(pool[-1]) < self._wait_ordinal(best[-1]):
+                    best = pool
+        return best.pop() if best else None
+
+    def _waiting_sample(self, type_name, donor_blood, count):
+        pools = [
+            self.pools[(type_name, recipient_blood)] for recipient_blood in BLOOD_TYPES
+            if blood_type_score(donor_blood, recipient_blood) and self.pools.get((type_name, recipient_blood))
+        ]
+        candidates = {self.rng.choice(self.rng.choice(pools)) for _ in range(count)} if pools else set()
+        return sorted(candidates - self.transplanted)
+
+    # ==================== DONORS AND ORGANS ====================
+    def _donors(self, count):
+        """Donors with their organs, offers, transplants and follow-ups"""
+        first_id = _next_id(Donor)
+        organ_id = _next_id(Organ)
+        surgery_id = _next_id(Surgery)
+
+        for ids in _chunks(first_id, count, self.batch_size):
+            rows = {model: [] for model in (Donor, Organ, OrganAllocation, Surgery, FollowUpAppointment,
+                                             RecipientMedication, CompatibilityTest)}
+            for donor_id in ids:
+                blood_type = self._blood_type()
+                recent = self.rng.random() < RECENT_ORGAN_SHARE
+                if recent:
+                    registered = self._days_ago(7)
+                else:
+                    registered = self.today - timedelta(days=self.rng.randint(5, 3 * 365))
+                roll = self.rng.random()
+                if roll < INACTIVE_DONOR_SHARE:
+                    donor_type, status, organs = 'Living', 'Inactive', []
+                elif roll < INACTIVE_DONOR_SHARE + LIVING_DONOR_SHARE:
+                    donor_type, status = 'Living', 'Active'
+                    organs = ['Kidney' if self.rng.random() < 0.85 else 'Liver']
+                else:
+                    donor_type, status = 'Deceased', 'Deceased'
+                    organs = [type_name for type_name, share in DECEASED_YIELD if self.rng.random() < share]
+                cleared = min(registered + timedelta(days=self.rng.randint(0, 2)), self.today) if organs else None
+
+                rows[Donor].append(Donor(
+                    donor_id=donor_id, name=self._name(), date_of_birth=self._days_ago(60 * 365) - timedelta(days=18 * 365),
+                    blood_type=blood_type, gender=self.rng.choice(('M', 'F')),
+                    contact_info=f'555-{self.rng.randint(0, 9999):04d}', donor_type=donor_type,
+                    cause_of_death=self.rng.choice(CAUSES_OF_DEATH) if donor_type == 'Deceased' else None,
+                    registration_date=registered, medical_clearance_date=cleared, status=status,
+                ))
+
+                # Older organs are at least two days old, past every viability window
+                procured_on = cleared + timedelta(days=self.rng.randint(0, 1)) if organs else None
+                procured_at = self._time()
+                hla = self._hla()
+                procuring_hospital_id = self.rng.choice(self.hospital_ids)
+                for type_name in organs:
+                    if recent:
+                        procured = self.now - timedelta(minutes=self.rng.randint(0, self.viability_hours[type_name] * 50))
+                        day, at = procured.date(), procured.time()
+                    else:
+                        day, at = procured_on, procured_at
+                    organ = Organ(
+                        organ_id=organ_id, type_name_id=type_name, donor_id=donor_id, hla_type=hla,
+                        procuring_hospital_id=procuring_hospital_id, procurement_date=day, procurement_time=at,
+                        size_weight=Decimal(self.rng.randint(*ORGAN_WEIGHT_GRAMS[type_name])),
+                    )
+                    set_hla_bits(organ)
+                    rows[Organ].append(organ)
+                    if recent:
+                        organ.status = 'Available'
+                        self._offer(rows, organ_id, donor_id, type_name, blood_type)
+                    else:
+                        recipient_id = None
+                        if self.rng.random() < TRANSPLANT_SHARE:
+                            recipient_id = self._next_recipient(type_name, blood_type, day)
+                        if recipient_id is None:
+                            organ.status = 'Expired'
+                        else:
+                            organ.status = 'Allocated'
+                            self._transplant(rows, surgery_id, organ_id, donor_id, blood_type, recipient_id,
+                                             type_name, day, at)
+                            surgery_id += 1
+                    organ_id += 1
+
+                # No recipients to test against with --recipients 0
+                if organs and self.wait_ordinals and self.rng.random() < 0.5:
+                    rows[CompatibilityTest].append(CompatibilityTest(
+                        donor_id=donor_id,
+                        recipient_id=self.first_recipient_id + self.rng.randrange(len(self.wait_ordinals)),
+                        test_type=self.rng.choice(('Crossmatch', 'HLA Typing', 'PRA Screen')),
+                        test_date=cleared,
+                        test_result=self.rng.choices(('Compatible', 'Partial', 'Incompatible'), (4, 3, 3))[0],
+                        compatibility_score=Decimal(self.rng.randint(0, 100)),
+                    ))
+
+            # Surgeries go in after their offers and waitlist rows so
+            # after_surgery_insert finds them
+            with transaction.atomic():
+                for model, model_rows in rows.items():
+                    self._insert(model, model_rows)
+            self.log(f'donors: {ids.stop - first_id}/{count}')
+
+    def _offer(self, rows, organ_id, donor_id, type_name, donor_blood):
+        """Pending offers for an organ that is still viable"""
+        for recipient_id in self._waiting_sample(type_name, donor_blood, self.rng.randint(1, 3)):
+            rows[OrganAllocation].append(OrganAllocation(
+                organ_id=organ_id, recipient_id=recipient_id, allocation_date=Now(),
+                match_score=Decimal(self.rng.randint(50, 95)), status='Pending',
+                response_deadline=Now() + timedelta(hours=1),
+            ))
+            rows[CompatibilityTest].append(CompatibilityTest(
+                donor_id=donor_id, recipient_id=recipient_id, test_type='Crossmatch', test_date=self.today,
+                test_result='Partial', compatibility_score=Decimal(self.rng.randint(50, 95)),
+            ))
+
+    def _transplant(self, rows, surgery_id, organ_id, donor_id, donor_blood, recipient_id, type_name, day, at):
+        """Accepted offer, surgery, later follow-ups and medications for one organ"""
+        self.transplanted.add(recipient_id)
+        offered = self._server_time(day, at)
+        deadline = self._server_time(day, at, later=timedelta(hours=1))
+        # Some organs were declined by another candidate first
+        for other in self._waiting_sample(type_name, donor_blood, 1 if self.rng.random() < 0.3 else 0):
+            rows[OrganAllocation].append(OrganAllocation(
+                organ_id=organ_id, recipient_id=other, allocation_date=offered,
+                match_score=Decimal(self.rng.randint(50, 95)), status='Rejected',
+                response_deadline=deadline,
+            ))
+        rows[OrganAllocation].append(OrganAllocation(
+            organ_id=organ_id, recipient_id=recipient_id, allocation_date=offered,
+            match_score=Decimal(self.rng.randint(60, 100)), status='Pending',
+            response_deadline=deadline,
+        ))
+        rows[CompatibilityTest].append(CompatibilityTest(
+            donor_id=donor_id, recipient_id=recipient_id, test_type='Crossmatch', test_date=day,
+            test_result='Compatible', compatibility_score=Decimal(self.rng.randint(70, 100)),
+        ))
+
+        hospital_id, surgeons = self.rng.choice(self.centres[type_name])
+        surgeon_id = self.rng.choice(surgeons)
+        outcome = self.rng.choices(('Success', 'Complications', 'Failed'), (85, 12, 3))[0]
+        low, high = SURGERY_HOURS[type_name]
+        rows[Surgery].append(Surgery(
+            surgery_id=surgery_id, hospital_id=hospital_id, organ_id=organ_id, recipient_id=recipient_id,
+            primary_surgeon_id=surgeon_id, surgery_date=day, surgery_time=at,
+            duration_hours=Decimal(str(round(self.rng.uniform(low, high), 2))), outcome=outcome,
+            complications_description='Post-operative bleeding' if outcome == 'Complications' else None,
+        ))
+
+        # after_surgery_insert books the one-week visit; later ones are added here
+        staff_id = self.nephrologists.get(hospital_id, surgeon_id)
+        for days in FOLLOW_UP_DAYS:
+            appointment = day + timedelta(days=days)
+            if appointment > self.today + timedelta(days=30):
+                break
+            past = appointment < self.today
+            rows[FollowUpAppointment].append(FollowUpAppointment(
+                surgery_id=surgery_id, recipient_id=recipient_id, staff_id=staff_id,
+                appointment_date=appointment, appointment_time=time(self.rng.randint(8, 16), 0),
+                rejection_indicators=('None' if self.rng.random() < 0.9 else 'Elevated creatinine') if past else None,
+                lab_results='Within normal limits' if past else None,
+                medication_adherence=self.rng.choice(('Good', 'Good', 'Fair', 'Poor')) if past else None,
+                notes=f'{days}-day post-transplant follow-up',
+            ))
+        for medication_id in self.rng.sample(self.medication_ids, min(2, len(self.medication_ids))):
+            rows[RecipientMedication].append(RecipientMedication(
+                recipient_id=recipient_id, medication_id=medication_id, start_date=day,
+                dosage='As directed', frequency='Twice daily', prescribing_staff_id=surgeon_id,
+            ))
+
+    # ==================== RUN ====================
+    def run(self, donors, recipients, hospitals):
+        self._reference_data()
+        self._hospitals(hospitals)
+        self._recipients(recipients)
+        self._donors(donors)
+
+        # after_surgery_insert books one follow-up per surgery
+        if self.counts.get('surgery'):
+            self.counts['follow_up_appointment'] = self.counts.get('follow_up_appointment', 0) + self.counts['surgery']
+        # New waitlist rows have no boundary yet, so this scores all of them
+        refresh_priorities()
+        notify_tables_changed(*(model._meta.db_table for model in (
+            Hospital, HospitalCapabilities, MedicalStaff, Medication, OrganType, Recipient, RecipientWaitlist,
+            Donor, Organ, OrganAllocation, Surgery, FollowUpAppointment, RecipientMedication, CompatibilityTest,
+        )), 'zip_centroid')
+        return self.counts
+
+
+def generate_dataset(donors, recipients, hospitals, seed=DEFAULT_SEED, batch_size=DEFAULT_BATCH_SIZE, log=None):
+    """Append a synthetic dataset; returns rows written per table"""
+    return DatasetGenerator(seed=seed, batch_size=batch_size, log=log).run(donors, recipients, hospitals)
@@ -0,0 +1,35 @@
+"""MySQL backend that takes connections from a pool (see pool.py).
+
+Configured like ``django.db.backends.mysql`` plus an optional ``POOL`` dict::
+
+    'ENGINE': 'apps.core.db',
+    'POOL': {'MIN_SIZE': 2, 'MAX_SIZE': 20, 'MAX_IDLE': 300, 'CHECK_AFTER': 1, 'TIMEOUT': 10},
+
+Keep ``CONN_MAX_AGE`` at 0: Django then "closes" at the end of every request,
+which hands the connection back to the pool.
+"""
+from django.db.backends.mysql import base
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict['NAME'], self._connect, self.settings_dict.get('POOL'))
+
+    def _connect(self):
+        return super().get_new_connection(self.get_connection_params())
+
+    def get_new_connection(self, conn_params):
+        return self.pool.checkout()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # A connection closed inside atomic() stays referenced by this wrapper,
+        # and one that raised may be broken - neither is reused
+        if self.in_atomic_block or self.errors_occurred:
+            self.pool.discard(self.connection)
+        else:
+            self.pool.checkin(self.connection)
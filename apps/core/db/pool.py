@@ -0,0 +1,210 @@
+"""Process-wide pool of PyMySQL connections for the ``apps.core.db`` backend.
+
+Django opens a connection per request thread and closes it when the request
+ends (``CONN_MAX_AGE = 0``). With this backend "open" checks a connection out
+of the pool and "close" returns it, so a request skips the TCP connect,
+authentication and ``init_command`` round trips.
+
+* ``MIN_SIZE`` connections are kept even when idle; above that, connections
+  idle for ``MAX_IDLE`` seconds are closed.
+* A connection idle for more than ``CHECK_AFTER`` seconds is pinged before it
+  is handed out; one that fails is replaced.
+* At ``MAX_SIZE`` connections in use, checkout waits up to ``TIMEOUT``
+  seconds, then raises ``PoolTimeout``.
+* A returned connection is cleaned first: unread result sets (e.g. the
+  trailing status set of a ``CALL``) are drained and an open transaction is
+  rolled back. A connection that cannot be cleaned is closed instead.
+
+Counters (size, in use, waits, wait time, ...) come from ``pool_stats()``.
+"""
+import threading
+import time
+from collections import deque
+
+from pymysql.constants import SERVER_STATUS
+
+DEFAULTS = {
+    'MIN_SIZE': 2,
+    'MAX_SIZE': 20,
+    'MAX_IDLE': 300,
+    'CHECK_AFTER': 1,
+    'TIMEOUT': 10,
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def reset_connection(conn):
+    """Leave a connection as a fresh checkout expects it; False if it is unusable"""
+    try:
+        result = conn._result
+        if result is not None and result.unbuffered_active:
+            result._finish_unbuffered_query()
+        while conn._result is not None and conn._result.has_next:
+            conn.next_result()
+        if conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            conn.rollback()
+    except Exception:
+        return False
+    return conn.open
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size, max_size, max_idle, check_after, timeout):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.timeout = timeout
+        # (connection, returned at) - most recently returned on the right
+        self._idle = deque()
+        self._in_use = 0
+        self._lock = threading.Condition()
+        self._stats = {
+            'checkouts': 0, 'created': 0, 'evicted': 0, 'failed_checks': 0, 'discarded': 0,
+            'waits': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+        }
+
+    @property
+    def size(self):
+        return self._in_use + len(self._idle)
+
+    def _evict_idle(self, now):
+        # Oldest first; keeps MIN_SIZE connections however long they idle
+        evicted = []
+        while self._idle and self.size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            evicted.append(self._idle.popleft()[0])
+        self._stats['evicted'] += len(evicted)
+        return evicted
+
+    def checkout(self):
+        started = time.monotonic()
+        waited = False
+        with self._lock:
+            while True:
+                evicted = self._evict_idle(time.monotonic())
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self.size < self.max_size:
+                    conn, returned_at = None, None
+                    self._in_use += 1
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection free after {self.timeout}s ({self.max_size} in use)')
+                waited = True
+                self._lock.wait(remaining)
+            waited_for = time.monotonic() - started
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_seconds'] += waited_for
+                self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited_for)
+
+        # Network work happens outside the lock
+        for stale in evicted:
+            _close_quietly(stale)
+        try:
+            if conn is not None and time.monotonic() - returned_at > self.check_after:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._count('failed_checks')
+                    _close_quietly(conn)
+                    conn = None
+            if conn is None:
+                conn = self.connect()
+                self._count('created')
+        except BaseException:
+            self._release_slot()
+            raise
+        return conn
+
+    def checkin(self, conn):
+        if not reset_connection(conn):
+            self.discard(conn)
+            return
+        with self._lock:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def discard(self, conn):
+        """Close a checked-out connection instead of returning it"""
+        _close_quietly(conn)
+        self._count('discarded')
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_use -= 1
+            self._lock.notify()
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'utilization': round(self._in_use / self.max_size, 4),
+                'avg_wait_ms': round(stats['wait_seconds'] * 1000 / stats['waits'], 2) if stats['waits'] else None,
+            })
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, database, connect, options):
+    """The pool for one alias and database name.
+
+    Keyed by name as well because the test runner renames a database in place
+    (``NAME`` -> ``test_NAME``); connections to the old name must not be reused.
+    """
+    with _pools_lock:
+        pool = _pools.get((alias, database))
+        if pool is None:
+            settings = {**DEFAULTS, **(options or {})}
+            pool = _pools[(alias, database)] = ConnectionPool(
+                connect,
+                min_size=settings['MIN_SIZE'],
+                max_size=settings['MAX_SIZE'],
+                max_idle=settings['MAX_IDLE'],
+                check_after=settings['CHECK_AFTER'],
+                timeout=settings['TIMEOUT'],
+            )
+        return pool
+
+
+def pool_stats():
+    """Counters for every pool in this process"""
+    with _pools_lock:
+        pools = sorted(_pools.items(), key=lambda item: tuple(str(part) for part in item[0]))
+    return [{'alias': alias, 'database': database, **pool.stats()} for (alias, database), pool in pools]
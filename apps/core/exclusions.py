@@ -0,0 +1,219 @@
+"""In-memory index of incompatible donor -> recipient pairs.
+
+A recipient with an Incompatible Compatibility_Test against the donor is never
+offered that donor's organs. Instead of a query per ranking (or the correlated
+``NOT EXISTS`` of MatchOrganToRecipients), every Incompatible pair is held in
+memory and ``excluded_recipients(donor_id)`` is an O(1) slice:
+
+* base: recipient ids grouped by donor (``recipients``, int32) plus an offset
+  per Donor_ID (``offsets``, int64), so donor d's recipients are
+  ``recipients[offsets[d]:offsets[d + 1]]``;
+* delta: a set of recipient ids per donor for tests inserted since the base
+  was built, folded into the base once it holds ``MERGE_THRESHOLD`` pairs.
+
+Every lookup first reads ``MAX(Test_ID)`` from the primary (a single index
+probe), so a test inserted by any process or connection - another web worker,
+a management command, a MySQL client - is seen by the next ranking: when the
+maximum moved, the rows past the highest Test_ID seen are read, minus
+``CATCH_UP_OVERLAP`` for inserts that commit out of id order. A test updated
+or deleted through the ORM bumps a generation in the shared cache instead, and
+every process rebuilds its index from scratch.
+
+Memory is 4 bytes per Incompatible pair plus 8 per Donor_ID: 10M tests, all
+Incompatible, over 2M donors is 40 MB + 16 MB. Loading reads only
+``(Donor_ID, Recipient_ID)`` of the Incompatible rows, in chunks.
+"""
+import threading
+import time
+from array import array
+
+import numpy as np
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CompatibilityTest
+
+GENERATION_KEY = 'exclusion_index_generation'
+CATCH_UP_OVERLAP = 100
+MERGE_THRESHOLD = 100000
+LOAD_CHUNK = 50000
+
+MAX_TEST_ID_SQL = 'SELECT COALESCE(MAX(Test_ID), 0) FROM Compatibility_Test'
+LOAD_SQL = """
+    SELECT Donor_ID, Recipient_ID FROM Compatibility_Test
+    WHERE Test_Result = 'Incompatible' AND Test_ID <= %s
+"""
+
+EMPTY = np.array([], dtype=np.int32)
+
+
+def _generation():
+    return cache.get(GENERATION_KEY, 0)
+
+
+def _grouped(donor_ids, recipient_ids):
+    """(offsets, recipients) for pair arrays, one sorted unique run per donor"""
+    if not len(donor_ids):
+        return np.zeros(1, dtype=np.int64), EMPTY
+    # One sort of (donor << 32 | recipient) orders the pairs; np.unique is far slower
+    keys = np.sort((donor_ids.astype(np.int64) << 32) | recipient_ids.astype(np.int64))
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    donors = keys >> 32
+    counts = np.bincount(donors, minlength=int(donors[-1]) + 1)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, (keys & 0xFFFFFFFF).astype(np.int32)
+
+
+class ExclusionIndex:
+    """Incompatible recipients per donor, kept in step with Compatibility_Test"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._offsets = None
+        self._recipients = EMPTY
+        self._delta = {}
+        self._delta_size = 0
+        self._generation = None
+        self._last_test_id = 0
+        self.stats = {'loads': 0, 'catch_ups': 0, 'merges': 0, 'load_seconds': 0.0}
+
+    # ---- building ----
+    def build(self, donor_ids, recipient_ids):
+        """Replace the contents with these pairs (numpy arrays)"""
+        self._offsets, self._recipients = _grouped(donor_ids, recipient_ids)
+        self._delta = {}
+        self._delta_size = 0
+
+    def _load(self, generation):
+        started = time.perf_counter()
+        donors, recipients = array('q'), array('q')
+        # The index outlives the request, so it is always loaded from the primary
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(MAX_TEST_ID_SQL)
+            last_test_id = cursor.fetchone()[0]
+            cursor.execute(LOAD_SQL, [last_test_id])
+            while True:
+                rows = cursor.fetchmany(LOAD_CHUNK)
+                if not rows:
+                    break
+                for donor_id, recipient_id in rows:
+                    donors.append(donor_id)
+                    recipients.append(recipient_id)
+        self.build(np.frombuffer(donors, dtype=np.int64), np.frombuffer(recipients, dtype=np.int64))
+        self._last_test_id = last_test_id
+        self._generation = generation
+        self.stats['loads'] += 1
+        self.stats['load_seconds'] += time.perf_counter() - started
+
+    def _catch_up(self):
+        rows = CompatibilityTest.objects.using(DEFAULT_DB_ALIAS).filter(
+            test_id__gt=self._last_test_id - CATCH_UP_OVERLAP
+        ).values_list('test_id', 'donor_id', 'recipient_id', 'test_result')
+        for test_id, donor_id, recipient_id, test_result in rows:
+            self._last_test_id = max(self._last_test_id, test_id)
+            if test_result == 'Incompatible':
+                self.add(donor_id, recipient_id)
+        self.stats['catch_ups'] += 1
+
+    def add(self, donor_id, recipient_id):
+        if recipient_id in self._base(donor_id):
+            return
+        pending = self._delta.setdefault(donor_id, set())
+        if recipient_id not in pending:
+            pending.add(recipient_id)
+            self._delta_size += 1
+            if self._delta_size >= MERGE_THRESHOLD:
+                self._merge()
+
+    def _merge(self):
+        donors = np.repeat(np.arange(len(self._offsets) - 1, dtype=np.int64), np.diff(self._offsets))
+        added = [(donor_id, recipient_id) for donor_id, pending in self._delta.items() for recipient_id in pending]
+        added = np.array(added, dtype=np.int64).reshape(-1, 2)
+        self.build(np.concatenate([donors, added[:, 0]]), np.concatenate([self._recipients, added[:, 1]]))
+        self.stats['merges'] += 1
+
+    def _ensure_current(self):
+        generation = _generation()
+        if self._offsets is None or generation != self._generation:
+            self._load(generation)
+            return
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(MAX_TEST_ID_SQL)
+            last_test_id = cursor.fetchone()[0]
+        if last_test_id > self._last_test_id:
+            self._catch_up()
+
+    # ---- lookups ----
+    def _base(self, donor_id):
+        if donor_id < 0 or donor_id >= len(self._offsets) - 1:
+            return EMPTY
+        return self._recipients[self._offsets[donor_id]:self._offsets[donor_id + 1]]
+
+    def lookup(self, donor_id):
+        """Recipient ids held for ``donor_id`` (int64), without checking for new tests"""
+        base = self._base(donor_id)
+        pending = self._delta.get(donor_id)
+        if pending:
+            base = np.concatenate([base, np.fromiter(pending, dtype=np.int32, count=len(pending))])
+        return base.astype(np.int64)
+
+    def excluded(self, donor_id):
+        """Recipient ids with an Incompatible test against ``donor_id`` (int64)"""
+        with self._lock:
+            self._ensure_current()
+            return self.lookup(donor_id)
+
+    def is_excluded(self, donor_id, recipient_id):
+        return recipient_id in self.excluded(donor_id)
+
+    def memory_bytes(self):
+        if self._offsets is None:
+            return 0
+        return self._offsets.nbytes + self._recipients.nbytes
+
+    def snapshot(self):
+        with self._lock:
+            loaded = self._offsets is not None
+            return {
+                'loaded': loaded,
+                'pairs': len(self._recipients) + self._delta_size,
+                'pending_pairs': self._delta_size,
+                'donor_slots': len(self._offsets) - 1 if loaded else 0,
+                'memory_bytes': self.memory_bytes(),
+                **self.stats,
+            }
+
+
+index = ExclusionIndex()
+
+
+def excluded_recipients(donor_id):
+    return index.excluded(donor_id)
+
+
+def exclusion_stats():
+    return index.snapshot()
+
+
+def invalidate():
+    """Make every process rebuild its index (a test was changed or removed)"""
+    cache.add(GENERATION_KEY, 0, None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+@receiver(post_save, sender=CompatibilityTest)
+def test_saved(sender, instance, created, **kwargs):
+    # New rows are read by the next catch-up; an edited result may un-exclude a pair
+    if not created:
+        transaction.on_commit(invalidate)
+
+
+@receiver(post_delete, sender=CompatibilityTest)
+def test_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate)
@@ -0,0 +1,214 @@
+"""Deadline-driven expiry of pending allocations and organs.
+
+Pending Organ_Allocation rows lapse at Response_Deadline and Available organs
+at Viability_Expires_At. The sweeper keeps the nearest upcoming deadlines in a
+min-heap keyed on monotonic time, sleeps until the head lapses and then expires
+everything overdue with batched set-based UPDATEs. The heap is re-armed from
+the database on start and every ``rearm_interval`` seconds, so deadlines
+written by other processes (procedures, new organs) are picked up and nothing
+is lost across restarts.
+
+Deadlines are stored in server time (NOW() in the triggers and procedures), so
+they are compared in SQL and converted to "seconds from now" on load.
+"""
+import heapq
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, connection, transaction
+
+from .signals import notify_tables_changed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOOKAHEAD = 900
+DEFAULT_REARM_INTERVAL = 30
+DEFAULT_BATCH_SIZE = 1000
+MAX_ARMED = 10000
+
+# Upcoming (and already lapsed) deadlines as (id, seconds from now); both use
+# a (Status, deadline) index
+UPCOMING_SQL = {
+    'allocation': """
+        SELECT Allocation_ID, TIMESTAMPDIFF(MICROSECOND, NOW(), Response_Deadline) / 1000000
+        FROM Organ_Allocation
+        WHERE Status = 'Pending' AND Response_Deadline <= NOW() + INTERVAL %s SECOND
+        ORDER BY Response_Deadline
+        LIMIT %s
+    """,
+    'organ': """
+        SELECT Organ_ID, TIMESTAMPDIFF(MICROSECOND, NOW(), Viability_Expires_At) / 1000000
+        FROM Organ
+        WHERE Status = 'Available' AND Viability_Expires_At <= NOW() + INTERVAL %s SECOND
+        ORDER BY Viability_Expires_At
+        LIMIT %s
+    """,
+}
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def expire_allocations(batch_size=DEFAULT_BATCH_SIZE):
+    """Expire lapsed Pending allocations; organs they held go back to Available"""
+    expired = 0
+    with connection.cursor() as cursor:
+        while True:
+            with transaction.atomic():
+                cursor.execute("""
+                    SELECT Allocation_ID, Organ_ID FROM Organ_Allocation
+                    WHERE Status = 'Pending' AND Response_Deadline <= NOW()
+                    ORDER BY Response_Deadline
+                    LIMIT %s
+                """, [batch_size])
+                lapsed = cursor.fetchall()
+                if not lapsed:
+                    break
+                # Same lock order as allocation.py: the organs, then their
+                # allocations, re-checked once locked
+                organ_ids = sorted({row[1] for row in lapsed})
+                cursor.execute(
+                    f"SELECT Organ_ID FROM Organ WHERE Organ_ID IN ({_placeholders(organ_ids)}) ORDER BY Organ_ID FOR UPDATE",
+                    organ_ids
+                )
+                lapsed_ids = [row[0] for row in lapsed]
+                cursor.execute(f"""
+                    SELECT Allocation_ID, Organ_ID, Recipient_ID FROM Organ_Allocation
+                    WHERE Allocation_ID IN ({_placeholders(lapsed_ids)})
+                      AND Status = 'Pending' AND Response_Deadline <= NOW()
+                    ORDER BY Allocation_ID
+                    FOR UPDATE
+                """, lapsed_ids)
+                rows = cursor.fetchall()
+                if not rows:
+                    continue
+                allocation_ids = [row[0] for row in rows]
+                cursor.execute(
+                    f"UPDATE Organ_Allocation SET Status = 'Expired' WHERE Allocation_ID IN ({_placeholders(allocation_ids)})",
+                    allocation_ids
+                )
+                # Same as a rejection: the organ is offered again unless
+                # another allocation still holds it
+                cursor.execute(f"""
+                    UPDATE Organ o
+                    SET o.Status = 'Available'
+                    WHERE o.Organ_ID IN ({_placeholders(organ_ids)})
+                      AND o.Status = 'Allocated'
+                      AND NOT EXISTS (
+                          SELECT 1 FROM Organ_Allocation a
+                          WHERE a.Organ_ID = o.Organ_ID AND a.Status IN ('Pending', 'Accepted')
+                      )
+                """, organ_ids)
+                notify_tables_changed('organ_allocation', 'organ', recipient_ids={row[2] for row in rows})
+            expired += len(rows)
+            if len(lapsed) < batch_size:
+                break
+    return expired
+
+
+def expire_organs(batch_size=DEFAULT_BATCH_SIZE):
+    """Expire Available organs past their viability window, with their Pending offers"""
+    expired = 0
+    with connection.cursor() as cursor:
+        while True:
+            with transaction.atomic():
+                cursor.execute("""
+                    SELECT Organ_ID FROM Organ
+                    WHERE Status = 'Available' AND Viability_Expires_At <= NOW()
+                    ORDER BY Viability_Expires_At
+                    LIMIT %s
+                """, [batch_size])
+                lapsed = [row[0] for row in cursor.fetchall()]
+                if not lapsed:
+                    break
+                # Locked through the primary key in Organ_ID order, like
+                # allocation.py, and re-checked once locked; a locking read of
+                # the deadline index would lock in deadline order instead
+                lapsed.sort()
+                cursor.execute(f"""
+                    SELECT Organ_ID FROM Organ
+                    WHERE Organ_ID IN ({_placeholders(lapsed)})
+                      AND Status = 'Available' AND Viability_Expires_At <= NOW()
+                    ORDER BY Organ_ID
+                    FOR UPDATE
+                """, lapsed)
+                organ_ids = [row[0] for row in cursor.fetchall()]
+                if not organ_ids:
+                    continue
+                cursor.execute(
+                    f"UPDATE Organ SET Status = 'Expired' WHERE Organ_ID IN ({_placeholders(organ_ids)})",
+                    organ_ids
+                )
+                cursor.execute(f"""
+                    UPDATE Organ_Allocation SET Status = 'Expired'
+                    WHERE Organ_ID IN ({_placeholders(organ_ids)}) AND Status = 'Pending'
+                """, organ_ids)
+                notify_tables_changed('organ', 'organ_allocation')
+            expired += len(organ_ids)
+            if len(lapsed) < batch_size:
+                break
+    return expired
+
+
+EXPIRE = {
+    'allocation': expire_allocations,
+    'organ': expire_organs,
+}
+
+
+class ExpirySweeper:
+    """Min-heap of upcoming deadlines; expires rows as their deadlines lapse"""
+
+    def __init__(self, lookahead=DEFAULT_LOOKAHEAD, rearm_interval=DEFAULT_REARM_INTERVAL,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.lookahead = lookahead
+        self.rearm_interval = rearm_interval
+        self.batch_size = batch_size
+        self._heap = []
+        self._next_rearm = 0
+        self._stop = threading.Event()
+
+    def rearm(self):
+        """Reload the heap with every deadline due within the lookahead window"""
+        heap = []
+        with connection.cursor() as cursor:
+            for kind, sql in UPCOMING_SQL.items():
+                cursor.execute(sql, [self.lookahead, MAX_ARMED])
+                now = time.monotonic()
+                heap.extend((now + max(float(seconds), 0), kind, pk) for pk, seconds in cursor.fetchall())
+        heapq.heapify(heap)
+        self._heap = heap
+        self._next_rearm = time.monotonic() + self.rearm_interval
+        return len(heap)
+
+    def sweep(self, kinds=tuple(EXPIRE)):
+        """Expire everything overdue for the given kinds; returns counts per kind"""
+        return {kind: EXPIRE[kind](self.batch_size) for kind in kinds}
+
+    def _due_kinds(self, now):
+        kinds = set()
+        while self._heap and self._heap[0][0] <= now:
+            kinds.add(heapq.heappop(self._heap)[1])
+        return kinds
+
+    def run(self):
+        """Sweep until ``stop`` is called"""
+        logger.info('Expiry sweeper armed with %s deadlines', self.rearm())
+        while not self._stop.is_set():
+            close_old_connections()
+            now = time.monotonic()
+            due = self._due_kinds(now)
+            if due:
+                counts = self.sweep(sorted(due))
+                logger.info('Expired %s', ', '.join(f'{count} {kind}(s)' for kind, count in counts.items()))
+            if now >= self._next_rearm:
+                self.rearm()
+
+            wake_at = min(self._heap[0][0], self._next_rearm) if self._heap else self._next_rearm
+            self._stop.wait(max(wake_at - time.monotonic(), 0))
+        close_old_connections()
+
+    def stop(self):
+        self._stop.set()
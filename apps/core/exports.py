@@ -0,0 +1,192 @@
+"""Streaming CSV/NDJSON extracts for registry reporting.
+
+Rows are read with an unbuffered server-side cursor (PyMySQL ``SSCursor``), so
+MySQL sends them as they are fetched and neither the client nor the response
+ever holds more than one ``FETCH_SIZE`` chunk - memory stays flat whatever the
+table size. ``stream_export`` is a generator of encoded chunks that feeds both
+``StreamingHttpResponse`` (the export view) and the ``export_data`` command.
+Under ASGI the view streams ``astream_export`` instead: the same generator
+advanced on a thread of its own, since Django would otherwise read a sync
+iterator to the end into memory before sending it.
+
+A dataset is a SELECT over the base tables with the columns an extract may
+contain; list-page filter parameters map onto its columns and are always
+bound as query parameters.
+"""
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from pymysql.cursors import SSCursor
+
+FETCH_SIZE = 1000
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+class Export:
+    """A dataset: its SELECT, exportable columns, ordering and filters"""
+
+    def __init__(self, select, columns, ordering, filters):
+        self.select = select
+        self.columns = columns
+        self.ordering = ordering
+        # GET parameter -> column, as on the list pages
+        self.filters = filters
+
+    def sql(self, columns, filters):
+        sql = f"SELECT {', '.join(columns)} FROM ({self.select}) AS export_rows"
+        params = []
+        conditions = []
+        for param, value in filters.items():
+            conditions.append(f'{self.filters[param]} = %s')
+            params.append(value)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return sql + f" ORDER BY {', '.join(self.ordering)}", params
+
+
+EXPORTS = {
+    'waitlist': Export(
+        """
+        SELECT wl.Recipient_ID, r.Name AS Recipient_Name, r.Blood_Type, r.Medical_Urgency_Level,
+               wl.Type_Name AS Organ_Type, wl.Priority_Score, wl.Wait_List_Date, wl.Status,
+               wl.MELD_Score, wl.CPRA_Score
+        FROM Recipient_Waitlist wl
+        JOIN Recipient r ON r.Recipient_ID = wl.Recipient_ID
+        """,
+        columns=('Recipient_ID', 'Recipient_Name', 'Blood_Type', 'Medical_Urgency_Level', 'Organ_Type',
+                 'Priority_Score', 'Wait_List_Date', 'Status', 'MELD_Score', 'CPRA_Score'),
+        ordering=('Recipient_ID', 'Organ_Type'),
+        filters={'organ_type': 'Organ_Type', 'status': 'Status', 'blood_type': 'Blood_Type'},
+    ),
+    'allocations': Export(
+        """
+        SELECT a.Allocation_ID, a.Organ_ID, o.Type_Name AS Organ_Type, o.Donor_ID, a.Recipient_ID,
+               r.Name AS Recipient_Name, a.Allocation_Date, a.Match_Score, a.Status, a.Response_Deadline
+        FROM Organ_Allocation a
+        JOIN Organ o ON o.Organ_ID = a.Organ_ID
+        JOIN Recipient r ON r.Recipient_ID = a.Recipient_ID
+        """,
+        columns=('Allocation_ID', 'Organ_ID', 'Organ_Type', 'Donor_ID', 'Recipient_ID', 'Recipient_Name',
+                 'Allocation_Date', 'Match_Score', 'Status', 'Response_Deadline'),
+        ordering=('Allocation_ID',),
+        filters={'status': 'Status', 'organ_type': 'Organ_Type'},
+    ),
+    'surgeries': Export(
+        """
+        SELECT s.Surgery_ID, s.Surgery_Date, s.Surgery_Time, s.Hospital_ID, h.Name AS Hospital_Name,
+               s.Organ_ID, o.Type_Name AS Organ_Type, s.Recipient_ID, r.Name AS Recipient_Name,
+               s.Primary_Surgeon_ID, ms.Name AS Surgeon_Name, s.Duration_Hours, s.Outcome
+        FROM Surgery s
+        JOIN Hospital h ON h.Hospital_ID = s.Hospital_ID
+        JOIN Organ o ON o.Organ_ID = s.Organ_ID
+        JOIN Recipient r ON r.Recipient_ID = s.Recipient_ID
+        JOIN Medical_Staff ms ON ms.Staff_ID = s.Primary_Surgeon_ID
+        """,
+        columns=('Surgery_ID', 'Surgery_Date', 'Surgery_Time', 'Hospital_ID', 'Hospital_Name', 'Organ_ID',
+                 'Organ_Type', 'Recipient_ID', 'Recipient_Name', 'Primary_Surgeon_ID', 'Surgeon_Name',
+                 'Duration_Hours', 'Outcome'),
+        ordering=('Surgery_ID',),
+        filters={'outcome': 'Outcome', 'organ_type': 'Organ_Type'},
+    ),
+    'followups': Export(
+        """
+        SELECT fa.Appointment_ID, fa.Appointment_Date, fa.Appointment_Time, fa.Surgery_ID, fa.Recipient_ID,
+               r.Name AS Recipient_Name, fa.Staff_ID, ms.Name AS Staff_Name, o.Type_Name AS Transplanted_Organ,
+               fa.Rejection_Indicators, fa.Lab_Results, fa.Medication_Adherence, fa.Next_Appointment_Date
+        FROM Follow_Up_Appointment fa
+        JOIN Recipient r ON r.Recipient_ID = fa.Recipient_ID
+        JOIN Surgery s ON s.Surgery_ID = fa.Surgery_ID
+        JOIN Organ o ON o.Organ_ID = s.Organ_ID
+        JOIN Medical_Staff ms ON ms.Staff_ID = fa.Staff_ID
+        """,
+        columns=('Appointment_ID', 'Appointment_Date', 'Appointment_Time', 'Surgery_ID', 'Recipient_ID',
+                 'Recipient_Name', 'Staff_ID', 'Staff_Name', 'Transplanted_Organ', 'Rejection_Indicators',
+                 'Lab_Results', 'Medication_Adherence', 'Next_Appointment_Date'),
+        ordering=('Appointment_ID',),
+        filters={'organ': 'Transplanted_Organ'},
+    ),
+}
+
+
+def export_columns(export, requested):
+    """Columns to export from a comma-separated list; ValueError on unknown names"""
+    if not requested:
+        return list(export.columns)
+    columns = [column.strip() for column in requested.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in export.columns]
+    if unknown or not columns:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(export.columns)}")
+    return columns
+
+
+def export_filters(export, query_params):
+    """Filter values present in ``query_params`` for this dataset"""
+    return {param: query_params[param] for param in export.filters if query_params.get(param)}
+
+
+class _Line:
+    """File-like target for csv.writer that hands back each encoded line"""
+
+    def write(self, value):
+        return value
+
+
+def _encode(fmt, columns):
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        return writer.writerow(columns), writer.writerow
+    encoder = DjangoJSONEncoder()
+    return '', lambda row: json.dumps(dict(zip(columns, row)), default=encoder.default) + '\n'
+
+
+def stream_export(export, columns, filters, fmt='csv', fetch_size=FETCH_SIZE):
+    """Generator of encoded chunks (header first for CSV), one per fetched batch"""
+    sql, params = export.sql(columns, filters)
+    header, encode_row = _encode(fmt, columns)
+    if header:
+        yield header
+
+    # Unbuffered: the result set stays on the server and is read in batches.
+    # close() drains whatever is left, so an abandoned download still leaves
+    # the connection usable.
+    connection.ensure_connection()
+    cursor = connection.connection.cursor(SSCursor)
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield ''.join(encode_row(row) for row in rows)
+    finally:
+        cursor.close()
+
+
+async def astream_export(export, columns, filters, fmt='csv', fetch_size=FETCH_SIZE):
+    """``stream_export`` as an async iterator, for StreamingHttpResponse under ASGI.
+
+    The unbuffered cursor keeps its connection busy until the last row is read,
+    so the generator runs on a dedicated thread (with its own connection)
+    rather than the shared one sync views use.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+    chunks = stream_export(export, columns, filters, fmt, fetch_size)
+
+    def close():
+        chunks.close()
+        connection.close()
+
+    step = sync_to_async(next, thread_sensitive=False, executor=executor)
+    try:
+        while True:
+            chunk = await step(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await sync_to_async(close, thread_sensitive=False, executor=executor)()
+        executor.shutdown(wait=False)
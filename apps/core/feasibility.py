@@ -0,0 +1,257 @@
+"""Which transplant centres can take an organ procured at a given hospital.
+
+A centre is feasible for an organ type when it has the program
+(Hospital_Capabilities) and the organ can be carried there within the type's
+``Cold_Ischemia_Time_Max``. ``FeasibilityMatrix`` precomputes this for every
+geocoded hospital as a procuring location against every geocoded centre:
+
+* ``hours``: estimated transport hours, float32 (procuring x centre);
+* ``feasible``: one bit per organ type, set when the centre has the program
+  and ``hours`` is within that type's cold ischemia limit.
+
+So "where can this kidney go" is one row of ``feasible`` and one bit mask.
+The matrix assumes a fresh organ; lookups take the organ's ``elapsed_hours``
+since procurement and also drop the centres whose transport time exceeds what
+is left of its cold ischemia budget.
+Transport time is the faster of driving (road miles at ``GROUND_SPEED_MPH``)
+and flying (``AIR_SPEED_MPH`` plus the legs to and from the airports), plus
+packaging and hand-off at both ends.
+
+``feasibility()`` is the current matrix. When hospitals, zip centroids,
+capabilities or organ types change it is rebuilt incrementally: transport
+hours are copied for every (procuring, centre) pair whose coordinates did not
+change and only the rows and columns of moved, new or newly capable hospitals
+are measured; the type bits are recomputed from the hours (one comparison per
+cell and type). A hospital or procuring location that is not geocoded cannot
+be placed, so it is never ruled out on distance - only on capability.
+"""
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS
+
+from .geo import GEO_TABLES, locations
+from .models import HospitalCapabilities, OrganType
+from .signals import table_versions
+
+FEASIBILITY_TABLES = GEO_TABLES + ('hospital_capabilities', 'organ_type')
+
+HANDOFF_HOURS = 0.5
+GROUND_SPEED_MPH = 50.0
+# Road miles per great-circle mile
+ROAD_FACTOR = 1.25
+AIR_SPEED_MPH = 350.0
+# Ground legs to and from the airports, loading and taxiing
+AIR_OVERHEAD_HOURS = 2.0
+
+
+def transport_hours(miles):
+    """Estimated door-to-door hours for great-circle ``miles`` (array)"""
+    ground = miles * (ROAD_FACTOR / GROUND_SPEED_MPH)
+    air = AIR_OVERHEAD_HOURS + miles / AIR_SPEED_MPH
+    return (HANDOFF_HOURS + np.minimum(ground, air)).astype(np.float32)
+
+
+def elapsed_hours(organ):
+    """Hours since the organ was procured, counted against its cold ischemia time"""
+    procured = datetime.combine(organ.procurement_date, organ.procurement_time)
+    return max((datetime.now() - procured).total_seconds() / 3600, 0.0)
+
+
+def _bits_dtype(type_count):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if type_count <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f'{type_count} organ types do not fit a feasibility bitmask')
+
+
+class FeasibilityMatrix:
+    """Transport hours and feasible organ types per (procuring hospital, centre)"""
+
+    def __init__(self, geo, capabilities, budgets, versions, previous=None):
+        """``capabilities`` are (hospital_id, type_name) pairs, ``budgets`` cold
+        ischemia hours per type; ``previous`` is a matrix to copy hours from"""
+        self.geo = geo
+        self.versions = versions
+        self.type_names = tuple(sorted(budgets))
+        self.type_bits = {type_name: 1 << bit for bit, type_name in enumerate(self.type_names)}
+        self.budgets = dict(budgets)
+        dtype = _bits_dtype(len(self.type_names))
+
+        # Programs of every hospital, geocoded or not
+        self.capabilities = {}
+        for hospital_id, type_name in capabilities:
+            if type_name in self.type_bits:
+                self.capabilities[hospital_id] = self.capabilities.get(hospital_id, 0) | self.type_bits[type_name]
+
+        positions = geo.positions(sorted(self.capabilities))
+        self.centre_positions = np.sort(positions[positions >= 0])
+        self.centre_ids = geo.hospital_ids[self.centre_positions]
+        capable = np.fromiter((self.capabilities[int(h)] for h in self.centre_ids), dtype=dtype,
+                              count=len(self.centre_ids))
+
+        started = time.perf_counter()
+        self.hours, self.measured = self._transport(previous)
+        self.build_seconds = time.perf_counter() - started
+
+        self.feasible = np.zeros(self.hours.shape, dtype=dtype)
+        for type_name, bit in self.type_bits.items():
+            reachable = self.hours <= self.budgets[type_name]
+            self.feasible |= np.where(reachable & ((capable & bit) != 0)[None, :], dtype(bit), dtype(0))
+
+    def _reused(self, previous):
+        """Previous geo position of each hospital, -1 where it is new or moved"""
+        if previous is None or not previous.geo.size:
+            return np.full(self.geo.size, -1, dtype=np.int64)
+        old = previous.geo.positions(self.geo.hospital_ids)
+        found = old >= 0
+        same = np.zeros(self.geo.size, dtype=bool)
+        same[found] = (
+            (previous.geo.latitude[old[found]] == self.geo.latitude[found])
+            & (previous.geo.longitude[old[found]] == self.geo.longitude[found])
+        )
+        return np.where(same, old, -1)
+
+    def _transport(self, previous):
+        """(hours, cells measured), copying the unchanged pairs from ``previous``"""
+        hours = np.empty((self.geo.size, len(self.centre_positions)), dtype=np.float32)
+        reused = self._reused(previous)
+        rows = np.flatnonzero(reused >= 0)
+        columns = np.full(len(self.centre_positions), -1, dtype=np.int64)
+        if previous is not None and len(previous.centre_positions):
+            # Previous column of each centre that kept its coordinates and was a centre before
+            old_positions = reused[self.centre_positions]
+            slot = np.minimum(np.searchsorted(previous.centre_positions, old_positions),
+                              len(previous.centre_positions) - 1)
+            columns = np.where(
+                (old_positions >= 0) & (previous.centre_positions[slot] == old_positions), slot, -1
+            )
+        kept = np.flatnonzero(columns >= 0)
+        if len(rows) and len(kept):
+            hours[np.ix_(rows, kept)] = previous.hours[np.ix_(reused[rows], columns[kept])]
+
+        # Distances are symmetric: a new centre's column is its distance to every hospital
+        fresh_columns = np.flatnonzero(columns < 0)
+        for column in fresh_columns:
+            hours[:, column] = transport_hours(self.geo.distances(self.centre_positions[column]))
+        fresh_rows = np.flatnonzero(reused < 0)
+        if len(kept):
+            for row in fresh_rows:
+                hours[row, kept] = transport_hours(self.geo.distances(row, self.centre_positions[kept]))
+        measured = len(fresh_columns) * self.geo.size + len(fresh_rows) * len(kept)
+        return hours, measured
+
+    @classmethod
+    def load(cls, previous=None):
+        versions = table_versions(*FEASIBILITY_TABLES)
+        # Outlives the request, so it is always loaded from the primary
+        capabilities = HospitalCapabilities.objects.using(DEFAULT_DB_ALIAS).values_list('hospital_id', 'type_name_id')
+        budgets = OrganType.objects.using(DEFAULT_DB_ALIAS).values_list('type_name', 'cold_ischemia_time_max')
+        return cls(locations(), list(capabilities), dict(budgets), versions, previous)
+
+    # ---- lookups ----
+    def _origin(self, procuring_hospital_id):
+        return self.geo.position(procuring_hospital_id)
+
+    def capable(self, hospital_id, organ_type):
+        return bool(self.capabilities.get(hospital_id, 0) & self.type_bits.get(organ_type, 0))
+
+    def _left(self, organ_type, elapsed_hours):
+        """Transport hours still allowed for an organ ``elapsed_hours`` after procurement"""
+        return self.budgets.get(organ_type, 0) - elapsed_hours
+
+    def allows(self, procuring_hospital_id, hospital_id, organ_type, elapsed_hours=0.0):
+        """(capable, reachable) for transplanting this organ type at ``hospital_id``"""
+        if not self.capable(hospital_id, organ_type):
+            return False, False
+        origin = self._origin(procuring_hospital_id)
+        column = np.searchsorted(self.centre_ids, hospital_id)
+        if origin < 0 or column >= len(self.centre_ids) or self.centre_ids[column] != hospital_id:
+            return True, True
+        reachable = (self.feasible[origin, column] & self.type_bits[organ_type]
+                     and self.hours[origin, column] <= self._left(organ_type, elapsed_hours))
+        return True, bool(reachable)
+
+    def transport_hours(self, procuring_hospital_id, hospital_id):
+        origin = self._origin(procuring_hospital_id)
+        column = np.searchsorted(self.centre_ids, hospital_id)
+        if origin < 0 or column >= len(self.centre_ids) or self.centre_ids[column] != hospital_id:
+            return None
+        return float(self.hours[origin, column])
+
+    def centres(self, procuring_hospital_id, organ_type, elapsed_hours=0.0):
+        """(hospital_id, transport hours or None) of every centre the organ can go to"""
+        bit = self.type_bits.get(organ_type, 0)
+        origin = self._origin(procuring_hospital_id)
+        if origin < 0:
+            return [(hospital_id, None) for hospital_id, types in sorted(self.capabilities.items()) if types & bit]
+        row = ((self.feasible[origin] & bit) != 0) & (self.hours[origin] <= self._left(organ_type, elapsed_hours))
+        located = set(self.centre_ids.tolist())
+        choices = [(int(self.centre_ids[c]), float(self.hours[origin, c])) for c in np.flatnonzero(row)]
+        # Centres that are not geocoded cannot be ruled out on distance
+        choices += [
+            (hospital_id, None) for hospital_id, types in sorted(self.capabilities.items())
+            if types & bit and hospital_id not in located
+        ]
+        return choices
+
+    def listing_mask(self, procuring_hospital_id, organ_type, elapsed_hours=0.0):
+        """Per geo position: can a recipient listed there take this organ?
+        None when the procuring hospital is not located (nothing is pruned)"""
+        origin = self._origin(procuring_hospital_id)
+        if origin < 0:
+            return None
+        mask = np.zeros(self.geo.size, dtype=bool)
+        mask[self.centre_positions] = (
+            ((self.feasible[origin] & self.type_bits.get(organ_type, 0)) != 0)
+            & (self.hours[origin] <= self._left(organ_type, elapsed_hours))
+        )
+        return mask
+
+    def memory_bytes(self):
+        return self.hours.nbytes + self.feasible.nbytes
+
+
+class FeasibilityCache:
+    """The current FeasibilityMatrix, rebuilt from the previous one when its tables change"""
+
+    def __init__(self):
+        self._matrix = None
+        self._lock = threading.Lock()
+        self.stats = {'builds': 0, 'cells_measured': 0, 'build_seconds': 0.0}
+
+    def get(self):
+        current = table_versions(*FEASIBILITY_TABLES)
+        matrix = self._matrix
+        if matrix is None or matrix.versions != current:
+            with self._lock:
+                matrix = self._matrix
+                if matrix is None or matrix.versions != current:
+                    matrix = self._matrix = FeasibilityMatrix.load(previous=matrix)
+                    self.stats['builds'] += 1
+                    self.stats['cells_measured'] += matrix.measured
+                    self.stats['build_seconds'] += matrix.build_seconds
+        return matrix
+
+    def snapshot(self):
+        matrix = self._matrix
+        return {
+            'loaded': matrix is not None,
+            'procuring_locations': matrix.geo.size if matrix else 0,
+            'centres': len(matrix.centre_ids) if matrix else 0,
+            'memory_bytes': matrix.memory_bytes() if matrix else 0,
+            **self.stats,
+        }
+
+
+_cache = FeasibilityCache()
+
+
+def feasibility():
+    return _cache.get()
+
+
+def feasibility_stats():
+    return _cache.snapshot()
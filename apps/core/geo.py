@@ -0,0 +1,150 @@
+"""Hospital coordinates for distance-based matching.
+
+Hospitals are geocoded from their 5-digit zipcode through ``Zip_Centroid``, a
+local table of zip centroids (``python manage.py load_zip_centroids`` imports
+the Census ZCTA gazetteer file), so no lookup leaves the server. An organ is
+located at its procuring hospital and a recipient at their listing hospital.
+
+``locations()`` is the current ``HospitalLocations``: coordinates of every
+geocoded hospital as arrays, plus a grid of ``GRID_DEGREES`` lat/lon cells.
+Distances from one hospital to all others are one vectorised haversine pass;
+``within(position, miles)`` only measures the hospitals in the grid cells that
+the radius overlaps. It is rebuilt when the hospital or zip centroid tables
+change, in any process: ``load_zip_centroids`` bumps the version in the
+shared cache, so running servers reload without a restart.
+"""
+import math
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Hospital
+from .signals import table_versions
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LATITUDE = 69.0
+GRID_DEGREES = 1.0
+GEO_TABLES = ('hospital', 'zip_centroid')
+
+
+def zip5(zipcode):
+    """'02114-2696' -> '02114'; None for anything else"""
+    digits = (zipcode or '').strip()[:5]
+    return digits if len(digits) == 5 and digits.isdigit() else None
+
+
+def _cell(lat, lon):
+    return (math.floor(lat / GRID_DEGREES), math.floor(lon / GRID_DEGREES))
+
+
+class HospitalLocations:
+    """Coordinates of the geocoded hospitals, sorted by Hospital_ID"""
+
+    def __init__(self, rows, versions):
+        self.versions = versions
+        rows = sorted(rows)
+        self.size = len(rows)
+        self.hospital_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=self.size)
+        self.latitude = np.fromiter((row[1] for row in rows), dtype=np.float64, count=self.size)
+        self.longitude = np.fromiter((row[2] for row in rows), dtype=np.float64, count=self.size)
+        self._lat_radians = np.radians(self.latitude)
+        self._lon_radians = np.radians(self.longitude)
+        self._cos_lat = np.cos(self._lat_radians)
+        cells = defaultdict(list)
+        for position, (_, lat, lon) in enumerate(rows):
+            cells[_cell(lat, lon)].append(position)
+        self._grid = {cell: np.array(positions, dtype=np.int64) for cell, positions in cells.items()}
+
+    @classmethod
+    def load(cls):
+        versions = table_versions(*GEO_TABLES)
+        # Outlives the request, so it is always loaded from the primary
+        hospitals = [
+            (hospital_id, zip5(zipcode))
+            for hospital_id, zipcode in Hospital.objects.using(DEFAULT_DB_ALIAS).values_list('hospital_id', 'zipcode')
+        ]
+        zipcodes = sorted({zipcode for _, zipcode in hospitals if zipcode})
+        centroids = {}
+        if zipcodes:
+            with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                cursor.execute(
+                    'SELECT Zipcode, Latitude, Longitude FROM Zip_Centroid WHERE Zipcode IN ({})'.format(
+                        ', '.join(['%s'] * len(zipcodes))),
+                    zipcodes,
+                )
+                centroids = {zipcode: (float(lat), float(lon)) for zipcode, lat, lon in cursor.fetchall()}
+        rows = [(hospital_id, *centroids[zipcode]) for hospital_id, zipcode in hospitals if zipcode in centroids]
+        return cls(rows, versions)
+
+    def positions(self, hospital_ids):
+        """Array position of each hospital id; -1 where it is not geocoded"""
+        hospital_ids = np.asarray(hospital_ids, dtype=np.int64)
+        if not self.size:
+            return np.full(len(hospital_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.hospital_ids, hospital_ids), self.size - 1)
+        return np.where(self.hospital_ids[positions] == hospital_ids, positions, -1)
+
+    def position(self, hospital_id):
+        if hospital_id is None:
+            return -1
+        return int(self.positions([hospital_id])[0])
+
+    def distances(self, position, targets=None):
+        """Great-circle miles from the hospital at ``position`` to ``targets`` (default: all)"""
+        if targets is None:
+            targets = slice(None)
+        lat, lon = self._lat_radians[position], self._lon_radians[position]
+        half_dlat = (self._lat_radians[targets] - lat) / 2
+        half_dlon = (self._lon_radians[targets] - lon) / 2
+        a = np.sin(half_dlat) ** 2 + math.cos(lat) * self._cos_lat[targets] * np.sin(half_dlon) ** 2
+        return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def within(self, position, miles):
+        """Positions of the hospitals within ``miles`` of the one at ``position``"""
+        lat, lon = float(self.latitude[position]), float(self.longitude[position])
+        dlat = miles / MILES_PER_DEGREE_LATITUDE
+        widest = max(abs(lat) + dlat, 0.0)
+        if widest >= 90:
+            dlon = 180.0
+        else:
+            dlon = min(miles / (MILES_PER_DEGREE_LATITUDE * math.cos(math.radians(widest))), 180.0)
+        low, high = _cell(lat - dlat, lon - dlon), _cell(lat + dlat, lon + dlon)
+        wrap = round(360 / GRID_DEGREES)
+        half = wrap // 2
+        nearby = []
+        for lat_cell in range(low[0], high[0] + 1):
+            for lon_cell in range(low[1], min(high[1], low[1] + wrap - 1) + 1):
+                cell = self._grid.get((lat_cell, (lon_cell + half) % wrap - half))
+                if cell is not None:
+                    nearby.append(cell)
+        if not nearby:
+            return np.array([], dtype=np.int64)
+        nearby = np.concatenate(nearby)
+        return nearby[self.distances(position, nearby) <= miles]
+
+
+class LocationCache:
+    """The current HospitalLocations, rebuilt when the geo tables change"""
+
+    def __init__(self):
+        self._locations = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        current = table_versions(*GEO_TABLES)
+        locations = self._locations
+        if locations is None or locations.versions != current:
+            with self._lock:
+                locations = self._locations
+                if locations is None or locations.versions != current:
+                    locations = self._locations = HospitalLocations.load()
+        return locations
+
+
+_cache = LocationCache()
+
+
+def locations():
+    return _cache.get()
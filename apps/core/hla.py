@@ -0,0 +1,210 @@
+"""HLA typings as per-locus antigen bitsets.
+
+``HLA_Type`` is free text ("A1, A2, B8, B44, DR3, DR15", "A1-B7-DR3",
+"A*02:01 B*44:02 DRB1*15:01"). It is parsed once, when an organ or recipient
+is written, into three integers - one bit per broad antigen of HLA-A, -B and
+-DR - stored next to the text (``HLA_A_Bits``, ``HLA_B_Bits``,
+``HLA_DR_Bits``). Split antigens count as their broad (A24 -> A9, DR15 ->
+DR2) and allele typings as their serological antigen, so "A*24:02" = A24 = A9.
+Other loci (C, DQ, DP, Bw4/Bw6, DR51-53) are ignored.
+
+A donor antigen the recipient does not have at the same locus is a mismatch,
+so a pair has 0-6 A/B/DR mismatches (fewer when the donor is homozygous). For
+a whole candidate set that is one AND + compare per donor antigen over the
+recipient columns (``mismatch_counts``); ``CalculateCompatibilityScore``
+computes the same with ``BIT_COUNT(donor & ~recipient)``.
+
+Bit positions are stored in the database: only ever append to the tables below.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+from django.db import transaction
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import Organ, Recipient
+from .signals import notify_tables_changed
+
+LOCI = ('A', 'B', 'DR')
+
+# Broad antigens per locus, in bit order (append only)
+BROAD_ANTIGENS = {
+    'A': ('A1', 'A2', 'A3', 'A9', 'A10', 'A11', 'A19', 'A28', 'A36', 'A43', 'A80'),
+    'B': ('B5', 'B7', 'B8', 'B12', 'B13', 'B14', 'B15', 'B16', 'B17', 'B18', 'B21', 'B22', 'B27',
+          'B35', 'B37', 'B40', 'B41', 'B42', 'B46', 'B47', 'B48', 'B53', 'B59', 'B67', 'B70', 'B73',
+          'B78', 'B81', 'B82'),
+    'DR': ('DR1', 'DR103', 'DR2', 'DR3', 'DR4', 'DR5', 'DR6', 'DR7', 'DR8', 'DR9', 'DR10'),
+}
+
+# Split (and associated) antigens -> broad
+SPLITS = {
+    'A203': 'A2', 'A210': 'A2',
+    'A23': 'A9', 'A24': 'A9', 'A2403': 'A9',
+    'A25': 'A10', 'A26': 'A10', 'A34': 'A10', 'A66': 'A10',
+    'A29': 'A19', 'A30': 'A19', 'A31': 'A19', 'A32': 'A19', 'A33': 'A19', 'A74': 'A19',
+    'A68': 'A28', 'A69': 'A28',
+    'B51': 'B5', 'B52': 'B5', 'B5102': 'B5', 'B5103': 'B5',
+    'B703': 'B7',
+    'B44': 'B12', 'B45': 'B12',
+    'B64': 'B14', 'B65': 'B14',
+    'B62': 'B15', 'B63': 'B15', 'B75': 'B15', 'B76': 'B15', 'B77': 'B15',
+    'B38': 'B16', 'B39': 'B16', 'B3901': 'B16', 'B3902': 'B16',
+    'B57': 'B17', 'B58': 'B17',
+    'B49': 'B21', 'B50': 'B21', 'B4005': 'B21',
+    'B54': 'B22', 'B55': 'B22', 'B56': 'B22',
+    'B2708': 'B27',
+    'B60': 'B40', 'B61': 'B40',
+    'B71': 'B70', 'B72': 'B70',
+    'DR15': 'DR2', 'DR16': 'DR2',
+    'DR17': 'DR3', 'DR18': 'DR3',
+    'DR1403': 'DR6', 'DR1404': 'DR6',
+    'DR11': 'DR5', 'DR12': 'DR5',
+    'DR13': 'DR6', 'DR14': 'DR6',
+}
+
+ANTIGEN_BITS = {
+    antigen: (locus, 1 << position)
+    for locus, antigens in BROAD_ANTIGENS.items()
+    for position, antigen in enumerate(antigens)
+}
+for _split, _broad in SPLITS.items():
+    ANTIGEN_BITS[_split] = ANTIGEN_BITS[_broad]
+
+TOKEN_SEPARATORS = re.compile(r'[\s,;/]+|(?<=\d)-')
+# A*02:01, B*44, DRB1*15:01 -> locus and allele group
+ALLELE = re.compile(r'^(A|B|DRB1)\*(\d{1,3})(?::\w+)*[A-Z]?$')
+SEROLOGICAL = re.compile(r'^(A|B|DR)(\d{1,4})$')
+IGNORED = re.compile(r'^(C|CW|DQ|DQA1|DQB1|DP|DPA1|DPB1|DRB[345]|BW)[\d*:]|^DR5[123]$')
+
+UNTYPED = (0, 0, 0)
+BIT_FIELDS = ('hla_a_bits', 'hla_b_bits', 'hla_dr_bits')
+DEFAULT_BATCH_SIZE = 5000
+
+
+class HLAError(ValueError):
+    pass
+
+
+def _antigen(token):
+    token = token.upper()
+    if token.startswith('HLA-'):
+        token = token[4:]
+    if IGNORED.match(token):
+        return None
+    allele = ALLELE.match(token)
+    if allele:
+        locus, group = allele.groups()
+        return f"{'DR' if locus == 'DRB1' else locus}{int(group)}"
+    if SEROLOGICAL.match(token):
+        return token
+    raise HLAError(f'Unrecognised HLA antigen "{token}"')
+
+
+@lru_cache(maxsize=4096)
+def parse_hla(hla_type):
+    """(A, B, DR) bitsets for an HLA typing; UNTYPED for an empty one"""
+    bits = dict.fromkeys(LOCI, 0)
+    for token in TOKEN_SEPARATORS.split(hla_type or ''):
+        if not token:
+            continue
+        antigen = _antigen(token)
+        if antigen is None:
+            continue
+        if antigen not in ANTIGEN_BITS:
+            raise HLAError(f'Unknown HLA antigen "{antigen}"')
+        locus, bit = ANTIGEN_BITS[antigen]
+        bits[locus] |= bit
+    return tuple(bits[locus] for locus in LOCI)
+
+
+def set_hla_bits(instance):
+    """Fill an Organ's or Recipient's bitset fields from its ``hla_type``"""
+    for field, bits in zip(BIT_FIELDS, parse_hla(instance.hla_type)):
+        setattr(instance, field, bits)
+
+
+@receiver(pre_save, sender=Organ)
+@receiver(pre_save, sender=Recipient)
+def encode_on_save(sender, instance, update_fields=None, **kwargs):
+    # bulk_create and update() skip this: callers use set_hla_bits themselves.
+    # The forms validate typings; a legacy one that does not parse must not
+    # block unrelated saves (e.g. a status change), so it is scored as untyped
+    if update_fields is None or 'hla_type' in update_fields:
+        try:
+            set_hla_bits(instance)
+        except HLAError:
+            for field, bits in zip(BIT_FIELDS, UNTYPED):
+                setattr(instance, field, bits)
+
+
+def hla_bits(instance):
+    return (instance.hla_a_bits, instance.hla_b_bits, instance.hla_dr_bits)
+
+
+def is_typed(bits):
+    """All three loci typed; anything less is scored as untyped"""
+    return all(bits)
+
+
+def antigen_names(bits):
+    """Broad antigens in a bitset triple, e.g. for display"""
+    return [
+        antigen for locus, locus_bits in zip(LOCI, bits)
+        for position, antigen in enumerate(BROAD_ANTIGENS[locus]) if locus_bits >> position & 1
+    ]
+
+
+def mismatch_count(donor, recipient):
+    """A/B/DR mismatches of one typed pair"""
+    return sum(bin(d & ~r).count('1') for d, r in zip(donor, recipient))
+
+
+def mismatch_counts(donor, recipient_a, recipient_b, recipient_dr):
+    """Mismatches of one typed donor against int64 columns of recipient bitsets"""
+    mismatches = np.zeros(len(recipient_a), dtype=np.int8)
+    for donor_bits, column in zip(donor, (recipient_a, recipient_b, recipient_dr)):
+        while donor_bits:
+            bit = donor_bits & -donor_bits
+            mismatches += (column & bit) == 0
+            donor_bits ^= bit
+    return mismatches
+
+
+def encode_stored(batch_size=DEFAULT_BATCH_SIZE):
+    """Re-encode the bitsets of every stored organ and recipient (after the
+    columns are added, or when the antigen tables grow); typings that do not
+    parse are left as untyped and counted"""
+    stats = {}
+    for model in (Organ, Recipient):
+        pk = model._meta.pk.name
+        counts = {'rows_scanned': 0, 'rows_updated': 0, 'unparsed': 0}
+        last = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    model.objects.filter(**{f'{pk}__gt': last}).order_by(pk)
+                    .only(pk, 'hla_type', *BIT_FIELDS)[:batch_size]
+                )
+                if not rows:
+                    break
+                changed = []
+                for row in rows:
+                    try:
+                        bits = parse_hla(row.hla_type)
+                    except HLAError:
+                        counts['unparsed'] += 1
+                        bits = UNTYPED
+                    if bits != hla_bits(row):
+                        for field, value in zip(BIT_FIELDS, bits):
+                            setattr(row, field, value)
+                        changed.append(row)
+                model.objects.bulk_update(changed, BIT_FIELDS)
+            counts['rows_scanned'] += len(rows)
+            counts['rows_updated'] += len(changed)
+            last = getattr(rows[-1], pk)
+        if counts['rows_updated']:
+            notify_tables_changed(model._meta.db_table)
+        stats[model._meta.db_table] = counts
+    return stats
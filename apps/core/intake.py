@@ -0,0 +1,87 @@
+"""Procurement intake: every organ recovered from one donor in one transaction.
+
+A deceased donor usually yields 5-8 organs. ``record_procurement`` checks the
+donor once (locking its row, so two intakes for the same donor serialise),
+inserts all organs with one multi-row INSERT and schedules the initial offers
+for the whole batch (``offers.schedule_offers``: one more INSERT, inline or
+after commit). ``before_organ_insert`` still stamps each organ's viability
+deadline and repeats the donor check as a backstop.
+"""
+from django.db import transaction
+
+from .hla import HLAError, set_hla_bits
+from .matching import INITIAL_OFFER_COUNT
+from .models import Donor, Organ, OrganType
+from .offers import schedule_offers
+from .signals import notify_tables_changed
+
+MAX_BATCH_ORGANS = 8
+ELIGIBLE_DONOR_STATUSES = ('Active', 'Deceased')
+
+
+class IntakeError(ValueError):
+    pass
+
+
+def check_donor(donor):
+    """Same rules as before_organ_insert, checked once for the batch"""
+    if donor is None:
+        raise IntakeError('Donor does not exist')
+    if donor.status not in ELIGIBLE_DONOR_STATUSES:
+        raise IntakeError('Donor is not eligible. Status must be Active or Deceased')
+    if donor.medical_clearance_date is None:
+        raise IntakeError('Donor has no medical clearance date')
+
+
+def record_procurement(donor_id, organs, procurement_date, procurement_time, offer_limit=INITIAL_OFFER_COUNT,
+                       procuring_hospital_id=None):
+    """Insert ``organs`` (dicts with type_name, hla_type, size_weight) for one
+    donor and their initial offers; returns (organs, offers)"""
+    if not organs:
+        raise IntakeError('Add at least one organ')
+    if len(organs) > MAX_BATCH_ORGANS:
+        raise IntakeError(f'At most {MAX_BATCH_ORGANS} organs per donor')
+
+    known_types = set(OrganType.objects.filter(
+        type_name__in={organ['type_name'] for organ in organs}
+    ).values_list('type_name', flat=True))
+    unknown = sorted({organ['type_name'] for organ in organs} - known_types)
+    if unknown:
+        raise IntakeError(f"Unknown organ type: {', '.join(unknown)}")
+
+    rows = [
+        Organ(
+            type_name_id=organ['type_name'],
+            procurement_date=procurement_date,
+            procurement_time=procurement_time,
+            hla_type=organ.get('hla_type') or None,
+            size_weight=organ.get('size_weight') or None,
+            procuring_hospital_id=procuring_hospital_id,
+            status='Available',
+        )
+        for organ in organs
+    ]
+    for row in rows:
+        # bulk_create does not send pre_save
+        try:
+            set_hla_bits(row)
+        except HLAError as e:
+            raise IntakeError(str(e))
+
+    with transaction.atomic():
+        donor = Donor.objects.select_for_update().filter(donor_id=donor_id).first()
+        check_donor(donor)
+
+        for row in rows:
+            row.donor_id = donor.donor_id
+        Organ.objects.bulk_create(rows)
+        # MySQL does not return ids from a multi-row INSERT; the donor row lock
+        # makes this donor's newest organs the ones just inserted
+        created = list(
+            Organ.objects.filter(donor_id=donor.donor_id)
+            .select_related('donor', 'type_name')
+            .order_by('-organ_id')[:len(organs)]
+        )[::-1]
+        offers = schedule_offers(created, limit=offer_limit)
+        notify_tables_changed(Organ._meta.db_table)
+    return created, offers
@@ -0,0 +1,169 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from apps.core.allocation import AllocationError, allocate, allocation_stats, respond
+from apps.core.matching import BLOOD_TYPES
+from apps.core.procedures import call_procedure_row
+from apps.core.models import Donor, Organ, OrganAllocation, OrganType, Recipient, RecipientWaitlist
+
+BENCH_TYPE = 'Bench_Organ'
+
+# Organs holding more than one live allocation, or whose status disagrees with them
+DOUBLE_ALLOCATIONS_SQL = """
+    SELECT COUNT(*) FROM (
+        SELECT Organ_ID FROM Organ_Allocation
+        WHERE Organ_ID IN ({organs}) AND Status IN ('Pending', 'Accepted')
+        GROUP BY Organ_ID HAVING COUNT(*) > 1
+    ) AS doubled
+"""
+INCONSISTENT_SQL = """
+    SELECT COUNT(*) FROM Organ o
+    WHERE o.Organ_ID IN ({organs})
+      AND (o.Status = 'Allocated') <> EXISTS (
+          SELECT 1 FROM Organ_Allocation a WHERE a.Organ_ID = o.Organ_ID AND a.Status IN ('Pending', 'Accepted')
+      )
+"""
+
+
+class Command(BaseCommand):
+    help = 'Concurrent allocate/respond stress test: allocations/sec and a double-allocation check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--seconds', type=float, default=30)
+        parser.add_argument('--organs', type=int, default=50,
+                            help='Organs competed for; fewer organs means more contention')
+        parser.add_argument('--recipients', type=int, default=500)
+        parser.add_argument('--accept-rate', type=float, default=0.1,
+                            help='Share of allocations accepted (the rest are rejected and re-offered)')
+        parser.add_argument('--procedure', action='store_true',
+                            help='Allocate with CALL AllocateOrgan instead of the allocation service')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if min(options['threads'], options['organs'], options['recipients']) < 1 or options['seconds'] <= 0:
+            raise CommandError('--threads, --seconds, --organs and --recipients must be positive')
+
+        organ_ids, recipient_ids = self.build(options['organs'], options['recipients'], random.Random(options['seed']))
+        try:
+            counts, elapsed = self.run(organ_ids, recipient_ids, options)
+            doubled, inconsistent = self.verify(organ_ids)
+        finally:
+            self.clean_up(organ_ids, recipient_ids)
+
+        self.stdout.write(f"threads: {options['threads']}  organs: {len(organ_ids)}  seconds: {elapsed:.1f}")
+        self.stdout.write(f"allocations: {counts['allocated']} ({counts['allocated'] / elapsed:.1f}/s)")
+        self.stdout.write(f"responses: {counts['responded']}  conflicts: {counts['conflicts']}  errors: {counts['errors']}")
+        self.stdout.write(f"deadlock retries: {counts['retries']}  gave up: {counts['gave_up']}")
+        self.stdout.write(f'double allocations: {doubled}  organ/allocation mismatches: {inconsistent}')
+        if doubled or inconsistent or counts['errors']:
+            raise CommandError('Allocation invariants violated')
+        self.stdout.write(self.style.SUCCESS('No double allocations'))
+
+    def build(self, organ_count, recipient_count, rng):
+        """Committed bench rows - the allocators run on their own connections"""
+        with transaction.atomic():
+            OrganType.objects.get_or_create(
+                type_name=BENCH_TYPE, defaults={'typical_viability_hours': 48, 'cold_ischemia_time_max': 48}
+            )
+            today = date.today()
+            donor = Donor.objects.create(
+                name='Bench Donor', date_of_birth=date(1980, 1, 1), blood_type='O-', donor_type='Deceased',
+                registration_date=today, medical_clearance_date=today, status='Deceased',
+            )
+            first_id = (Recipient.objects.aggregate(top=Max('recipient_id'))['top'] or 0) + 1
+            recipient_ids = list(range(first_id, first_id + recipient_count))
+            Recipient.objects.bulk_create([
+                Recipient(
+                    recipient_id=recipient_id, name=f'Bench Recipient {recipient_id}', date_of_birth=date(1970, 1, 1),
+                    blood_type=rng.choice(BLOOD_TYPES), medical_urgency_level=rng.randint(1, 5),
+                    registration_date=today, status='Waiting',
+                )
+                for recipient_id in recipient_ids
+            ])
+            RecipientWaitlist.objects.bulk_create([
+                RecipientWaitlist(recipient_id=recipient_id, type_name_id=BENCH_TYPE, wait_list_date=today, status='Waiting')
+                for recipient_id in recipient_ids
+            ])
+            now = datetime.now()
+            Organ.objects.bulk_create([
+                Organ(donor_id=donor.donor_id, type_name_id=BENCH_TYPE, procurement_date=now.date(),
+                      procurement_time=now.time().replace(microsecond=0), status='Available')
+                for _ in range(organ_count)
+            ])
+            organ_ids = list(Organ.objects.filter(donor_id=donor.donor_id).values_list('organ_id', flat=True))
+        return organ_ids, recipient_ids
+
+    def clean_up(self, organ_ids, recipient_ids):
+        with transaction.atomic():
+            donor_ids = set(Organ.objects.filter(organ_id__in=organ_ids).values_list('donor_id', flat=True))
+            OrganAllocation.objects.filter(organ_id__in=organ_ids).delete()
+            Organ.objects.filter(organ_id__in=organ_ids).delete()
+            RecipientWaitlist.objects.filter(recipient_id__in=recipient_ids).delete()
+            Recipient.objects.filter(recipient_id__in=recipient_ids).delete()
+            Donor.objects.filter(donor_id__in=donor_ids).delete()
+            if not Organ.objects.filter(type_name_id=BENCH_TYPE).exists():
+                OrganType.objects.filter(type_name=BENCH_TYPE).delete()
+
+    def run(self, organ_ids, recipient_ids, options):
+        counts = {'allocated': 0, 'responded': 0, 'conflicts': 0, 'errors': 0}
+        lock = threading.Lock()
+        stop_at = time.monotonic() + options['seconds']
+        before = allocation_stats()
+
+        def add(**deltas):
+            with lock:
+                for field, delta in deltas.items():
+                    counts[field] += delta
+
+        def allocate_with_procedure(organ_id, recipient_id):
+            result = call_procedure_row('AllocateOrgan', [organ_id, recipient_id]) or {}
+            if 'Success' not in str(result.get('Message', '')):
+                raise AllocationError(result.get('Message'))
+            return OrganAllocation.objects.get(allocation_id=result['Allocation_ID'])
+
+        allocate_one = allocate_with_procedure if options['procedure'] else allocate
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                while time.monotonic() < stop_at:
+                    try:
+                        allocation = allocate_one(rng.choice(organ_ids), rng.choice(recipient_ids))
+                        add(allocated=1)
+                        response = 'Accepted' if rng.random() < options['accept_rate'] else 'Rejected'
+                        respond(allocation.allocation_id, response)
+                        add(responded=1)
+                    except AllocationError:
+                        add(conflicts=1)
+                    except Exception as e:
+                        add(errors=1)
+                        self.stderr.write(f'{type(e).__name__}: {e}')
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(worker, range(options['seed'], options['seed'] + options['threads'])))
+        elapsed = time.perf_counter() - started
+
+        after = allocation_stats()
+        counts['retries'] = after['retries'] - before['retries']
+        counts['gave_up'] = after['gave_up'] - before['gave_up']
+        return counts, elapsed
+
+    def verify(self, organ_ids):
+        placeholders = ', '.join(['%s'] * len(organ_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(DOUBLE_ALLOCATIONS_SQL.format(organs=placeholders), organ_ids)
+            doubled = cursor.fetchone()[0]
+            cursor.execute(INCONSISTENT_SQL.format(organs=placeholders), organ_ids)
+            inconsistent = cursor.fetchone()[0]
+        return doubled, inconsistent
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+
+from apps.core.api import MAX_IN_FLIGHT
+from apps.core.models import Organ, User
+
+
+class Command(BaseCommand):
+    help = 'Requests/sec of the JSON API through the ASGI handler versus the WSGI handler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per path and handler')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Concurrent clients (WSGI: threads, ASGI: tasks on one event loop)')
+        parser.add_argument('--role', default='Medical_Staff')
+        parser.add_argument('--path', action='append', dest='paths', metavar='URL',
+                            help='Path to request (repeatable; default: organ list, organ detail, waitlist)')
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency']) < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        if options['concurrency'] > MAX_IN_FLIGHT:
+            self.stdout.write(self.style.WARNING(
+                f'--concurrency is above MAX_IN_FLIGHT ({MAX_IN_FLIGHT}); expect 503s'
+            ))
+
+        cookie = self.session_cookie(options['role'])
+        paths = options['paths'] or self.default_paths()
+        total, concurrency = options['requests'], options['concurrency']
+
+        self.stdout.write(f"{'path':<40} {'handler':<7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+        for path in paths:
+            for name, bench in (('wsgi', self.bench_wsgi), ('asgi', self.bench_asgi)):
+                bench(path, cookie, concurrency, 5)  # warm caches and connections
+                elapsed, latencies, errors = bench(path, cookie, concurrency, total)
+                latencies.sort()
+                self.stdout.write(
+                    f'{path:<40} {name:<7} {total / elapsed:>9.1f} '
+                    f'{latencies[len(latencies) // 2]:>8.1f} {latencies[int(len(latencies) * 0.95)]:>8.1f} {errors:>6}'
+                )
+
+    def session_cookie(self, role):
+        user = User.objects.filter(role=role).first()
+        if user is None:
+            raise CommandError(f'No user with role {role} - run generate_dataset or load sample data first')
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session['user_id'] = user.user_id
+        session['username'] = user.username
+        session['role'] = role
+        session.save()
+        return session.session_key
+
+    def default_paths(self):
+        paths = ['/api/v1/organs/', '/api/v1/waitlist/']
+        organ_id = Organ.objects.filter(status='Available').values_list('organ_id', flat=True).first()
+        if organ_id:
+            paths.insert(1, f'/api/v1/organs/{organ_id}/')
+        return paths
+
+    def bench_wsgi(self, path, cookie, concurrency, total):
+        # One Client per thread, as a WSGI server runs one request per thread
+        def worker(count):
+            client = Client()
+            client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+            latencies, errors = [], 0
+            for _ in range(count):
+                started = time.perf_counter()
+                response = client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 400
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(worker, _split(total, concurrency)))
+        return _collect(time.perf_counter() - started, results)
+
+    def bench_asgi(self, path, cookie, concurrency, total):
+        async def worker(count):
+            client = AsyncClient()
+            client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+            latencies, errors = [], 0
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 400
+            return latencies, errors
+
+        async def run():
+            return await asyncio.gather(*(worker(count) for count in _split(total, concurrency)))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        return _collect(time.perf_counter() - started, results)
+
+
+def _split(total, parts):
+    return [count for count in (total // parts + (i < total % parts) for i in range(parts)) if count]
+
+
+def _collect(elapsed, results):
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    return elapsed, latencies, sum(errors for _, errors in results)
@@ -0,0 +1,104 @@
+import statistics
+import time
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.accounts import authenticate, last_login_writer
+from apps.core.models import User
+
+BENCH_USERNAME = 'bench_auth_admin'
+BENCH_PASSWORD = 'bench-auth-password'
+
+SESSION_ENGINES = (
+    ('db (before)', 'django.contrib.sessions.backends.db'),
+    ('cached_db', 'django.contrib.sessions.backends.cached_db'),
+    ('signed_cookies', 'django.contrib.sessions.backends.signed_cookies'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Authenticated-request overhead per session backend, and login cost before/after'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--logins', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['logins']) < 1:
+            raise CommandError('--requests and --logins must be positive')
+
+        user = User.objects.create(
+            username=BENCH_USERNAME, email=f'{BENCH_USERNAME}@example.invalid', password_hash=BENCH_PASSWORD,
+            role='Administrator', account_status='Active', created_date=date.today(),
+        )
+        try:
+            # A protected view that does no work of its own, so the time is auth + session
+            url = reverse('core:report_cache_stats')
+            self.stdout.write(f"{'session backend':<16} {'median ms':>10} {'queries':>8}   ({url})")
+            for label, engine in SESSION_ENGINES:
+                with override_settings(SESSION_ENGINE=engine):
+                    median_ms, queries = self.bench_requests(user, url, options['requests'])
+                self.stdout.write(f'{label:<16} {median_ms:>10.3f} {queries:>8}')
+
+            self.stdout.write(f"\n{'login':<28} {'median ms':>10} {'queries':>8}")
+            for label, login in (
+                ('plaintext + save() (before)', self.login_before),
+                ('first login (rehash)', self.login_after),
+                ('hashed', self.login_after),
+            ):
+                median_ms, queries = self.bench_login(login, 1 if label.startswith('first') else options['logins'])
+                self.stdout.write(f'{label:<28} {median_ms:>10.3f} {queries:>8}')
+                if label.endswith('(before)'):
+                    # Back to the legacy plaintext value so the next row measures the upgrade
+                    User.objects.filter(user_id=user.user_id).update(password_hash=BENCH_PASSWORD)
+        finally:
+            last_login_writer.flush()
+            User.objects.filter(user_id=user.user_id).delete()
+
+    def bench_requests(self, user, url, count):
+        client = Client()
+        session = client.session
+        session['user_id'] = user.user_id
+        session['username'] = user.username
+        session['role'] = user.role
+        session.save()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+        client.get(url)
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.get(url)
+            samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        return statistics.median(samples), len(queries)
+
+    def login_before(self):
+        user = User.objects.get(username=BENCH_USERNAME)
+        if not (user.password_hash == BENCH_PASSWORD or check_password(BENCH_PASSWORD, user.password_hash)):
+            raise CommandError('Bench login failed')
+        user.last_login = timezone.now()
+        user.save()
+
+    def login_after(self):
+        authenticate(BENCH_USERNAME, BENCH_PASSWORD)
+
+    def bench_login(self, login, count):
+        samples = []
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                login()
+                samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples), len(queries)
@@ -0,0 +1,41 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.exclusions import ExclusionIndex
+
+
+class Command(BaseCommand):
+    help = 'Exclusion index build time, memory and lookups for synthetic Incompatible pairs (no database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pairs', type=int, default=10000000)
+        parser.add_argument('--donors', type=int, default=2000000)
+        parser.add_argument('--recipients', type=int, default=5000000)
+        parser.add_argument('--lookups', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if min(options['pairs'], options['donors'], options['recipients'], options['lookups']) < 1:
+            raise CommandError('Every count must be positive')
+        rng = np.random.default_rng(options['seed'])
+        donor_ids = rng.integers(1, options['donors'] + 1, options['pairs'])
+        recipient_ids = rng.integers(1, options['recipients'] + 1, options['pairs'])
+
+        index = ExclusionIndex()
+        started = time.perf_counter()
+        index.build(donor_ids, recipient_ids)
+        build_seconds = time.perf_counter() - started
+
+        samples = []
+        for donor_id in rng.integers(1, options['donors'] + 1, options['lookups']).tolist():
+            started = time.perf_counter()
+            index.lookup(donor_id)
+            samples.append((time.perf_counter() - started) * 1e6)
+
+        self.stdout.write(f"{options['pairs']} pairs over {options['donors']} donors")
+        self.stdout.write(f'build            {build_seconds:>10.2f} s')
+        self.stdout.write(f'memory           {index.memory_bytes() / 2 ** 20:>10.1f} MiB')
+        self.stdout.write(f'lookup median    {statistics.median(samples):>10.2f} us')
@@ -0,0 +1,69 @@
+import random
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.dataset import ORGAN_TYPES, PROGRAM_SHARE
+from apps.core.feasibility import FeasibilityMatrix
+from apps.core.geo import HospitalLocations
+
+
+class Command(BaseCommand):
+    help = 'Feasibility matrix build, incremental refresh and lookups over synthetic hospitals (no database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospitals', type=int, default=5000)
+        parser.add_argument('--centres', type=int, default=250)
+        parser.add_argument('--lookups', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if min(options['hospitals'], options['centres'], options['lookups']) < 1:
+            raise CommandError('Every count must be positive')
+        if options['centres'] > options['hospitals']:
+            raise CommandError('--centres cannot exceed --hospitals')
+        rng = random.Random(options['seed'])
+        budgets = {name: cold for name, _, cold, _, _ in ORGAN_TYPES}
+
+        # Continental US bounding box
+        rows = [(i, rng.uniform(25, 49), rng.uniform(-124, -67)) for i in range(1, options['hospitals'] + 1)]
+        centres = rng.sample(range(1, options['hospitals'] + 1), options['centres'])
+        capabilities = [
+            (hospital_id, type_name) for hospital_id in centres
+            for type_name, share in PROGRAM_SHARE.items() if rng.random() < share
+        ]
+
+        matrix, full = self.timed(lambda: FeasibilityMatrix(HospitalLocations(rows, None), capabilities, budgets, None))
+        # One hospital moves and one new centre opens
+        moved = list(rows)
+        moved[0] = (rows[0][0], rows[0][1] + 0.5, rows[0][2])
+        opened = [hospital_id for hospital_id in range(1, options['hospitals'] + 1) if hospital_id not in set(centres)][0]
+        changed, incremental = self.timed(lambda: FeasibilityMatrix(
+            HospitalLocations(moved, None), capabilities + [(opened, 'Kidney')], budgets, None, previous=matrix
+        ))
+        rebuilt = FeasibilityMatrix(HospitalLocations(moved, None), capabilities + [(opened, 'Kidney')], budgets, None)
+        if not np.array_equal(changed.feasible, rebuilt.feasible):
+            raise CommandError('Incremental refresh differs from a full build')
+
+        origins = [rng.randint(1, options['hospitals']) for _ in range(options['lookups'])]
+        samples = []
+        for origin in origins:
+            started = time.perf_counter()
+            matrix.listing_mask(origin, 'Heart')
+            samples.append((time.perf_counter() - started) * 1e6)
+
+        self.stdout.write(f"{options['hospitals']} procuring locations x {len(matrix.centre_ids)} centres")
+        self.stdout.write(f'full build       {full:>10.1f} ms  ({matrix.measured} transport times)')
+        self.stdout.write(f'incremental      {incremental:>10.1f} ms  ({changed.measured} transport times)')
+        self.stdout.write(f'memory           {matrix.memory_bytes() / 2 ** 20:>10.1f} MiB')
+        self.stdout.write(f'row lookup       {statistics.median(samples):>10.1f} us median')
+        for type_name in matrix.type_names:
+            reachable = (matrix.feasible & matrix.type_bits[type_name]).astype(bool).sum(axis=1)
+            self.stdout.write(f'{type_name:<16} {reachable.mean():>10.1f} centres reachable on average')
+
+    def timed(self, build):
+        started = time.perf_counter()
+        result = build()
+        return result, (time.perf_counter() - started) * 1000
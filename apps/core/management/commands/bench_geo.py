@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.geo import HospitalLocations
+from apps.core.hla import UNTYPED
+from apps.core.matching import BLOOD_TYPES, WaitlistSnapshot, geographic_scores
+
+
+class Command(BaseCommand):
+    help = 'Radius queries over synthetic hospitals and a waitlist (no database): grid index vs full distance pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospitals', type=int, default=250)
+        parser.add_argument('--candidates', type=int, default=100000)
+        parser.add_argument('--miles', type=int, default=500)
+        parser.add_argument('--calls', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if min(options['hospitals'], options['candidates'], options['miles'], options['calls']) < 1:
+            raise CommandError('Every count must be positive')
+        rng = random.Random(options['seed'])
+        today = date.today()
+        miles = options['miles']
+
+        # Continental US bounding box
+        geo = HospitalLocations(
+            [(i, rng.uniform(25, 49), rng.uniform(-124, -67)) for i in range(1, options['hospitals'] + 1)], None
+        )
+        rows = [
+            (i, f'Recipient {i}', rng.choice(BLOOD_TYPES), rng.randint(1, 5), 0,
+             today - timedelta(days=rng.randint(0, 2000))) + UNTYPED + (rng.randint(1, options['hospitals']),)
+            for i in range(1, options['candidates'] + 1)
+        ]
+        snapshot = WaitlistSnapshot('Kidney', rows, None)
+        origin = rng.randrange(geo.size)
+
+        def full_pass():
+            positions = snapshot._layout(geo)[0]
+            distances = geo.distances(origin)[positions]
+            return np.flatnonzero(distances <= miles), geographic_scores(distances)
+
+        def grid():
+            candidates = snapshot._within(geo, origin, miles)
+            positions = snapshot._layout(geo)[0][candidates]
+            return candidates, geographic_scores(geo.distances(origin, positions))
+
+        found, expected = len(grid()[0]), len(full_pass()[0])
+        if found != expected:
+            raise CommandError(f'Grid found {found} candidates within {miles} miles, the full pass {expected}')
+
+        self.stdout.write(f"{options['hospitals']} hospitals, {options['candidates']} candidates, "
+                          f'{found} within {miles} miles: {"median ms":>10}')
+        for label, call in (
+            ('hospitals, full pass', lambda: geo.distances(origin) <= miles),
+            ('hospitals, grid', lambda: geo.within(origin, miles)),
+            ('candidates, full pass', full_pass),
+            ('candidates, grid', grid),
+        ):
+            self.stdout.write(f'{label:<22} {self.bench(call, options["calls"]):>10.3f}')
+
+    def bench(self, call, count):
+        call()
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
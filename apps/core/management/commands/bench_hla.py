@@ -0,0 +1,56 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.dataset import HLA_A, HLA_B, HLA_DR
+from apps.core.hla import UNTYPED, mismatch_count, mismatch_counts, parse_hla
+from apps.core.matching import BLOOD_TYPES, WaitlistSnapshot
+
+
+class Command(BaseCommand):
+    help = 'HLA mismatch scoring over a synthetic waitlist (no database): bitset columns vs per-pair'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=100000)
+        parser.add_argument('--calls', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['candidates'] < 1 or options['calls'] < 1:
+            raise CommandError('--candidates and --calls must be positive')
+        rng = random.Random(options['seed'])
+        today = date.today()
+
+        def typing():
+            return parse_hla(' '.join(rng.choice(locus) for locus in (HLA_A, HLA_A, HLA_B, HLA_B, HLA_DR, HLA_DR)))
+
+        rows = [
+            (i, f'Recipient {i}', rng.choice(BLOOD_TYPES), rng.randint(1, 5), 0,
+             today - timedelta(days=rng.randint(0, 2000))) + (typing() if rng.random() < 0.9 else UNTYPED) + (None,)
+            for i in range(1, options['candidates'] + 1)
+        ]
+        snapshot = WaitlistSnapshot('Kidney', rows, None)
+        donor = typing()
+        recipients = [row[6:] for row in rows]
+
+        self.stdout.write(f"{options['candidates']} candidates: {'median ms':>10}")
+        for label, call, count in (
+            ('mismatch_count loop', lambda: [mismatch_count(donor, r) for r in recipients], 3),
+            ('mismatch_counts', lambda: mismatch_counts(donor, snapshot.hla_a, snapshot.hla_b, snapshot.hla_dr),
+             options['calls']),
+            ('top, typed donor', lambda: snapshot.top('O+', donor, today=today), options['calls']),
+            ('top, untyped donor', lambda: snapshot.top('O+', today=today), options['calls']),
+        ):
+            self.stdout.write(f'{label:<22} {self.bench(call, count):>10.3f}')
+
+    def bench(self, call, count):
+        call()
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
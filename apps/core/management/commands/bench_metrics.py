@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from apps.core.metrics import timed_execute
+
+
+class Command(BaseCommand):
+    help = 'Overhead of the query wrapper and MetricsMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if min(options['queries'], options['requests']) < 1:
+            raise CommandError('--queries and --requests must be positive')
+
+        connection.ensure_connection()
+        wrappers = connection.execute_wrappers
+        installed = timed_execute in wrappers
+        try:
+            if installed:
+                wrappers.remove(timed_execute)
+            bare = self.bench_queries(options['queries'])
+            wrappers.append(timed_execute)
+            wrapped = self.bench_queries(options['queries'])
+        finally:
+            if timed_execute in wrappers and not installed:
+                wrappers.remove(timed_execute)
+        self.stdout.write(f"{'SELECT 1':<24} {'median us':>10}")
+        self.stdout.write(f"{'without wrapper':<24} {bare:>10.1f}")
+        self.stdout.write(f"{'with wrapper':<24} {wrapped:>10.1f}   (+{wrapped - bare:.1f} us/query)")
+
+        # A view with no queries of its own, so the difference is the middleware
+        url = reverse('core:metrics')
+        without = [name for name in settings.MIDDLEWARE if name != 'apps.core.metrics.MetricsMiddleware']
+        with override_settings(ALLOWED_HOSTS=['testserver'], MIDDLEWARE=without):
+            bare = self.bench_requests(url, options['requests'])
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            measured = self.bench_requests(url, options['requests'])
+        self.stdout.write(f"\n{url + ' (403)':<24} {'median us':>10}")
+        self.stdout.write(f"{'without middleware':<24} {bare:>10.1f}")
+        self.stdout.write(f"{'with middleware':<24} {measured:>10.1f}   (+{measured - bare:.1f} us/request)")
+
+    def bench_queries(self, count):
+        samples = []
+        with connection.cursor() as cursor:
+            for _ in range(count):
+                started = time.perf_counter()
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+                samples.append((time.perf_counter() - started) * 1e6)
+        return statistics.median(samples)
+
+    def bench_requests(self, url, count):
+        client = Client()
+        client.get(url)
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            client.get(url)
+            samples.append((time.perf_counter() - started) * 1e6)
+        return statistics.median(samples)
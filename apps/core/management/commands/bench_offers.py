@@ -0,0 +1,152 @@
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from apps.core.matching import BLOOD_TYPES, engine
+from apps.core.models import Donor, Organ, OrganType, Recipient, RecipientWaitlist
+from apps.core.offers import create_batch_offers, offerable_organs
+
+BENCH_TYPE = 'Bench_Organ'
+
+# Body of the retired after_organ_insert trigger, run after the INSERT the
+# way the trigger did: three stored functions per candidate row
+LEGACY_OFFERS_SQL = """
+    INSERT INTO Organ_Allocation (Organ_ID, Recipient_ID, Allocation_Date, Match_Score, Status, Response_Deadline)
+    SELECT %s, r.Recipient_ID, NOW(),
+        CASE
+            WHEN CheckBloodTypeCompatibility(d.Blood_Type, r.Blood_Type) = FALSE THEN 0
+            ELSE (
+                CASE WHEN d.Blood_Type = r.Blood_Type THEN 30.00 ELSE 20.00 END + 15.00 +
+                LEAST(CalculateWaitTimeDays(r.Recipient_ID, %s) / 30, 20) + 15.00 +
+                r.Medical_Urgency_Level * 2
+            )
+        END AS match_score,
+        'Pending',
+        DATE_ADD(NOW(), INTERVAL (GetRemainingViableHours(%s) * 0.5) HOUR)
+    FROM Recipient r
+    JOIN Recipient_Waitlist wl ON r.Recipient_ID = wl.Recipient_ID
+    JOIN Donor d ON d.Donor_ID = %s
+    WHERE wl.Type_Name = %s
+      AND wl.Status = 'Waiting'
+      AND r.Status = 'Waiting'
+      AND CheckBloodTypeCompatibility(d.Blood_Type, r.Blood_Type) = TRUE
+      AND NOT EXISTS (
+          SELECT 1 FROM Compatibility_Test ct
+          WHERE ct.Donor_ID = %s AND ct.Recipient_ID = r.Recipient_ID AND ct.Test_Result = 'Incompatible'
+      )
+    ORDER BY match_score DESC
+    LIMIT 3
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Organ insert latency with trigger-style, inline and deferred offer generation by waitlist size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma-separated waitlist sizes')
+        parser.add_argument('--repeat', type=int, default=20, help='Inserts timed per size and mode')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        if min(sizes + [options['repeat']]) < 1:
+            raise CommandError('--sizes and --repeat must be positive')
+
+        self.stdout.write(
+            f"{'waitlist':>9} {'trigger SQL':>12} {'inline cold':>12} {'inline warm':>12} "
+            f"{'deferred':>9} {'  + worker':>10}   (median ms per organ insert)"
+        )
+        for size in sizes:
+            # Everything for one size is written in a transaction that is rolled back
+            try:
+                with transaction.atomic():
+                    donor_id = self.build_waitlist(size, random.Random(options['seed']))
+                    results = self.measure(donor_id, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                engine.invalidate(BENCH_TYPE)
+            self.stdout.write(
+                f"{size:>9} {results['trigger']:>12.2f} {results['cold']:>12.2f} {results['warm']:>12.2f} "
+                f"{results['deferred']:>9.2f} {results['worker']:>10.2f}"
+            )
+
+    def build_waitlist(self, size, rng):
+        OrganType.objects.create(type_name=BENCH_TYPE, typical_viability_hours=24, cold_ischemia_time_max=24)
+        today = date.today()
+        first_id = (Recipient.objects.aggregate(top=Max('recipient_id'))['top'] or 0) + 1
+        recipients, waitlist = [], []
+        for recipient_id in range(first_id, first_id + size):
+            recipients.append(Recipient(
+                recipient_id=recipient_id, name=f'Bench Recipient {recipient_id}',
+                date_of_birth=date(1970, 1, 1), blood_type=rng.choice(BLOOD_TYPES),
+                medical_urgency_level=rng.randint(1, 5), registration_date=today, status='Waiting',
+            ))
+            waitlist.append(RecipientWaitlist(
+                recipient_id=recipient_id, type_name_id=BENCH_TYPE,
+                wait_list_date=today - timedelta(days=rng.randint(0, 5 * 365)), status='Waiting',
+            ))
+        Recipient.objects.bulk_create(recipients, batch_size=5000)
+        RecipientWaitlist.objects.bulk_create(waitlist, batch_size=5000)
+        donor = Donor.objects.create(
+            name='Bench Donor', date_of_birth=date(1980, 1, 1), blood_type='O-', donor_type='Deceased',
+            registration_date=today, medical_clearance_date=today, status='Deceased',
+        )
+        return donor.donor_id
+
+    def insert_organ(self, donor_id):
+        now = datetime.now()
+        return Organ.objects.create(
+            donor_id=donor_id, type_name_id=BENCH_TYPE, procurement_date=now.date(),
+            procurement_time=now.time().replace(microsecond=0), status='Available',
+        )
+
+    def timed(self, donor_id, repeat, after_insert):
+        """Median ms of insert + after_insert(organ), each rolled back"""
+        samples = []
+        for _ in range(repeat):
+            sid = transaction.savepoint()
+            started = time.perf_counter()
+            organ = self.insert_organ(donor_id)
+            after_insert(organ)
+            samples.append((time.perf_counter() - started) * 1000)
+            transaction.savepoint_rollback(sid)
+        return statistics.median(samples)
+
+    def measure(self, donor_id, repeat):
+        def trigger(organ):
+            with connection.cursor() as cursor:
+                cursor.execute(LEGACY_OFFERS_SQL, [
+                    organ.organ_id, BENCH_TYPE, organ.organ_id, donor_id, BENCH_TYPE, donor_id
+                ])
+
+        def inline(organ):
+            create_batch_offers(list(offerable_organs([organ.organ_id])))
+
+        def cold(organ):
+            engine.invalidate(BENCH_TYPE)
+            inline(organ)
+
+        results = {
+            'trigger': self.timed(donor_id, repeat, trigger),
+            'cold': self.timed(donor_id, repeat, cold),
+            'warm': self.timed(donor_id, repeat, inline),
+            # What the request pays in deferred mode; the worker does the rest
+            'deferred': self.timed(donor_id, repeat, lambda organ: None),
+        }
+        results['worker'] = results['warm'] - results['deferred']
+        return results
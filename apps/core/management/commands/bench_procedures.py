@@ -0,0 +1,45 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.matching import cached_rank_recipients, rank_recipients
+from apps.core.models import Organ
+from apps.core.procedures import cached_procedure_row, call_procedure_row
+
+
+class Command(BaseCommand):
+    help = 'Repeated viability checks and match lists for one organ, direct vs through the result cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('organ_id', nargs='?', type=int, help='Default: the first Available organ')
+        parser.add_argument('--calls', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['calls'] < 1:
+            raise CommandError('--calls must be positive')
+        organs = Organ.objects.select_related('donor', 'type_name')
+        if options['organ_id']:
+            organ = organs.filter(organ_id=options['organ_id']).first()
+        else:
+            organ = organs.filter(status='Available').order_by('organ_id').first()
+        if organ is None:
+            raise CommandError('No such organ')
+
+        self.stdout.write(f"organ {organ.organ_id}: {'median ms':>10}")
+        for label, call in (
+            ('CheckOrganViability', lambda: call_procedure_row('CheckOrganViability', [organ.organ_id])),
+            ('  cached', lambda: cached_procedure_row('CheckOrganViability', [organ.organ_id])),
+            ('rank_recipients', lambda: rank_recipients(organ)),
+            ('  cached', lambda: cached_rank_recipients(organ)),
+        ):
+            self.stdout.write(f'{label:<22} {self.bench(call, options["calls"]):>10.3f}')
+
+    def bench(self, call, count):
+        call()
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.hla import DEFAULT_BATCH_SIZE, encode_stored
+
+
+class Command(BaseCommand):
+    help = 'Fill the HLA antigen bitsets of stored organs and recipients from their HLA_Type'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        for table, counts in encode_stored(batch_size=options['batch_size']).items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{table}: {counts['rows_scanned']} rows scanned, {counts['rows_updated']} updated"
+            ))
+            if counts['unparsed']:
+                self.stdout.write(self.style.WARNING(
+                    f"{table}: {counts['unparsed']} typings could not be parsed (scored as untyped)"
+                ))
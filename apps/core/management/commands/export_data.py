@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.exports import EXPORTS, FORMATS, export_columns, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream a full extract (waitlist, allocations, surgeries, followups) as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--columns', help='Comma-separated columns (default: all)')
+        parser.add_argument('--filter', action='append', default=[], metavar='PARAM=VALUE',
+                            help='Same parameters as the list page filters, e.g. --filter status=Waiting')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['dataset']]
+        try:
+            columns = export_columns(export, options['columns'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        filters = {}
+        for item in options['filter']:
+            param, _, value = item.partition('=')
+            if param not in export.filters or not value:
+                raise CommandError(f"--filter must be PARAM=VALUE with PARAM in: {', '.join(export.filters)}")
+            filters[param] = value
+
+        chunks = stream_export(export, columns, filters, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
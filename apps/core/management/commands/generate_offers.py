@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.matching import INITIAL_OFFER_COUNT
+from apps.core.offers import generate_offers
+
+
+class Command(BaseCommand):
+    help = 'Create initial offers for Available organs that have none (deferred offers that were never made)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('organ_ids', nargs='*', type=int, help='Organs to make offers for')
+        parser.add_argument('--pending', action='store_true',
+                            help='Every Available organ without an allocation (for cron)')
+        parser.add_argument('--limit', type=int, default=INITIAL_OFFER_COUNT, help='Offers per organ')
+
+    def handle(self, *args, **options):
+        if bool(options['organ_ids']) == options['pending']:
+            raise CommandError('Give organ ids or --pending')
+        if options['limit'] < 1:
+            raise CommandError('--limit must be positive')
+
+        offers = generate_offers(options['organ_ids'] or None, limit=options['limit'])
+        organs = len({offer.organ_id for offer in offers})
+        self.stdout.write(self.style.SUCCESS(f'Created {len(offers)} offer(s) for {organs} organ(s)'))
@@ -0,0 +1,71 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.core.geo import zip5
+from apps.core.signals import notify_tables_changed
+
+UPSERT_SQL = """
+    INSERT INTO Zip_Centroid (Zipcode, Latitude, Longitude) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE Latitude = VALUES(Latitude), Longitude = VALUES(Longitude)
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Load zip centroids from a Census ZCTA gazetteer file (GEOID, INTPTLAT, INTPTLONG columns). '
+        'Running servers pick them up on their next request through the shared cache, without a restart.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as gazetteer:
+                loaded, skipped = self.load(gazetteer, options['batch_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+        if loaded:
+            # Bumps the version in the shared cache, which the web and worker
+            # processes compare before using their hospital locations
+            notify_tables_changed('zip_centroid')
+        self.stdout.write(self.style.SUCCESS(f'{loaded} zip centroids loaded, {skipped} rows skipped'))
+
+    def load(self, gazetteer, batch_size):
+        reader = csv.reader(gazetteer, delimiter='\t')
+        # The gazetteer header pads its last column name with spaces
+        header = [column.strip() for column in next(reader, [])]
+        try:
+            columns = [header.index(name) for name in ('GEOID', 'INTPTLAT', 'INTPTLONG')]
+        except ValueError:
+            raise CommandError('Expected a tab-separated file with GEOID, INTPTLAT and INTPTLONG columns')
+
+        loaded = skipped = 0
+        batch = []
+        for row in reader:
+            try:
+                zipcode, lat, lon = (row[column].strip() for column in columns)
+                lat, lon = float(lat), float(lon)
+            except (IndexError, ValueError):
+                skipped += 1
+                continue
+            if zip5(zipcode) != zipcode or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                skipped += 1
+                continue
+            batch.append((zipcode, round(lat, 6), round(lon, 6)))
+            if len(batch) >= batch_size:
+                loaded += self.write(batch)
+                batch = []
+        if batch:
+            loaded += self.write(batch)
+        return loaded, skipped
+
+    def write(self, batch):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(UPSERT_SQL, batch)
+        return len(batch)
@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.priority import DEFAULT_BATCH_SIZE, refresh_priorities
+
+
+class Command(BaseCommand):
+    help = 'Recompute waitlist priority scores (incremental by default; schedule nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute every Waiting entry instead of only those past their 30-day boundary')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--date', help='Treat this YYYY-MM-DD as today')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        try:
+            today = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD')
+
+        stats = refresh_priorities(
+            incremental=not options['full'],
+            today=today,
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['mode']} refresh: {stats['rows_scanned']} rows scanned, "
+            f"{stats['rows_updated']} scores changed in {stats['elapsed_seconds']}s"
+        ))
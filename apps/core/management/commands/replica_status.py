@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.core.replicas import MAX_LAG_SECONDS, REPLICAS, lag_monitor
+
+
+class Command(BaseCommand):
+    help = 'Replication lag of each read replica and whether report/list pages would use it'
+
+    def handle(self, *args, **options):
+        if not REPLICAS:
+            raise CommandError('No replicas configured: add a second alias to DATABASES')
+
+        self.stdout.write(f"{'alias':<12} {'server':<28} {'lag s':>7}  routed")
+        for alias in REPLICAS:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT @@hostname, @@port, DATABASE()')
+                host, port, database = cursor.fetchone()
+            lag = lag_monitor.measure(alias)
+            usable = lag is not None and lag <= MAX_LAG_SECONDS
+            self.stdout.write(
+                f"{alias:<12} {f'{host}:{port}/{database}':<28} {'-' if lag is None else f'{lag:.0f}':>7}  "
+                + (self.style.SUCCESS('yes') if usable else self.style.WARNING(f'no (max lag {MAX_LAG_SECONDS}s)'))
+            )
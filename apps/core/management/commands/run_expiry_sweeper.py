@@ -0,0 +1,42 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.expiry import (
+    DEFAULT_BATCH_SIZE, DEFAULT_LOOKAHEAD, DEFAULT_REARM_INTERVAL, ExpirySweeper
+)
+
+
+class Command(BaseCommand):
+    help = 'Expire pending allocations and organs as their deadlines lapse'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Expire everything already overdue and exit (for cron)')
+        parser.add_argument('--lookahead', type=int, default=DEFAULT_LOOKAHEAD,
+                            help='Seconds of upcoming deadlines to hold in memory')
+        parser.add_argument('--rearm-interval', type=int, default=DEFAULT_REARM_INTERVAL,
+                            help='Seconds between reloads of upcoming deadlines from the database')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if min(options['lookahead'], options['rearm_interval'], options['batch_size']) < 1:
+            raise CommandError('--lookahead, --rearm-interval and --batch-size must be positive')
+
+        sweeper = ExpirySweeper(
+            lookahead=options['lookahead'],
+            rearm_interval=options['rearm_interval'],
+            batch_size=options['batch_size'],
+        )
+
+        if options['once']:
+            counts = sweeper.sweep()
+            self.stdout.write(self.style.SUCCESS(
+                f"Expired {counts['allocation']} allocation(s) and {counts['organ']} organ(s)"
+            ))
+            return
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: sweeper.stop())
+        self.stdout.write('Expiry sweeper running (Ctrl+C to stop)')
+        sweeper.run()
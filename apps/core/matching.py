@@ -0,0 +1,408 @@
+"""In-process organ matching engine.
+
+Replaces per-click calls to the MatchOrganToRecipients procedure. The Waiting
+rows of Recipient_Waitlist + Recipient are held per organ type as a columnar
+NumPy snapshot, and every candidate is scored in one vectorised pass using a
+precomputed 8x8 ABO score matrix. The match page, the allocation page and the
+initial offers created for a new organ all rank through ``rank_recipients``;
+the pages and the API reuse an organ's ranked list (``cached_rank_recipients``)
+until the waitlist or the compatibility tests change.
+
+Weights mirror MatchOrganToRecipients:
+Blood 30 | HLA 15 - 2.5 per A/B/DR mismatch | Wait min(days/30, 20) |
+Geographic 15/10/5/0 within 250/500/1000 miles/further | Urgency level x 2
+
+HLA mismatches come from the antigen bitsets stored with each organ and
+recipient (hla.py). When either side is not typed at all three loci the HLA
+points are the neutral 7.5 (3 mismatches). Distance is measured from the
+organ's procuring hospital to the recipient's listing hospital (geo.py); when
+either is not known the geographic points are the neutral 7.5. For a donor
+with neither an HLA typing nor a location every candidate gets the same
+neutral points, and the ranking keeps the per-blood-group fast path.
+
+Unlike the procedure, a located organ is only ranked for recipients whose
+listing hospital has the program and can be reached within what is left of
+the organ type's cold ischemia time (feasibility.py).
+"""
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+from django.db.models.functions import Now
+
+from .exclusions import excluded_recipients
+from .feasibility import FEASIBILITY_TABLES, elapsed_hours, feasibility
+from .hla import UNTYPED, hla_bits, is_typed, mismatch_counts
+from .models import OrganAllocation, RecipientWaitlist
+from .procedures import cached_result, register_cached
+from .signals import notify_tables_changed, table_versions
+
+BLOOD_TYPES = ('O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+')
+BLOOD_INDEX = {blood_type: i for i, blood_type in enumerate(BLOOD_TYPES)}
+
+# Donor blood type -> recipient blood types it can donate to (partial matches)
+COMPATIBLE_RECIPIENTS = {
+    'O+': ('O+', 'A+', 'B+', 'AB+'),
+    'A-': ('A-', 'A+', 'AB-', 'AB+'),
+    'A+': ('A+', 'AB+'),
+    'B-': ('B-', 'B+', 'AB-', 'AB+'),
+    'B+': ('B+', 'AB+'),
+    'AB-': ('AB-', 'AB+'),
+}
+
+HLA_MAX_SCORE = 15.0
+HLA_MISMATCH_PENALTY = 2.5
+HLA_UNTYPED_SCORE = 7.5
+# (miles, points), nearest first; further away is 0
+GEOGRAPHIC_BANDS = ((250, 15.0), (500, 10.0), (1000, 5.0))
+GEOGRAPHIC_UNKNOWN_SCORE = 7.5
+# Radius filters offered on the match page
+RADIUS_CHOICES = (250, 500, 1000)
+MAX_WAIT_SCORE = 20.0
+DEFAULT_MATCH_LIMIT = 10
+INITIAL_OFFER_COUNT = 3
+
+# Tables whose writes make a snapshot stale
+SNAPSHOT_TABLES = ('recipient_waitlist', 'recipient')
+# Per minute too: centres drop out as the organ's cold ischemia time runs down
+register_cached('organ_matches', tables=SNAPSHOT_TABLES + FEASIBILITY_TABLES + ('compatibility_test',),
+                bucket_seconds=60)
+
+
+def blood_type_score(donor_blood, recipient_blood):
+    """Blood type points for one pair - same CASE order as the procedure"""
+    if donor_blood == recipient_blood:
+        return 30.0
+    if donor_blood == 'O-':
+        return 25.0
+    if donor_blood == 'O+' and recipient_blood in COMPATIBLE_RECIPIENTS['O+']:
+        return 25.0
+    if recipient_blood in COMPATIBLE_RECIPIENTS.get(donor_blood, ()):
+        return 22.0
+    if recipient_blood == 'AB+':
+        return 20.0
+    return 0.0
+
+
+def geographic_scores(miles):
+    """Geographic points per distance; NaN (unknown location) gets the neutral score"""
+    scores = np.full(len(miles), GEOGRAPHIC_UNKNOWN_SCORE)
+    known = ~np.isnan(miles)
+    scores[known] = np.select([miles[known] <= limit for limit, _ in GEOGRAPHIC_BANDS],
+                              [points for _, points in GEOGRAPHIC_BANDS], 0.0)
+    return scores
+
+
+# BLOOD_SCORES[donor][recipient]; 0 means incompatible
+BLOOD_SCORES = np.array(
+    [[blood_type_score(donor, recipient) for recipient in BLOOD_TYPES] for donor in BLOOD_TYPES],
+    dtype=np.float64,
+)
+
+
+class WaitlistSnapshot:
+    """Columnar copy of the Waiting entries for one organ type"""
+
+    def __init__(self, organ_type, rows, versions):
+        self.organ_type = organ_type
+        self.versions = versions
+        rows = [row for row in rows if row[2] in BLOOD_INDEX]
+        self.size = len(rows)
+        self.recipient_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=self.size)
+        self.names = [row[1] for row in rows]
+        self.blood = np.fromiter((BLOOD_INDEX[row[2]] for row in rows), dtype=np.int8, count=self.size)
+        self.urgency = np.fromiter((row[3] or 0 for row in rows), dtype=np.int16, count=self.size)
+        self.priority = np.fromiter((float(row[4] or 0) for row in rows), dtype=np.float64, count=self.size)
+        self.wait_ordinal = np.fromiter((row[5].toordinal() for row in rows), dtype=np.int32, count=self.size)
+        self.hla_a, self.hla_b, self.hla_dr = (
+            np.fromiter((row[column] for row in rows), dtype=np.int64, count=self.size) for column in (6, 7, 8)
+        )
+        self.hla_typed = (self.hla_a != 0) & (self.hla_b != 0) & (self.hla_dr != 0)
+        self.listing_hospital = np.fromiter((row[9] or 0 for row in rows), dtype=np.int64, count=self.size)
+        self._ranked_cache = None
+        self._layout_cache = None
+
+    @classmethod
+    def load(cls, organ_type):
+        versions = table_versions(*SNAPSHOT_TABLES)
+        rows = RecipientWaitlist.objects.filter(
+            type_name_id=organ_type,
+            status='Waiting',
+            recipient__status='Waiting'
+        ).values_list(
+            'recipient_id', 'recipient__name', 'recipient__blood_type',
+            'recipient__medical_urgency_level', 'priority_score', 'wait_list_date',
+            'recipient__hla_a_bits', 'recipient__hla_b_bits', 'recipient__hla_dr_bits',
+            'recipient__listing_hospital_id'
+        )
+        return cls(organ_type, list(rows), versions)
+
+    def _ranked(self, today):
+        """Donor-independent part of the score, ranked per recipient blood type.
+
+        Everything except the blood, HLA and geographic points depends only on
+        the recipient and the date, so it is scored for all candidates in one
+        pass per day. Within one recipient blood type the blood points are a
+        constant, so for a donor without HLA typing or location (constant HLA
+        and geographic points) each group's order is also its final order.
+        """
+        ranked = self._ranked_cache
+        if ranked is None or ranked[0] != today:
+            days_waiting = today.toordinal() - self.wait_ordinal
+            wait = np.minimum(days_waiting / 30.0, MAX_WAIT_SCORE)
+            base = wait + self.urgency * 2.0
+            order = np.lexsort((-days_waiting, -base))
+            groups = [order[self.blood[order] == g] for g in range(len(BLOOD_TYPES))]
+            ranked = (today, days_waiting, wait, base, groups)
+            self._ranked_cache = ranked
+        return ranked
+
+    def top(self, donor_blood, donor_hla=UNTYPED, origin_hospital_id=None, within_miles=None,
+            limit=DEFAULT_MATCH_LIMIT, today=None, excluded_ids=None, elapsed_hours=0.0):
+        """Top ``limit`` candidates as dicts shaped like MatchOrganToRecipients rows.
+
+        ``origin_hospital_id`` is where the organ is; ``within_miles`` keeps only
+        candidates listed at a hospital within that distance of it. Once the
+        origin is located, candidates listed at a centre that lacks the program
+        or cannot be reached in the cold ischemia time left after
+        ``elapsed_hours`` (feasibility.py) are dropped.
+        """
+        if not self.size or donor_blood not in BLOOD_INDEX:
+            return []
+
+        _, days_waiting, wait, base, groups = self._ranked(today or date.today())
+        blood_row = BLOOD_SCORES[BLOOD_INDEX[donor_blood]]
+        matrix = feasibility() if origin_hospital_id is not None else None
+        geo = matrix.geo if matrix is not None else None
+        origin = geo.position(origin_hospital_id) if geo is not None else -1
+        if within_miles is not None:
+            if origin < 0:
+                return []
+            candidates = self._within(geo, origin, within_miles)
+            candidates = candidates[blood_row[self.blood[candidates]] > 0]
+            if excluded_ids is not None and len(excluded_ids):
+                candidates = candidates[~np.isin(self.recipient_ids[candidates], excluded_ids)]
+        elif is_typed(donor_hla) or origin >= 0:
+            candidates = self._compatible(blood_row, excluded_ids)
+        else:
+            candidates = self._group_heads(groups, blood_row, limit, excluded_ids)
+        if origin >= 0:
+            # One row of the feasibility matrix, by listing hospital; unlocated listings are kept
+            reachable = matrix.listing_mask(origin_hospital_id, self.organ_type, elapsed_hours)
+            positions = self._layout(geo)[0][candidates]
+            keep = (positions < 0) | reachable[np.maximum(positions, 0)]
+            candidates, positions = candidates[keep], positions[keep]
+        if not len(candidates):
+            return []
+
+        if is_typed(donor_hla):
+            mismatches = mismatch_counts(
+                donor_hla, self.hla_a[candidates], self.hla_b[candidates], self.hla_dr[candidates]
+            )
+            typed = self.hla_typed[candidates]
+            hla = np.where(typed, HLA_MAX_SCORE - HLA_MISMATCH_PENALTY * mismatches, HLA_UNTYPED_SCORE)
+        else:
+            mismatches = typed = None
+            hla = np.full(len(candidates), HLA_UNTYPED_SCORE)
+        if origin >= 0:
+            miles = np.where(positions >= 0, geo.distances(origin)[positions], np.nan)
+            geographic = geographic_scores(miles)
+        else:
+            miles = None
+            geographic = np.full(len(candidates), GEOGRAPHIC_UNKNOWN_SCORE)
+
+        blood = blood_row[self.blood[candidates]]
+        total = base[candidates] + blood + hla + geographic
+        if len(candidates) > limit:
+            # Only the candidates scoring at least the limit-th best (ties included) get sorted
+            kth = np.partition(total, len(total) - limit)[len(total) - limit]
+            keep = np.flatnonzero(total >= kth)
+        else:
+            keep = np.arange(len(candidates))
+        # ORDER BY Total_Match_Score DESC, Days_Waiting DESC
+        order = keep[np.lexsort((-days_waiting[candidates[keep]], -total[keep]))][:limit]
+
+        return [
+            {
+                'Recipient_ID': int(self.recipient_ids[i]),
+                'Recipient_Name': self.names[i],
+                'Recipient_Blood': BLOOD_TYPES[self.blood[i]],
+                'Medical_Urgency_Level': int(self.urgency[i]),
+                'Priority_Score': float(self.priority[i]),
+                'Wait_List_Date': date.fromordinal(int(self.wait_ordinal[i])),
+                'Days_Waiting': int(days_waiting[i]),
+                'Blood_Type_Score': float(blood[k]),
+                'HLA_Score': float(hla[k]),
+                'HLA_Mismatches': int(mismatches[k]) if typed is not None and typed[k] else None,
+                'Wait_Time_Score': round(float(wait[i]), 4),
+                'Geographic_Score': float(geographic[k]),
+                'Distance_Miles': round(float(miles[k]), 1) if miles is not None and not np.isnan(miles[k]) else None,
+                'Urgency_Score': float(self.urgency[i] * 2),
+                'Total_Match_Score': round(float(total[k]), 4),
+            }
+            for k, i in ((k, candidates[k]) for k in order)
+        ]
+
+    def _layout(self, geo):
+        """(hospital position per candidate, candidates ordered by hospital,
+        offsets per hospital) for this HospitalLocations"""
+        layout = self._layout_cache
+        if layout is None or layout[0] is not geo:
+            positions = geo.positions(self.listing_hospital)
+            located = np.flatnonzero(positions >= 0)
+            by_hospital = located[np.argsort(positions[located], kind='stable')]
+            offsets = np.zeros(geo.size + 1, dtype=np.int64)
+            np.cumsum(np.bincount(positions[located], minlength=geo.size), out=offsets[1:])
+            layout = self._layout_cache = (geo, positions, by_hospital, offsets)
+        return layout[1:]
+
+    def _within(self, geo, origin, miles):
+        """Candidates listed at a hospital within ``miles`` of hospital position ``origin``"""
+        _, by_hospital, offsets = self._layout(geo)
+        slices = [by_hospital[offsets[h]:offsets[h + 1]] for h in geo.within(origin, miles)]
+        return np.concatenate(slices) if slices else np.array([], dtype=np.int64)
+
+    def _group_heads(self, groups, blood_row, limit, excluded_ids):
+        """Head of every compatible blood group - enough when the HLA points are a constant"""
+        excluded = len(excluded_ids) if excluded_ids is not None else 0
+        heads = []
+        for group, members in enumerate(groups):
+            if blood_row[group] <= 0 or not len(members):
+                continue
+            head = members[:limit + excluded]
+            if excluded:
+                head = head[~np.isin(self.recipient_ids[head], excluded_ids)]
+            heads.append(head[:limit])
+        return np.concatenate(heads) if heads else np.array([], dtype=np.int64)
+
+    def _compatible(self, blood_row, excluded_ids):
+        """Every blood-compatible candidate not excluded"""
+        mask = blood_row[self.blood] > 0
+        if excluded_ids is not None and len(excluded_ids):
+            mask &= ~np.isin(self.recipient_ids, excluded_ids)
+        return np.flatnonzero(mask)
+
+
+class MatchingEngine:
+    """Per-organ-type snapshot cache, rebuilt when the waitlist tables change"""
+
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self, organ_type):
+        current = table_versions(*SNAPSHOT_TABLES)
+        snapshot = self._snapshots.get(organ_type)
+        if snapshot is None or snapshot.versions != current:
+            with self._lock:
+                snapshot = self._snapshots.get(organ_type)
+                if snapshot is None or snapshot.versions != current:
+                    snapshot = WaitlistSnapshot.load(organ_type)
+                    self._snapshots[organ_type] = snapshot
+        return snapshot
+
+    def invalidate(self, organ_type=None):
+        with self._lock:
+            if organ_type is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(organ_type, None)
+
+
+engine = MatchingEngine()
+
+
+def incompatible_recipient_ids(donor_id):
+    """Recipients with an Incompatible Compatibility_Test against this donor"""
+    return excluded_recipients(donor_id)
+
+
+def rank_recipients(organ, limit=DEFAULT_MATCH_LIMIT, within_miles=None):
+    """Ranked compatible recipients for an organ, optionally only those listed
+    within ``within_miles`` of its procuring hospital"""
+    snapshot = engine.snapshot(organ.type_name_id)
+    return snapshot.top(
+        organ.donor.blood_type,
+        hla_bits(organ),
+        origin_hospital_id=organ.procuring_hospital_id,
+        within_miles=within_miles,
+        limit=limit,
+        excluded_ids=incompatible_recipient_ids(organ.donor_id),
+        elapsed_hours=elapsed_hours(organ),
+    )
+
+
+def cached_rank_recipients(organ, limit=DEFAULT_MATCH_LIMIT, within_miles=None):
+    """``rank_recipients`` reused until the waitlist, hospitals or compatibility
+    tests change - and per minute, since the organ's transport budget shrinks"""
+    args = (
+        organ.organ_id, organ.type_name_id, organ.donor_id, organ.donor.blood_type, hla_bits(organ),
+        organ.procuring_hospital_id, within_miles, limit, date.today(),
+    )
+    return cached_result('organ_matches', args, lambda: rank_recipients(organ, limit=limit, within_miles=within_miles))
+
+
+def remaining_viable_hours(organ):
+    """Hours left before the organ passes its typical viability window"""
+    return organ.type_name.typical_viability_hours - elapsed_hours(organ)
+
+
+def _remaining_hours(organ):
+    # Callers that annotate Viability_Expires_At - NOW() (offers.offerable_organs)
+    # skip recomputing it from the procurement time
+    remaining = getattr(organ, 'remaining', None)
+    if remaining is not None:
+        return remaining.total_seconds() / 3600
+    return remaining_viable_hours(organ)
+
+
+def create_initial_offers(organ, limit=INITIAL_OFFER_COUNT):
+    """Pending allocations for the top matches of a newly recorded organ
+    (formerly the after_organ_insert trigger)"""
+    return create_batch_offers([organ], limit=limit)
+
+
+def create_batch_offers(organs, limit=INITIAL_OFFER_COUNT):
+    """Initial offers for a batch of new organs in one multi-row INSERT.
+
+    Incompatibility tests are read once per donor. Organs of the same type in
+    one batch (two kidneys) go to different recipients: each organ's ranking
+    skips the recipients already offered an earlier one.
+    """
+    excluded = {}
+    offered = {}
+    rows = []
+    for organ in organs:
+        if organ.donor_id not in excluded:
+            excluded[organ.donor_id] = incompatible_recipient_ids(organ.donor_id)
+        already = offered.setdefault(organ.type_name_id, [])
+        matches = engine.snapshot(organ.type_name_id).top(
+            organ.donor.blood_type,
+            hla_bits(organ),
+            origin_hospital_id=organ.procuring_hospital_id,
+            limit=limit,
+            excluded_ids=np.concatenate([excluded[organ.donor_id], np.array(already, dtype=np.int64)]),
+            elapsed_hours=elapsed_hours(organ),
+        )
+        if not matches:
+            continue
+
+        # Server time, like AllocateOrgan's NOW(), so the expiry sweeper compares
+        # every deadline against the same clock
+        response_window = timedelta(hours=max(_remaining_hours(organ), 0) * 0.5)
+        for match in matches:
+            already.append(match['Recipient_ID'])
+            rows.append(OrganAllocation(
+                organ_id=organ.organ_id,
+                recipient_id=match['Recipient_ID'],
+                allocation_date=Now(),
+                match_score=round(match['Total_Match_Score'], 2),
+                status='Pending',
+                response_deadline=Now() + response_window,
+            ))
+    if not rows:
+        return []
+
+    offers = OrganAllocation.objects.bulk_create(rows)
+    notify_tables_changed(OrganAllocation._meta.db_table)
+    return offers
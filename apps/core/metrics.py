@@ -0,0 +1,352 @@
+"""Request and database metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request by URL name (``core:organ_list``,
+``api:organ_detail``; ``unmatched`` for 404s). An execute wrapper installed on
+every database connection times each ORM / raw query and adds it, with its
+row count, to the request it ran for - or to ``background`` for the offer
+worker, expiry sweeper and management commands. ``call_procedure`` reports
+stored procedure calls, and queries that read one of the MySQL views are also
+counted per view.
+
+A query costs two clock reads and a list append; the request's queries are
+folded into the histograms once, when the response is ready. The counters of
+the connection pool, replica router, allocation service, report cache,
+exclusion index and feasibility matrix are added when ``/metrics`` is scraped.
+It is served to administrators, and to Prometheus with
+``Authorization: Bearer <METRICS_TOKEN>``.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+
+from .allocation import allocation_stats
+from .db.pool import pool_stats
+from .exclusions import exclusion_stats
+from .feasibility import feasibility_stats
+from .replicas import replica_stats
+from .report_cache import report_cache_stats
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100, 200)
+BACKGROUND = 'background'
+UNMATCHED = 'unmatched'
+
+MYSQL_VIEWS = (
+    'active_wait_list', 'available_organs', 'critical_recipients',
+    'transplant_success_rate_by_hospital', 'upcoming_follow_ups',
+)
+MYSQL_VIEW_RE = re.compile(r'\bFROM\s+`?(' + '|'.join(MYSQL_VIEWS) + r')\b', re.IGNORECASE)
+
+
+# ==================== METRIC TYPES ====================
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f'{self.name}{_label_text(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        self.observe_many(label_values, (value,))
+
+    def observe_many(self, label_values, values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = series[0]
+            for value in values:
+                counts[bisect_left(self.buckets, value)] += 1
+                series[1] += value
+                series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = _label_text(self.labels + ('le',), label_values + (bound,))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _label_text(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+request_duration = register(Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name', ('view', 'method', 'status')))
+request_queries = register(Histogram(
+    'http_request_db_queries', 'Database round trips per request', ('view',), QUERY_COUNT_BUCKETS))
+query_duration = register(Histogram(
+    'db_query_duration_seconds', 'ORM and raw SQL query latency by URL name', ('view',)))
+query_rows = register(Counter(
+    'db_query_rows_total', 'Rows returned or changed by queries, by URL name', ('view',)))
+procedure_duration = register(Histogram(
+    'db_procedure_duration_seconds', 'Stored procedure call latency', ('procedure',)))
+procedure_rows = register(Counter(
+    'db_procedure_rows_total', 'Rows in the first result set of stored procedure calls', ('procedure',)))
+result_cache = register(Counter(
+    'db_result_cache_total', 'Cached procedure and match list lookups (procedures.cached_result)', ('name', 'result')))
+mysql_view_duration = register(Histogram(
+    'db_mysql_view_query_duration_seconds', 'Latency of queries reading a MySQL view', ('mysql_view',)))
+mysql_view_rows = register(Counter(
+    'db_mysql_view_rows_total', 'Rows read from MySQL views', ('mysql_view',)))
+
+
+# ==================== RECORDING ====================
+class RequestMetrics:
+    """Queries of one request, folded into the histograms when it ends"""
+
+    def __init__(self):
+        self.view = UNMATCHED
+        # (seconds, rows) - appended from the request thread and API pool threads
+        self.queries = []
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def record_query(seconds, rows, sql=None):
+    current = _current.get()
+    if current is not None:
+        current.queries.append((seconds, rows))
+    else:
+        query_duration.observe((BACKGROUND,), seconds)
+        if rows > 0:
+            query_rows.inc((BACKGROUND,), rows)
+    if sql is not None:
+        match = MYSQL_VIEW_RE.search(sql)
+        if match:
+            mysql_view = match.group(1).lower()
+            mysql_view_duration.observe((mysql_view,), seconds)
+            if rows > 0:
+                mysql_view_rows.inc((mysql_view,), rows)
+
+
+def record_procedure(name, seconds, rows):
+    procedure_duration.observe((name,), seconds)
+    procedure_rows.inc((name,), rows)
+    record_query(seconds, rows)
+
+
+def record_result_cache(name, hit):
+    result_cache.inc((name, 'hit' if hit else 'miss'))
+
+
+def timed_execute(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        rows = context['cursor'].rowcount
+        # Not known yet for unbuffered cursors (-1, or 2**64 - 1 from PyMySQL)
+        if rows is None or rows >= 2 ** 63:
+            rows = -1
+        record_query(time.perf_counter() - started, rows, sql)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Sent on every (re)connect of the same wrapper
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_execute)
+
+
+class MetricsMiddleware:
+    """Latency and query count per URL name; outermost, so it includes the session.
+    Sync and async, so that async API views under ASGI are not run through
+    async_to_sync on its account"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            _current.reset(token)
+            self.finish(metrics, request, status, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        # Queries run in sync_to_async threads, which see a copy of this context
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            _current.reset(token)
+            self.finish(metrics, request, status, time.perf_counter() - started)
+
+    def finish(self, metrics, request, status, elapsed):
+        match = request.resolver_match
+        if match is not None:
+            metrics.view = match.view_name
+        view = (metrics.view,)
+        request_duration.observe((metrics.view, request.method, str(status)), elapsed)
+        request_queries.observe(view, len(metrics.queries))
+        if metrics.queries:
+            query_duration.observe_many(view, [seconds for seconds, _ in metrics.queries])
+            rows = sum(rows for _, rows in metrics.queries if rows > 0)
+            if rows:
+                query_rows.inc(view, rows)
+
+
+# ==================== EXPOSITION ====================
+def scrape_authorized(request):
+    """True for ``Authorization: Bearer <METRICS_TOKEN>`` when a token is set"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def _stat(lines, name, help_text, kind, samples):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    for label_names, label_values, value in samples:
+        if value is not None:
+            lines.append(f'{name}{_label_text(label_names, label_values)} {value}')
+
+
+def stats_lines():
+    """Pool, replica, allocation, report cache, exclusion index and feasibility matrix counters"""
+    lines = []
+    pools = pool_stats()
+    for field, name, kind, help_text in (
+        ('size', 'db_pool_connections', 'gauge', 'Open pooled connections'),
+        ('in_use', 'db_pool_in_use', 'gauge', 'Pooled connections checked out'),
+        ('idle', 'db_pool_idle', 'gauge', 'Pooled connections idle'),
+        ('max_size', 'db_pool_max_size', 'gauge', 'Pool size limit'),
+        ('utilization', 'db_pool_utilization', 'gauge', 'Checked-out share of the pool size limit'),
+        ('checkouts', 'db_pool_checkouts_total', 'counter', 'Connections handed out'),
+        ('waits', 'db_pool_waits_total', 'counter', 'Checkouts that waited for a free connection'),
+        ('wait_seconds', 'db_pool_wait_seconds_total', 'counter', 'Time checkouts spent waiting'),
+        ('timeouts', 'db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting'),
+        ('created', 'db_pool_created_total', 'counter', 'Connections opened'),
+        ('evicted', 'db_pool_evicted_total', 'counter', 'Idle connections closed'),
+        ('failed_checks', 'db_pool_failed_checks_total', 'counter', 'Idle connections that failed the liveness check'),
+        ('discarded', 'db_pool_discarded_total', 'counter', 'Connections closed instead of returned'),
+    ):
+        _stat(lines, name, help_text, kind,
+               [(('alias', 'database'), (pool['alias'], pool['database']), pool[field]) for pool in pools])
+
+    replicas = replica_stats()
+    _stat(lines, 'db_replica_lag_seconds', 'Last measured replication lag', 'gauge',
+           [(('alias',), (alias,), lag) for alias, lag in replicas['lag_seconds'].items()])
+    _stat(lines, 'db_replica_routing_total', 'Read-replica view requests by routing decision', 'counter',
+           [(('decision',), (decision,), replicas[decision])
+            for decision in ('replica_reads', 'pinned', 'lag_fallbacks', 'fresh_table_fallbacks')])
+
+    allocation = allocation_stats()
+    _stat(lines, 'allocation_deadlock_events_total', 'Allocation transactions retried or given up', 'counter',
+           [(('outcome',), (outcome,), value) for outcome, value in sorted(allocation.items())])
+
+    reports = report_cache_stats()['reports']
+    for field, name, help_text in (
+        ('hits', 'report_cache_hits_total', 'Report cache hits'),
+        ('misses', 'report_cache_misses_total', 'Report cache misses'),
+        ('invalidations', 'report_cache_invalidations_total', 'Report cache invalidations'),
+        ('rebuild_seconds_total', 'report_cache_rebuild_seconds_total', 'Time spent rebuilding reports'),
+    ):
+        _stat(lines, name, help_text, 'counter',
+               [(('report',), (report,), stats[field]) for report, stats in sorted(reports.items())])
+
+    exclusions = exclusion_stats()
+    for field, name, kind, help_text in (
+        ('pairs', 'exclusion_index_pairs', 'gauge', 'Incompatible donor-recipient pairs held in memory'),
+        ('memory_bytes', 'exclusion_index_memory_bytes', 'gauge', 'Size of the exclusion index arrays'),
+        ('loads', 'exclusion_index_loads_total', 'counter', 'Full loads of the exclusion index'),
+        ('catch_ups', 'exclusion_index_catch_ups_total', 'counter', 'Reads of newly inserted tests'),
+    ):
+        _stat(lines, name, help_text, kind, [((), (), exclusions[field])])
+    matrix = feasibility_stats()
+    for field, name, kind, help_text in (
+        ('centres', 'feasibility_matrix_centres', 'gauge', 'Geocoded transplant centres in the feasibility matrix'),
+        ('memory_bytes', 'feasibility_matrix_memory_bytes', 'gauge', 'Size of the feasibility matrix arrays'),
+        ('builds', 'feasibility_matrix_builds_total', 'counter', 'Feasibility matrix (re)builds'),
+        ('cells_measured', 'feasibility_matrix_cells_measured_total', 'counter',
+         'Transport times computed rather than copied from the previous matrix'),
+    ):
+        _stat(lines, name, help_text, kind, [((), (), matrix[field])])
+    return lines
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    lines.extend(stats_lines())
+    return '\n'.join(lines) + '\n'
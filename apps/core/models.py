@@ -137,10 +137,17 @@ class Organ(models.Model):
     type_name = models.ForeignKey('OrganType', models.DO_NOTHING, db_column='Type_Name')
     donor = models.ForeignKey(Donor, models.DO_NOTHING, db_column='Donor_ID')
     hla_type = models.CharField(db_column='HLA_Type', max_length=50, blank=True, null=True)
+    # Parsed from hla_type on save (hla.py)
+    hla_a_bits = models.PositiveBigIntegerField(db_column='HLA_A_Bits', default=0)
+    hla_b_bits = models.PositiveBigIntegerField(db_column='HLA_B_Bits', default=0)
+    hla_dr_bits = models.PositiveBigIntegerField(db_column='HLA_DR_Bits', default=0)
+    procuring_hospital = models.ForeignKey(Hospital, models.DO_NOTHING, db_column='Procuring_Hospital_ID', blank=True, null=True)
     procurement_date = models.DateField(db_column='Procurement_Date')
     procurement_time = models.TimeField(db_column='Procurement_Time')
     size_weight = models.DecimalField(db_column='Size_Weight', max_digits=10, decimal_places=2, blank=True, null=True)
     status = models.CharField(db_column='Status', max_length=12, blank=True, null=True)
+    # Set by triggers in server time - compare against Now(), not timezone.now()
+    viability_expires_at = models.DateTimeField(db_column='Viability_Expires_At', blank=True, null=True)
 
     class Meta:
         managed = False
@@ -186,6 +193,12 @@ class Recipient(models.Model):
     registration_date = models.DateField(db_column='Registration_Date')
     status = models.CharField(db_column='Status', max_length=12, blank=True, null=True)
     insurance_info = models.CharField(db_column='Insurance_Info', max_length=255, blank=True, null=True)
+    hla_type = models.CharField(db_column='HLA_Type', max_length=50, blank=True, null=True)
+    # Parsed from hla_type on save (hla.py)
+    hla_a_bits = models.PositiveBigIntegerField(db_column='HLA_A_Bits', default=0)
+    hla_b_bits = models.PositiveBigIntegerField(db_column='HLA_B_Bits', default=0)
+    hla_dr_bits = models.PositiveBigIntegerField(db_column='HLA_DR_Bits', default=0)
+    listing_hospital = models.ForeignKey(Hospital, models.DO_NOTHING, db_column='Listing_Hospital_ID', blank=True, null=True)
     user = models.OneToOneField('User', models.DO_NOTHING, db_column='User_ID', blank=True, null=True)
 
     class Meta:
@@ -236,6 +249,7 @@ class RecipientWaitlist(models.Model):
     status = models.CharField(db_column='Status', max_length=20, blank=True, null=True)
     meld_score = models.DecimalField(db_column='MELD_Score', max_digits=5, decimal_places=2, blank=True, null=True)
     cpra_score = models.DecimalField(db_column='CPRA_Score', max_digits=5, decimal_places=2, blank=True, null=True)
+    next_wait_boundary = models.DateField(db_column='Next_Wait_Boundary', blank=True, null=True)
 
     class Meta:
         managed = False
@@ -0,0 +1,123 @@
+"""Initial offer generation for newly recorded organs.
+
+The after_organ_insert trigger used to score every Waiting recipient of the
+organ type inside the INSERT, calling CheckBloodTypeCompatibility (twice),
+CalculateWaitTimeDays and GetRemainingViableHours per candidate row, so the
+insert got slower as the waitlist grew. Offers are now made here:
+
+* candidates come from the matching engine's waitlist snapshot - one
+  set-based query per organ type, with wait days derived from precomputed
+  wait-list day numbers - and a whole batch is ranked in one pass
+  (``matching.create_batch_offers``);
+* viability is read once per organ from ``Viability_Expires_At - NOW()``;
+* ``mode='inline'`` writes the offers in the caller's transaction,
+  ``mode='deferred'`` hands the organ ids to a background worker once the
+  caller commits, so the insert does not wait for matching.
+
+Deferred work is idempotent: an organ that is no longer Available or already
+has an allocation is skipped. ``python manage.py generate_offers --pending``
+makes offers for any Available organ left without one (e.g. a worker that
+died before its queue drained).
+"""
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import DurationField, Exists, ExpressionWrapper, F, OuterRef
+from django.db.models.functions import Now
+
+from .matching import INITIAL_OFFER_COUNT, create_batch_offers
+from .models import Organ, OrganAllocation
+
+logger = logging.getLogger(__name__)
+
+MODES = ('inline', 'deferred')
+# OFFER_GENERATION = 'deferred' in settings moves matching off the request
+DEFAULT_MODE = getattr(settings, 'OFFER_GENERATION', 'inline')
+
+
+def offerable_organs(organ_ids=None):
+    """Available organs without any allocation yet, with remaining viability"""
+    organs = Organ.objects.filter(status='Available').exclude(
+        Exists(OrganAllocation.objects.filter(organ_id=OuterRef('pk')))
+    ).select_related('donor', 'type_name').annotate(
+        remaining=ExpressionWrapper(F('viability_expires_at') - Now(), output_field=DurationField())
+    ).order_by('organ_id')
+    if organ_ids is not None:
+        organs = organs.filter(organ_id__in=organ_ids)
+    return organs
+
+
+def generate_offers(organ_ids=None, limit=INITIAL_OFFER_COUNT):
+    """Offers for the given organs (all offerable organs when None) in one transaction"""
+    with transaction.atomic():
+        organs = list(offerable_organs(organ_ids).select_for_update(of=('self',)))
+        return create_batch_offers(organs, limit=limit)
+
+
+def schedule_offers(organs, mode=None, limit=INITIAL_OFFER_COUNT):
+    """Initial offers for just-inserted organs: now, or after the caller commits.
+
+    Returns the offers created inline; deferred scheduling returns [].
+    """
+    mode = mode or DEFAULT_MODE
+    if mode not in MODES:
+        raise ValueError(f"Unknown offer mode {mode!r}; expected one of {', '.join(MODES)}")
+    if mode == 'inline':
+        return create_batch_offers(organs, limit=limit)
+
+    organ_ids = [organ.organ_id for organ in organs]
+    transaction.on_commit(lambda: worker.submit(organ_ids, limit))
+    return []
+
+
+class OfferWorker:
+    """Background thread that drains queued organ ids in batches"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, organ_ids, limit=INITIAL_OFFER_COUNT):
+        self._queue.put((organ_ids, limit))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='offer-worker', daemon=True)
+                self._thread.start()
+
+    def _drain(self):
+        """Everything queued right now as {limit: organ ids}, plus the item count"""
+        items = [self._queue.get()]
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        batches = {}
+        for organ_ids, limit in items:
+            batches.setdefault(limit, []).extend(organ_ids)
+        return batches, len(items)
+
+    def _run(self):
+        while True:
+            batches, count = self._drain()
+            close_old_connections()
+            try:
+                for limit, organ_ids in batches.items():
+                    generate_offers(organ_ids, limit=limit)
+            except Exception:
+                logger.exception('Offer generation failed; generate_offers --pending will retry')
+            finally:
+                close_old_connections()
+                for _ in range(count):
+                    self._queue.task_done()
+
+    def join(self):
+        """Block until every submitted batch has been processed"""
+        self._queue.join()
+
+
+worker = OfferWorker()
@@ -0,0 +1,234 @@
+"""Keyset (cursor) pagination for the list pages.
+
+Pages seek on the page's own sort key instead of using OFFSET, so page N
+costs the same as page 1. An ordering is a list of field/column names with a
+'-' prefix for descending, ending in a unique key - e.g.
+``['-registration_date', 'donor_id']``. The cursor in ``?after=`` / ``?before=``
+is the sort key of the last/first row shown, base64-encoded JSON.
+
+The same seek condition is built as a Q for querysets and as SQL for the raw
+MySQL-view pages. NULLs sort first in MySQL, so they come first ascending and
+last descending, and the seek handles them explicitly.
+"""
+import base64
+import binascii
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(values):
+    data = json.dumps(list(values), cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, length=None):
+    """Values of a cursor, or None when it is missing or malformed"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or (length is not None and len(values) != length):
+        return None
+    return values
+
+
+def _parse_ordering(ordering, reverse=False):
+    return [(name.lstrip('-'), name.startswith('-') != reverse) for name in ordering]
+
+
+def _seek(keys, values, after, equal, false):
+    """OR over i of (keys[:i] equal AND keys[i] strictly after)"""
+    branches = []
+    for i, ((name, descending), value) in enumerate(zip(keys, values)):
+        branch = after(name, descending, value)
+        if branch is None:
+            continue
+        branches.append([equal(n, v) for (n, _), v in zip(keys[:i], values[:i])] + [branch])
+    return branches or [[false]]
+
+
+# ==================== QUERYSETS ====================
+def _q_after(name, descending, value):
+    if value is None:
+        return None if descending else Q(**{f'{name}__isnull': False})
+    if descending:
+        return Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+    return Q(**{f'{name}__gt': value})
+
+
+def _q_equal(name, value):
+    return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+
+def seek_q(ordering, values, reverse=False):
+    """Q for the rows after ``values`` in ``ordering`` (before, when reverse)"""
+    query = Q()
+    for branch in _seek(_parse_ordering(ordering, reverse), values, _q_after, _q_equal, Q(pk__in=[])):
+        part = Q()
+        for condition in branch:
+            part &= condition
+        query |= part
+    return query
+
+
+# ==================== RAW SQL ====================
+def _sql_after(name, descending, value):
+    if value is None:
+        return None if descending else (f'{name} IS NOT NULL', [])
+    if descending:
+        return (f'({name} < %s OR {name} IS NULL)', [value])
+    return (f'{name} > %s', [value])
+
+
+def _sql_equal(name, value):
+    return (f'{name} IS NULL', []) if value is None else (f'{name} = %s', [value])
+
+
+def seek_sql(ordering, values, reverse=False):
+    """SQL condition and params for the rows after ``values`` in ``ordering``"""
+    branches, params = [], []
+    for branch in _seek(_parse_ordering(ordering, reverse), values, _sql_after, _sql_equal, ('1 = 0', [])):
+        branches.append('(' + ' AND '.join(sql for sql, _ in branch) + ')')
+        for _, branch_params in branch:
+            params.extend(branch_params)
+    return '(' + ' OR '.join(branches) + ')', params
+
+
+def order_by_sql(ordering, reverse=False):
+    return ', '.join(f"{name} {'DESC' if descending else 'ASC'}" for name, descending in _parse_ordering(ordering, reverse))
+
+
+# ==================== PAGES ====================
+class KeysetPage:
+    """One page of rows plus the query strings of its neighbours"""
+
+    def __init__(self, rows, query_params, next_cursor=None, prev_cursor=None, is_first=True, offset=0):
+        self.rows = rows
+        self.offset = offset
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.is_first = is_first
+        self._params = query_params
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _query(self, **cursor):
+        params = self._params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        for key, value in cursor.items():
+            params[key] = value
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query(after=self.next_cursor) if self.next_cursor else None
+
+    @property
+    def prev_query(self):
+        return self._query(before=self.prev_cursor) if self.prev_cursor else None
+
+    @property
+    def first_query(self):
+        return self._query()
+
+
+def _key(row, keys):
+    if isinstance(row, dict):
+        return [row[name] for name, _ in keys]
+    return [getattr(row, name) for name, _ in keys]
+
+
+def _page(fetch, ordering, query_params, page_size):
+    keys = _parse_ordering(ordering)
+    after = decode_cursor(query_params.get('after'), len(keys))
+    before = None if after else decode_cursor(query_params.get('before'), len(keys))
+
+    if before is not None:
+        rows = fetch(before, True, page_size + 1)
+        more_before = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(
+            rows, query_params,
+            next_cursor=encode_cursor(_key(rows[-1], keys)) if rows else None,
+            prev_cursor=encode_cursor(_key(rows[0], keys)) if rows and more_before else None,
+            is_first=not more_before,
+        )
+
+    rows = fetch(after, False, page_size + 1)
+    more_after = len(rows) > page_size
+    rows = rows[:page_size]
+    return KeysetPage(
+        rows, query_params,
+        next_cursor=encode_cursor(_key(rows[-1], keys)) if more_after else None,
+        prev_cursor=encode_cursor(_key(rows[0], keys)) if after and rows else None,
+        is_first=after is None,
+    )
+
+
+def paginate_queryset(queryset, ordering, query_params, page_size=PAGE_SIZE):
+    """Keyset page of a queryset; ``query_params`` is request.GET"""
+    def fetch(values, reverse, limit):
+        page = queryset
+        if values is not None:
+            page = page.filter(seek_q(ordering, values, reverse))
+        ordered = [('-' if descending else '') + name for name, descending in _parse_ordering(ordering, reverse)]
+        return list(page.order_by(*ordered)[:limit])
+
+    return _page(fetch, ordering, query_params, page_size)
+
+
+def paginate_sql(cursor, source, ordering, query_params, filters=(), page_size=PAGE_SIZE):
+    """Keyset page of a table or view (``source``) as dicts.
+
+    ``filters`` is a list of (sql, params) conditions ANDed into the WHERE.
+    """
+    def fetch(values, reverse, limit):
+        conditions = list(filters)
+        if values is not None:
+            conditions.append(seek_sql(ordering, values, reverse))
+        sql = f'SELECT * FROM {source}'
+        params = []
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(condition for condition, _ in conditions)
+            for _, condition_params in conditions:
+                params.extend(condition_params)
+        sql += f' ORDER BY {order_by_sql(ordering, reverse)} LIMIT {int(limit)}'
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    return _page(fetch, ordering, query_params, page_size)
+
+
+# ==================== FILTERS ====================
+def selected_filters(query_params, filters):
+    """Valid filter values from the query string.
+
+    ``filters`` is a sequence of (param, label, choices); values outside the
+    choices are ignored, so they can be passed straight into SQL.
+    """
+    choices = {param: {str(choice) for choice in options} for param, _, options in filters}
+    return {
+        param: query_params[param]
+        for param in choices
+        if query_params.get(param) in choices[param]
+    }
+
+
+def filter_fields(filters, selected):
+    """Filter form fields for core/filter_form.html"""
+    return [
+        {'param': param, 'label': label, 'choices': [str(choice) for choice in options], 'selected': selected.get(param)}
+        for param, label, options in filters
+    ]
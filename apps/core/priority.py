@@ -0,0 +1,117 @@
+"""Set-based waitlist priority refresh.
+
+Priority_Score = urgency x 8 + wait points + organ-specific points, as in
+CalculatePriorityScore and after_recipient_update. Wait points are one per full
+30 days on the list (capped at 30), so a score only changes when an entry
+crosses a 30-day boundary. Each entry stores that date in Next_Wait_Boundary
+(indexed with Status), and the incremental refresh only touches entries whose
+boundary has been reached - about 1/30 of the waitlist per day.
+
+``refresh_priorities`` is what the ``refresh_priorities`` management command
+runs; it can be called from any scheduler (cron, the sweeper, celery beat).
+"""
+import time
+from datetime import date
+
+from django.db import connection, transaction
+
+from .signals import notify_tables_changed
+
+CAPPED_BOUNDARY = '9999-12-31'
+DEFAULT_BATCH_SIZE = 10000
+
+WAIT_POINTS_SQL = "LEAST(GREATEST(FLOOR(DATEDIFF(%(today)s, Wait_List_Date) / 30), 0), 30)"
+
+PRIORITY_SQL = f"""(
+    (SELECT r.Medical_Urgency_Level FROM Recipient r WHERE r.Recipient_ID = Recipient_Waitlist.Recipient_ID) * 8 +
+    {WAIT_POINTS_SQL} +
+    CASE
+        WHEN Type_Name = 'Liver' AND MELD_Score IS NOT NULL THEN LEAST((MELD_Score - 6) / 34 * 30, 30)
+        WHEN Type_Name = 'Kidney' AND CPRA_Score IS NOT NULL THEN CPRA_Score * 0.3
+        ELSE 15
+    END
+)"""
+
+BOUNDARY_SQL = f"""CASE
+    WHEN {WAIT_POINTS_SQL} >= 30 THEN '{CAPPED_BOUNDARY}'
+    ELSE DATE_ADD(Wait_List_Date, INTERVAL ({WAIT_POINTS_SQL} + 1) * 30 DAY)
+END"""
+
+# The stored score differs from the recomputed one, rounded like the column
+SCORE_CHANGED_SQL = f"NOT (Priority_Score <=> CAST({PRIORITY_SQL} AS DECIMAL(5,2)))"
+
+# Entries due for a refresh; NULL sorts first in the index, so this is one
+# range scan of idx_waitlist_next_boundary
+DUE_SQL = "Status = 'Waiting' AND (Next_Wait_Boundary IS NULL OR Next_Wait_Boundary <= %(today)s)"
+
+
+def _refresh_incremental(cursor, params, batch_size, stats):
+    # rowcount counts matched rows (CLIENT.FOUND_ROWS) and every due row gets a
+    # new boundary, so the due rows and changed scores are counted up front
+    cursor.execute(f"""
+        SELECT COUNT(*), COALESCE(SUM({SCORE_CHANGED_SQL}), 0)
+        FROM Recipient_Waitlist WHERE {DUE_SQL}
+    """, params)
+    due, changed = cursor.fetchone()
+    stats['rows_scanned'] += int(due)
+    stats['rows_updated'] += int(changed)
+
+    # Refreshed rows move their boundary past today and drop out of DUE_SQL,
+    # so the same LIMITed statement is repeated until nothing is due
+    while True:
+        with transaction.atomic():
+            cursor.execute(f"""
+                UPDATE Recipient_Waitlist
+                SET Priority_Score = {PRIORITY_SQL},
+                    Next_Wait_Boundary = {BOUNDARY_SQL}
+                WHERE {DUE_SQL}
+                ORDER BY Next_Wait_Boundary, Recipient_ID, Type_Name
+                LIMIT {int(batch_size)}
+            """, params)
+            if cursor.rowcount < batch_size:
+                break
+
+
+def _refresh_full(cursor, params, batch_size, stats):
+    cursor.execute("SELECT MIN(Recipient_ID), MAX(Recipient_ID) FROM Recipient_Waitlist WHERE Status = 'Waiting'")
+    low, high = cursor.fetchone()
+    if low is None:
+        return
+
+    for start in range(low, high + 1, batch_size):
+        batch = dict(params, start=start, end=start + batch_size - 1)
+        with transaction.atomic():
+            cursor.execute(f"""
+                SELECT COUNT(*), COALESCE(SUM({SCORE_CHANGED_SQL}), 0) FROM Recipient_Waitlist
+                WHERE Status = 'Waiting' AND Recipient_ID BETWEEN %(start)s AND %(end)s
+            """, batch)
+            scanned, changed = cursor.fetchone()
+            stats['rows_scanned'] += int(scanned)
+            stats['rows_updated'] += int(changed)
+            cursor.execute(f"""
+                UPDATE Recipient_Waitlist
+                SET Priority_Score = {PRIORITY_SQL},
+                    Next_Wait_Boundary = {BOUNDARY_SQL}
+                WHERE Status = 'Waiting'
+                  AND Recipient_ID BETWEEN %(start)s AND %(end)s
+                  AND ({SCORE_CHANGED_SQL} OR NOT (Next_Wait_Boundary <=> {BOUNDARY_SQL}))
+            """, batch)
+
+
+def refresh_priorities(incremental=True, today=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Recompute waitlist priorities; returns the entries scanned (in incremental
+    mode: due), how many of their scores changed and the elapsed seconds"""
+    started = time.perf_counter()
+    params = {'today': today or date.today()}
+    stats = {'mode': 'incremental' if incremental else 'full', 'rows_scanned': 0, 'rows_updated': 0}
+
+    with connection.cursor() as cursor:
+        if incremental:
+            _refresh_incremental(cursor, params, batch_size, stats)
+        else:
+            _refresh_full(cursor, params, batch_size, stats)
+
+    if stats['rows_updated']:
+        notify_tables_changed('recipient_waitlist')
+    stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return stats
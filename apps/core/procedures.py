@@ -0,0 +1,130 @@
+"""Calling the stored procedures.
+
+A MySQL ``CALL`` returns each SELECT in the procedure as a result set plus a
+final status set. ``result_sets`` yields them one at a time and drains
+whatever the caller did not read, also when it stops early, so the connection
+goes back to the pool with nothing left unread. ``call_procedure`` and
+``call_procedure_row`` are the usual shortcuts for the first result set.
+Each call's duration and row count go to the procedure metrics (metrics.py).
+
+Results that stay valid for a while can be cached, opt-in per name::
+
+    register_cached('CheckOrganViability', tables=('organ', 'organ_type'), bucket_seconds=60)
+    row = cached_procedure_row('CheckOrganViability', [organ_id])
+
+An entry is reused within its time bucket (``bucket_seconds``; without one
+until it is invalidated) while the versions of ``tables`` (see signals.py) are
+unchanged. ``invalidate_cached(name, *args)`` drops one entry and
+``invalidate_cached(name)`` every entry of that name. ``cached_result`` caches
+any other computation the same way (the matching engine's ranked lists).
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+from .metrics import record_procedure, record_result_cache
+from .signals import table_versions
+
+RESULT_TTL = 300
+CACHE_KEY = 'result:{}:{}:{}'
+GENERATION_KEY = 'result_generation:{}:{}'
+ALL_ARGS = '*'
+
+# Name -> (tables, bucket_seconds)
+CACHED = {}
+
+
+def result_sets(name, args=(), using=connection):
+    """Each result set of ``CALL name(args)`` as a list of dicts, in order"""
+    started = time.perf_counter()
+    first_rows = 0
+    with using.cursor() as cursor:
+        cursor.callproc(name, list(args))
+        try:
+            index = 0
+            while True:
+                if cursor.description:
+                    columns = [col[0] for col in cursor.description]
+                    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                    if index == 0:
+                        first_rows = len(rows)
+                    index += 1
+                    yield rows
+                if not cursor.nextset():
+                    break
+        finally:
+            # Reached when the caller stops early: read the rest
+            while cursor.nextset():
+                pass
+            # callproc bypasses the connection's execute wrappers
+            record_procedure(name, time.perf_counter() - started, first_rows)
+
+
+def call_procedure(name, args=(), using=connection):
+    """Rows of the procedure's first result set as dicts ([] if it returns none)"""
+    sets = result_sets(name, args, using=using)
+    try:
+        return next(sets, [])
+    finally:
+        sets.close()
+
+
+def call_procedure_row(name, args=(), using=connection):
+    """First row of the procedure's first result set, or None"""
+    rows = call_procedure(name, args, using=using)
+    return rows[0] if rows else None
+
+
+# ==================== RESULT CACHE ====================
+def register_cached(name, tables=(), bucket_seconds=None):
+    CACHED[name] = (tuple(sorted(tables)), bucket_seconds)
+
+
+register_cached('CheckOrganViability', tables=('organ', 'organ_type'), bucket_seconds=60)
+
+
+def _digest(args):
+    return hashlib.sha1(repr(tuple(args)).encode()).hexdigest()
+
+
+def cached_result(name, args, build):
+    """``build()`` for this registered name and args, reused within the time
+    bucket until a listed table changes or the entry is invalidated"""
+    tables, bucket_seconds = CACHED[name]
+    digest = _digest(args)
+    generation_keys = [GENERATION_KEY.format(name, ALL_ARGS), GENERATION_KEY.format(name, digest)]
+    generations = cache.get_many(generation_keys)
+    stamp = (table_versions(*tables), tuple(generations.get(key, 0) for key in generation_keys))
+    bucket = int(time.time() // bucket_seconds) if bucket_seconds else 0
+    key = CACHE_KEY.format(name, digest, bucket)
+
+    cached = cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        record_result_cache(name, hit=True)
+        return cached[1]
+    value = build()
+    cache.set(key, (stamp, value), bucket_seconds or RESULT_TTL)
+    record_result_cache(name, hit=False)
+    return value
+
+
+def cached_procedure(name, args=()):
+    """``call_procedure`` through the result cache; ``name`` must be registered"""
+    return cached_result(name, args, lambda: call_procedure(name, args))
+
+
+def cached_procedure_row(name, args=()):
+    rows = cached_procedure(name, args)
+    return rows[0] if rows else None
+
+
+def invalidate_cached(name, *args):
+    """Drop the cached result for these args, or every result of ``name``"""
+    key = GENERATION_KEY.format(name, _digest(args) if args else ALL_ARGS)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
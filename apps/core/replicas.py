@@ -0,0 +1,278 @@
+"""Read replicas for the report and list pages.
+
+Views decorated with ``@read_replica`` read the core tables from one of
+``settings.DATABASE_REPLICAS``; every write, every other view and the session
+tables use the primary (``default``). Raw-cursor queries in those views get
+their connection from ``read_connection()``.
+
+* Read-your-writes: a request that committed a write, or used any method but
+  GET/HEAD/OPTIONS, pins its browser session to the primary for
+  ``REPLICA_PIN_SECONDS`` with the ``db_primary_until`` cookie.
+* Lag: each replica's ``Seconds_Behind_Source`` is checked at most every
+  ``LAG_CHECK_INTERVAL`` seconds; one further behind than
+  ``REPLICA_MAX_LAG_SECONDS``, or not answering, is skipped. With no usable
+  replica the view reads from the primary.
+* Caches that outlive the request (report cache, waitlist queues) must not be
+  filled from data older than the versions they are stored under:
+  ``consistent_reads(tables)`` switches to the primary while any of the tables
+  changed within the lag window, and ``primary()`` switches unconditionally.
+  The change times are kept in the shared cache (settings.CACHES), so a write
+  committed by any process - another web worker, the offer worker, a
+  management command - is seen by all of them.
+
+A server that is not replicating (``SHOW REPLICA STATUS`` returns no row)
+counts as current - that is the local setup, a second alias pointing at the
+same database.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+
+from .signals import tables_changed
+
+logger = logging.getLogger(__name__)
+
+REPLICAS = tuple(getattr(settings, 'DATABASE_REPLICAS', ()))
+PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+MAX_LAG_SECONDS = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5)
+LAG_CHECK_INTERVAL = 2
+
+PIN_COOKIE = 'db_primary_until'
+CHANGED_AT_KEY = 'table_changed_at:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Alias the core models read from in this request; None is the primary
+_read_alias = ContextVar('read_alias', default=None)
+# Set by ReplicaPinMiddleware to a list the write hook appends to
+_request_writes = ContextVar('request_writes', default=None)
+
+_stats_lock = threading.Lock()
+_stats = {'replica_reads': 0, 'pinned': 0, 'lag_fallbacks': 0, 'fresh_table_fallbacks': 0}
+
+
+def _count(field):
+    with _stats_lock:
+        _stats[field] += 1
+
+
+# ==================== LAG ====================
+class LagMonitor:
+    """Replication lag per replica, re-read at most every ``interval`` seconds"""
+
+    def __init__(self, interval=LAG_CHECK_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        # alias -> (checked at, lag seconds or None when unusable)
+        self._checked = {}
+
+    def lag(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+            if checked is not None and now - checked[0] < self.interval:
+                return checked[1]
+            # Other threads keep using the previous value while this one checks
+            self._checked[alias] = (now, checked[1] if checked else None)
+        lag = self.measure(alias)
+        with self._lock:
+            self._checked[alias] = (time.monotonic(), lag)
+        return lag
+
+    def measure(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SHOW REPLICA STATUS')
+                row = cursor.fetchone()
+                if row is None:
+                    return 0.0
+                status = dict(zip([col[0] for col in cursor.description], row))
+        except Exception:
+            logger.exception('Could not read replication status of %s', alias)
+            return None
+        # NULL while the replication threads are stopped
+        lag = status.get('Seconds_Behind_Source')
+        return None if lag is None else float(lag)
+
+    def snapshot(self):
+        with self._lock:
+            return {alias: lag for alias, (_, lag) in sorted(self._checked.items())}
+
+
+lag_monitor = LagMonitor()
+
+
+def choose_replica():
+    """A replica within the lag threshold, or None"""
+    usable = []
+    for alias in REPLICAS:
+        lag = lag_monitor.lag(alias)
+        if lag is not None and lag <= MAX_LAG_SECONDS:
+            usable.append(alias)
+    return random.choice(usable) if usable else None
+
+
+# ==================== ROUTING ====================
+def is_pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_replica(view_func):
+    """Serve a read-only view from a replica unless the session is pinned or
+    every replica lags"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not REPLICAS or request.method not in SAFE_METHODS:
+            return view_func(request, *args, **kwargs)
+        if is_pinned(request):
+            _count('pinned')
+            return view_func(request, *args, **kwargs)
+        alias = choose_replica()
+        if alias is None:
+            _count('lag_fallbacks')
+            return view_func(request, *args, **kwargs)
+        _count('replica_reads')
+        token = _read_alias.set(alias)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+def read_connection():
+    """Connection for raw-cursor reads: the request's replica or the primary"""
+    return connections[_read_alias.get() or DEFAULT_DB_ALIAS]
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside this block"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def consistent_reads(tables):
+    """Read from the primary while any of ``tables`` changed too recently for
+    a replica within the lag threshold to have it"""
+    if _read_alias.get() is None:
+        yield
+        return
+    changed = cache.get_many([CHANGED_AT_KEY.format(table) for table in tables])
+    if changed and time.time() - max(changed.values()) <= MAX_LAG_SECONDS + LAG_CHECK_INTERVAL:
+        _count('fresh_table_fallbacks')
+        with primary():
+            yield
+    else:
+        yield
+
+
+@receiver(tables_changed)
+def record_change_times(sender, tables, **kwargs):
+    if REPLICAS:
+        now = time.time()
+        cache.set_many({CHANGED_AT_KEY.format(table): now for table in tables}, None)
+        # Sent on commit in the writing thread, i.e. inside its request
+        writes = _request_writes.get()
+        if writes is not None:
+            writes.append(tables)
+
+
+class ReplicaRouter:
+    """Core model reads go to the request's replica; writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'core':
+            return _read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Instances read from a replica would otherwise be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in REPLICAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Pins a session to the primary after a request that may have written;
+    sync and async, like the middleware around it"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not REPLICAS:
+            return self.get_response(request)
+        writes = []
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        return self.pin(request, response, writes)
+
+    async def __acall__(self, request):
+        if not REPLICAS:
+            return await self.get_response(request)
+        # Writes commit in sync_to_async threads, on a copy of this context
+        # that still holds the same list
+        writes = []
+        token = _request_writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        return self.pin(request, response, writes)
+
+    def pin(self, request, response, writes):
+        # Some views write on GET (e.g. remove_from_waitlist)
+        if writes or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, str(time.time() + PIN_SECONDS), max_age=PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def replica_stats():
+    """Routing counters and the last measured lag per replica"""
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        'replicas': list(REPLICAS),
+        'max_lag_seconds': MAX_LAG_SECONDS,
+        'pin_seconds': PIN_SECONDS,
+        'lag_seconds': lag_monitor.snapshot(),
+        **stats,
+    }
@@ -0,0 +1,125 @@
+"""Result cache for the report pages.
+
+Each report declares the tables it reads. A cached result is stored with the
+version of each of those tables (see signals.py) and served until one of them
+changes, so a write invalidates exactly the reports that depend on the tables
+it touched - including tables rewritten by triggers, which signals.py adds to
+the write's own table (a Surgery insert also bumps follow_up_appointment,
+recipient_waitlist, ...).
+
+Entries are keyed per report, role and query string, and by date because the
+report views compute days from CURDATE(). Hit/miss/rebuild-time counters are
+kept per process and served to administrators by the report_cache_stats view.
+
+A report built on a read replica is built on the primary instead while one of
+its tables changed within the replica lag window (``replicas.consistent_reads``),
+so an entry is never older than the versions it is stored under.
+
+Cache a new report by registering the tables it reads::
+
+    register_report('organ_yield', ('organ', 'donor'))
+    rows = cached_report('organ_yield', build_rows, role=role, params=request.GET.urlencode())
+"""
+import hashlib
+import threading
+import time
+from datetime import date
+
+from django.core.cache import cache
+from django.dispatch import receiver
+
+from .replicas import consistent_reads
+from .signals import table_versions, tables_changed
+
+REPORT_TTL = 300
+CACHE_KEY = 'report:{}:{}:{}:{}'
+
+# Report name -> tables it reads, and the reverse dependency map
+REPORTS = {}
+DEPENDENTS = {}
+
+
+def register_report(name, tables):
+    REPORTS[name] = tuple(sorted(tables))
+    for table in tables:
+        DEPENDENTS.setdefault(table, set()).add(name)
+
+
+register_report('hospital_performance', ('hospital', 'surgery'))
+register_report('upcoming_followups', ('follow_up_appointment', 'recipient', 'surgery', 'organ', 'medical_staff'))
+register_report('critical_recipients', ('recipient', 'recipient_waitlist'))
+register_report('waiting_time_analysis', ('wait_time_rollup',))
+# Filter choices shared by the report pages
+register_report('organ_type_names', ('organ_type',))
+register_report('hospital_choices', ('hospital',))
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _empty_stats():
+    return {'hits': 0, 'misses': 0, 'invalidations': 0, 'rebuild_seconds': 0.0, 'last_rebuild_ms': None}
+
+
+def _record(name, **deltas):
+    with _stats_lock:
+        stats = _stats.setdefault(name, _empty_stats())
+        for field, delta in deltas.items():
+            stats[field] += delta
+        if 'rebuild_seconds' in deltas:
+            stats['last_rebuild_ms'] = round(deltas['rebuild_seconds'] * 1000, 2)
+
+
+@receiver(tables_changed)
+def count_invalidations(sender, tables, **kwargs):
+    for name in set().union(*(DEPENDENTS.get(table, ()) for table in tables)):
+        _record(name, invalidations=1)
+
+
+def cached_report(name, build, role=None, params=''):
+    """``build()`` for this report, role and query string, reused until a
+    table the report reads changes"""
+    tables = REPORTS[name]
+    versions = table_versions(*tables)
+    digest = hashlib.sha1(params.encode()).hexdigest()
+    key = CACHE_KEY.format(name, role or '-', date.today().isoformat(), digest)
+
+    cached = cache.get(key)
+    if cached is not None and cached[0] == versions:
+        _record(name, hits=1)
+        return cached[1]
+
+    # Versions are read before building, so a write that lands meanwhile
+    # leaves this entry stale and the next request rebuilds it
+    started = time.perf_counter()
+    with consistent_reads(tables):
+        value = build()
+    elapsed = time.perf_counter() - started
+    cache.set(key, (versions, value), REPORT_TTL)
+    _record(name, misses=1, rebuild_seconds=elapsed)
+    return value
+
+
+def report_cache_stats():
+    """Per-report counters plus the table -> reports dependency map"""
+    with _stats_lock:
+        snapshot = {name: dict(stats) for name, stats in _stats.items()}
+
+    reports = {}
+    for name, tables in REPORTS.items():
+        stats = snapshot.get(name) or _empty_stats()
+        requests = stats['hits'] + stats['misses']
+        reports[name] = {
+            'tables': list(tables),
+            'hits': stats['hits'],
+            'misses': stats['misses'],
+            'hit_rate': round(stats['hits'] / requests, 4) if requests else None,
+            'invalidations': stats['invalidations'],
+            'rebuild_seconds_total': round(stats['rebuild_seconds'], 4),
+            'rebuild_ms_avg': round(stats['rebuild_seconds'] * 1000 / stats['misses'], 2) if stats['misses'] else None,
+            'last_rebuild_ms': stats['last_rebuild_ms'],
+        }
+    return {
+        'reports': reports,
+        'dependencies': {table: sorted(names) for table, names in sorted(DEPENDENTS.items())},
+    }
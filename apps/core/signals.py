@@ -0,0 +1,86 @@
+"""Table-level change notifications for the in-process caches.
+
+Every save/delete of a core model is translated into the set of database
+tables it touches - including the rows the MySQL triggers rewrite behind the
+ORM's back - and broadcast through ``tables_changed``. Code that writes with
+raw SQL or stored procedures calls ``notify_tables_changed`` itself.
+
+The version counters live in the default cache, which must be shared by every
+process (settings.CACHES, check core.W001): ``tables_changed`` only reaches
+listeners in the writing process, and the other processes - web workers,
+management commands - notice the write when they next compare
+``table_versions``.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+tables_changed = Signal()
+
+# Tables rewritten by triggers.sql when the key table is written
+TRIGGER_SIDE_EFFECTS = {
+    # after_recipient_update recalculates waitlist priorities and moves the
+    # recipient's entries in the wait-time rollup
+    'recipient': {'recipient_waitlist', 'wait_time_rollup'},
+    # after_waitlist_insert/update/delete maintain the wait-time rollup
+    'recipient_waitlist': {'wait_time_rollup'},
+    # after_organ_type_update re-stamps Viability_Expires_At
+    'organ_type': {'organ'},
+    # after_surgery_insert touches five tables (and the rollup through them)
+    'surgery': {'organ', 'recipient', 'recipient_waitlist', 'organ_allocation', 'follow_up_appointment',
+                'wait_time_rollup'},
+}
+
+VERSION_KEY = 'table_version:{}'
+
+
+def _expand(tables):
+    affected = set(tables)
+    for table in tables:
+        affected |= TRIGGER_SIDE_EFFECTS.get(table, set())
+    return frozenset(affected)
+
+
+def _bump_versions(tables, recipient_ids):
+    versions = {}
+    for table in tables:
+        key = VERSION_KEY.format(table)
+        cache.add(key, 0, None)
+        try:
+            versions[table] = cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+            versions[table] = 1
+    tables_changed.send(sender=None, tables=tables, versions=versions, recipient_ids=recipient_ids)
+
+
+def notify_tables_changed(*tables, recipient_ids=None):
+    """Bump the version of each table (plus trigger side effects) once the
+    current transaction commits.
+
+    ``recipient_ids`` names the recipients whose rows changed, when known, so
+    listeners can patch their caches instead of rebuilding them.
+    """
+    affected = _expand(tables)
+    if recipient_ids is not None:
+        recipient_ids = frozenset(recipient_ids)
+    transaction.on_commit(lambda: _bump_versions(affected, recipient_ids))
+
+
+def table_versions(*tables):
+    """Current version counters for the given tables, in order"""
+    keys = [VERSION_KEY.format(table) for table in tables]
+    versions = cache.get_many(keys)
+    return tuple(versions.get(key, 0) for key in keys)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def model_changed(sender, instance, **kwargs):
+    if sender._meta.app_label == 'core':
+        recipient_id = getattr(instance, 'recipient_id', None)
+        notify_tables_changed(
+            sender._meta.db_table,
+            recipient_ids=None if recipient_id is None else {recipient_id},
+        )
@@ -1,3 +1,1081 @@
-from django.test import TestCase
+"""Per-view query and latency budgets.
 
-# Create your tests here.
+Every URL in apps/core/urls.py is requested (GET) under each role against a
+scaled fixture, and the number of SQL queries and the wall time of the request
+are checked against a fixed budget. Each view is requested twice: cold, with
+every table version bumped so every cache is rebuilt, then warm against the
+budget. The cold counts must not change when the fixture doubles, so a view
+whose queries grow with the data (an N+1) fails here long before it is noticed
+in production - also when the N+1 is in filling a cache.
+
+The models are unmanaged, so the test database is loaded from the scripts in
+database_schema/ - tables, functions, procedures, triggers and views - and
+needs MySQL like the app itself::
+
+    python manage.py test apps.core
+
+BUDGET_SCALE multiplies the fixture size (default 1), BUDGET_WALL_MS overrides
+the default wall-time budget and BUDGET_REPORT is where the JSON report of every
+view/role pair is written (default budget_report.json in the project root).
+
+Stored procedure calls (cursor.callproc) and the exports' server-side cursor
+bypass Django's query capture, so they do not count towards a view's budget.
+"""
+import heapq
+import json
+import os
+import re
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .allocation import AllocationError, allocate, respond
+from .exclusions import excluded_recipients, invalidate as invalidate_exclusions
+from .feasibility import FeasibilityMatrix
+from .geo import GEO_TABLES, HospitalLocations, locations
+from .hla import UNTYPED, HLAError, antigen_names, is_typed, mismatch_count, mismatch_counts, parse_hla
+from .matching import (
+    BLOOD_TYPES, HLA_MAX_SCORE, HLA_MISMATCH_PENALTY, HLA_UNTYPED_SCORE, WaitlistSnapshot, rank_recipients,
+)
+from .models import (
+    CompatibilityTest, Donor, Hospital, HospitalCapabilities, MedicalStaff,
+    Medication, Organ, OrganAllocation, OrganType, Recipient, RecipientMedication,
+    RecipientWaitlist, Surgery, User,
+)
+from .pagination import order_by_sql, seek_q, seek_sql
+from .priority import refresh_priorities
+from .procedures import call_procedure
+from .signals import notify_tables_changed, table_versions, tables_changed
+from .urls import urlpatterns
+from .waitlist_queue import QUEUE_TABLES, OrganTypeQueue, queues, waitlist_tables_changed
+
+SCHEMA_DIR = settings.BASE_DIR / 'database_schema'
+SCHEMA_FILES = ('schema.sql', 'functions.sql', 'procedures.sql', 'triggers.sql', 'views.sql')
+
+SCALE = int(os.environ.get('BUDGET_SCALE', '1'))
+WALL_MS = int(os.environ.get('BUDGET_WALL_MS', '1500'))
+REPORT_PATH = os.environ.get('BUDGET_REPORT', str(settings.BASE_DIR / 'budget_report.json'))
+
+ROLES = ('Coordinator', 'Medical_Staff', 'Recipient', 'Administrator')
+
+# Every table a cache can depend on
+CORE_TABLES = tuple(model._meta.db_table for model in apps.get_app_config('core').get_models()) + ('zip_centroid',)
+
+# Query budget per URL name, including the session lookup. Views with a
+# higher count for some roles get the highest of them.
+BUDGETS = {
+    'login': 3,
+    'logout': 5,
+    'register': 3,
+    'dashboard': 12,
+    'available_organs': 5,
+    'available_organs_mysql_view': 6,
+    'match_organ': 8,
+    'create_organ': 6,
+    'create_organ_batch': 6,
+    'update_organ': 6,
+    'check_organ_viability': 6,
+    'allocate_organ_page': 10,
+    'donor_list': 5,
+    'create_donor': 4,
+    'update_donor': 4,
+    'recipient_list': 5,
+    'create_recipient': 4,
+    'update_recipient': 6,
+    'recipient_history': 8,
+    'critical_recipients': 6,
+    'waitlist': 8,
+    'active_waitlist_mysql_view': 8,
+    'add_to_waitlist': 6,
+    'remove_from_waitlist': 8,
+    'calculate_priority': 6,
+    'allocation_list': 6,
+    'respond_to_allocation': 6,
+    'surgery_list': 6,
+    'create_surgery': 8,
+    'upcoming_followups': 6,
+    'hospital_performance': 5,
+    'waiting_time_analysis': 5,
+    'report_cache_stats': 3,
+    'db_pool_stats': 3,
+    'metrics': 3,
+    'export_dataset': 3,
+}
+
+# Wall-time budgets (ms) for views that are slower by design
+WALL_BUDGETS = {}
+
+ORGAN_TYPES = (
+    ('Heart', 6, 4),
+    ('Kidney', 36, 30),
+    ('Liver', 24, 12),
+    ('Lung', 8, 6),
+    ('Pancreas', 12, 12),
+)
+
+
+# ==================== SCHEMA ====================
+def schema_statements(sql):
+    """Statements of a MySQL script, honouring DELIMITER lines"""
+    delimiter = ';'
+    statement = []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split()[1]
+            continue
+        if stripped.startswith('--') or not (stripped or statement):
+            continue
+        statement.append(line)
+        if stripped.endswith(delimiter):
+            text = '\n'.join(statement).strip()[:-len(delimiter)].strip()
+            statement = []
+            if text and not re.match(r'(USE|CREATE DATABASE)\b', text, re.IGNORECASE):
+                yield text
+
+
+def load_schema():
+    """Create the unmanaged tables, routines, triggers and views in the test DB"""
+    if 'organ' in {name.lower() for name in connection.introspection.table_names()}:
+        return  # --keepdb
+    with connection.cursor() as cursor:
+        for filename in SCHEMA_FILES:
+            for statement in schema_statements((SCHEMA_DIR / filename).read_text()):
+                cursor.execute(statement)
+
+
+def setUpModule():
+    load_schema()
+
+
+# ==================== FIXTURE ====================
+def hospital_count(scale):
+    return max(5, 10 * scale)
+
+
+def build_fixture(scale):
+    """Scaled dataset with explicit keys (bulk_create can't return them on MySQL)"""
+    today = date.today()
+    type_names = [type_name for type_name, _, _ in ORGAN_TYPES]
+
+    OrganType.objects.bulk_create(
+        OrganType(type_name=type_name, typical_viability_hours=hours, cold_ischemia_time_max=cold)
+        for type_name, hours, cold in ORGAN_TYPES
+    )
+
+    hospitals = hospital_count(scale)
+    Hospital.objects.bulk_create(
+        Hospital(hospital_id=i, name=f'Hospital {i}', city='Boston', state='MA', trauma_level=1 + i % 3)
+        for i in range(1, hospitals + 1)
+    )
+    HospitalCapabilities.objects.bulk_create(
+        HospitalCapabilities(hospital_id=i, type_name_id=type_name)
+        for i in range(1, hospitals + 1) for type_name in type_names
+    )
+
+    users = [
+        User(user_id=i, username=role.lower(), password_hash='budget', email=f'{role.lower()}@example.org',
+             role=role, account_status='Active', created_date=today)
+        for i, role in enumerate(ROLES, start=1)
+    ]
+    User.objects.bulk_create(users)
+
+    MedicalStaff.objects.bulk_create(
+        MedicalStaff(staff_id=i, hospital_id=1 + i % hospitals, name=f'Surgeon {i}',
+                     specialization='Transplant_Surgeon', license_number=f'LIC-{i}',
+                     user_id=2 if i == 1 else None)
+        for i in range(1, 2 * hospitals + 1)
+    )
+    Medication.objects.bulk_create(
+        Medication(medication_id=i, name=f'Medication {i}', purpose='Immunosuppressant')
+        for i in range(1, 6)
+    )
+
+    add_entities(scale, batch=0)
+    return {
+        'organ_id': 50 * scale + 1,
+        'donor_id': 1,
+        'recipient_id': 1,
+        'organ_type': type_names[1 % len(type_names)],
+        'allocation_id': 1,
+        'dataset': 'waitlist',
+    }
+
+
+def add_entities(scale, batch):
+    """Donors, organs, recipients and their history; ``batch`` n takes the
+    n-th block of ids, so a second batch doubles the data behind every page"""
+    today = date.today()
+    now = timezone.now()
+    procured = datetime.now() - timedelta(hours=1)
+    donors = 100 * scale
+    recipients = 400 * scale
+    transplants = 50 * scale
+    hospitals = hospital_count(scale)
+    type_names = [type_name for type_name, _, _ in ORGAN_TYPES]
+    # First id - 1 of this batch per table (an organ and an allocation per donor slot, two each)
+    donor_base, organ_base, recipient_base = batch * donors, batch * 2 * donors, batch * recipients
+    allocation_base, surgery_base = batch * 2 * donors, batch * transplants
+
+    Donor.objects.bulk_create(
+        Donor(donor_id=donor_base + i, name=f'Donor {donor_base + i}', date_of_birth=date(1970 + i % 30, 1, 1),
+              blood_type=BLOOD_TYPES[i % len(BLOOD_TYPES)], donor_type='Deceased',
+              registration_date=today - timedelta(days=i), medical_clearance_date=today,
+              status='Deceased')
+        for i in range(1, donors + 1)
+    )
+    # Two organs per donor: the first `transplants` are transplanted below,
+    # the rest stay Available and within their viability window
+    Organ.objects.bulk_create(
+        Organ(organ_id=organ_base + i, type_name_id=type_names[i % len(type_names)],
+              donor_id=donor_base + 1 + (i - 1) // 2,
+              hla_type='A1,A2,B7,B8,DR3,DR4', procurement_date=procured.date(),
+              procurement_time=procured.time().replace(microsecond=0),
+              size_weight=Decimal('300.00'), status='Available')
+        for i in range(1, 2 * donors + 1)
+    )
+
+    Recipient.objects.bulk_create(
+        Recipient(recipient_id=recipient_base + i, name=f'Recipient {recipient_base + i}',
+                  date_of_birth=date(1960 + i % 40, 1, 1),
+                  blood_type=BLOOD_TYPES[i % len(BLOOD_TYPES)], medical_urgency_level=1 + i % 5,
+                  primary_diagnosis='End-stage organ failure', registration_date=today - timedelta(days=i),
+                  status='Waiting', user_id=3 if recipient_base + i == 1 else None)
+        for i in range(1, recipients + 1)
+    )
+    RecipientWaitlist.objects.bulk_create(
+        RecipientWaitlist(recipient_id=recipient_base + i, type_name_id=type_names[i % len(type_names)],
+                          priority_score=Decimal(10 + i % 40), wait_list_date=today - timedelta(days=i),
+                          status='Waiting', meld_score=Decimal('20.00'), cpra_score=Decimal('50.00'))
+        for i in range(1, recipients + 1)
+    )
+
+    # Transplanted organs go to the last recipients; their offers are Pending
+    # until the surgery trigger accepts them and books the first follow-up
+    transplant_pairs = [
+        (organ_base + i, recipient_base + recipients - i + 1) for i in range(1, transplants + 1)
+    ]
+    available_organs = range(organ_base + transplants + 1, organ_base + 2 * donors + 1)
+    OrganAllocation.objects.bulk_create(
+        [
+            OrganAllocation(allocation_id=allocation_base + i, organ_id=organ_id,
+                            recipient_id=recipient_base + 1 + (i - 1) % (recipients - transplants),
+                            allocation_date=now, match_score=Decimal('75.00'), status='Pending',
+                            response_deadline=now + timedelta(days=1))
+            for i, organ_id in enumerate(available_organs, start=1)
+        ] + [
+            OrganAllocation(allocation_id=allocation_base + len(available_organs) + i, organ_id=organ_id,
+                            recipient_id=recipient_id, allocation_date=now - timedelta(days=4),
+                            match_score=Decimal('80.00'), status='Pending',
+                            response_deadline=now - timedelta(days=3))
+            for i, (organ_id, recipient_id) in enumerate(transplant_pairs, start=1)
+        ]
+    )
+    Organ.objects.filter(organ_id__gt=organ_base, organ_id__lte=organ_base + transplants).update(status='Allocated')
+    Surgery.objects.bulk_create(
+        Surgery(surgery_id=surgery_base + i, hospital_id=1 + i % hospitals, organ_id=organ_id,
+                recipient_id=recipient_id, primary_surgeon_id=1 + i % (2 * hospitals),
+                surgery_date=today - timedelta(days=3), duration_hours=Decimal('5.50'),
+                outcome=('Success', 'Complications', 'Failed')[i % 3])
+        for i, (organ_id, recipient_id) in enumerate(transplant_pairs, start=1)
+    )
+    RecipientMedication.objects.bulk_create(
+        RecipientMedication(recipient_id=recipient_id, medication_id=1 + organ_id % 5, start_date=today,
+                            dosage='5mg', frequency='Daily', prescribing_staff_id=1)
+        for organ_id, recipient_id in transplant_pairs
+    )
+    CompatibilityTest.objects.bulk_create(
+        CompatibilityTest(donor_id=donor_base + 1 + i % donors, recipient_id=recipient_base + 1 + i % recipients,
+                          test_type='Crossmatch', test_date=today,
+                          test_result=('Compatible', 'Incompatible', 'Partial')[i % 3])
+        for i in range(recipients)
+    )
+
+
+def expire_caches(test):
+    """Bump every table version (and the exclusion index generation), so the
+    next request rebuilds every cache from the current fixture"""
+    with test.captureOnCommitCallbacks(execute=True):
+        notify_tables_changed(*CORE_TABLES)
+    invalidate_exclusions()
+
+
+# ==================== BUDGETS ====================
+class ViewBudgetTests(TestCase):
+    """Query-count and wall-time budget for every view under every role"""
+
+    report = []
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url_kwargs = build_fixture(SCALE)
+        cls.users = {user.role: user for user in User.objects.all()}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with open(REPORT_PATH, 'w') as report:
+            json.dump({
+                'scale': SCALE,
+                'generated_at': datetime.now().isoformat(timespec='seconds'),
+                'results': cls.report,
+            }, report, indent=2)
+
+    def login_as(self, role):
+        self.client.cookies.clear()
+        user = self.users[role]
+        session = self.client.session
+        session['user_id'] = user.user_id
+        session['username'] = user.username
+        session['role'] = role
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    def url_for(self, pattern):
+        kwargs = {name: self.url_kwargs[name] for name in pattern.pattern.converters}
+        return reverse(f'core:{pattern.name}', kwargs=kwargs)
+
+    def request(self, url):
+        # Views that write on GET (e.g. remove_from_waitlist) are rolled back
+        # so every case sees the same fixture
+        sid = transaction.savepoint()
+        try:
+            started = time.perf_counter()
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return response, (time.perf_counter() - started) * 1000
+        finally:
+            transaction.savepoint_rollback(sid)
+
+    def test_every_url_has_a_budget(self):
+        self.assertEqual(set(BUDGETS), {pattern.name for pattern in urlpatterns})
+
+    def measure(self, url, cold=False):
+        """(response, ms, captured queries) of one GET; ``cold`` rebuilds every cache first"""
+        if cold:
+            expire_caches(self)
+        with CaptureQueriesContext(connection) as queries:
+            response, elapsed_ms = self.request(url)
+        return response, elapsed_ms, queries
+
+    def cold_counts(self):
+        """Query count of every view/role pair with every cache rebuilt"""
+        counts = {}
+        for pattern in urlpatterns:
+            url = self.url_for(pattern)
+            for role in ROLES:
+                self.login_as(role)
+                counts[pattern.name, role] = len(self.measure(url, cold=True)[2])
+        return counts
+
+    def test_view_budgets(self):
+        for pattern in urlpatterns:
+            url = self.url_for(pattern)
+            budget = BUDGETS[pattern.name]
+            budget_ms = WALL_BUDGETS.get(pattern.name, WALL_MS)
+            for role in ROLES:
+                with self.subTest(view=pattern.name, role=role):
+                    self.login_as(role)
+                    # The first request after a write fills the caches; the
+                    # budget is for the next one, as for a user's second visit
+                    cold = self.measure(url, cold=True)[2]
+                    response, elapsed_ms, queries = self.measure(url)
+                    result = {
+                        'url_name': pattern.name,
+                        'url': url,
+                        'role': role,
+                        'status': response.status_code,
+                        'queries': len(queries),
+                        'cold_queries': len(cold),
+                        'budget': budget,
+                        'ms': round(elapsed_ms, 1),
+                        'budget_ms': budget_ms,
+                    }
+                    result['passed'] = (
+                        response.status_code < 500 and len(queries) <= budget and elapsed_ms <= budget_ms
+                    )
+                    self.report.append(result)
+
+                    self.assertLess(response.status_code, 500)
+                    self.assertLessEqual(
+                        len(queries), budget,
+                        '\n'.join(query['sql'] for query in queries.captured_queries),
+                    )
+                    self.assertLessEqual(elapsed_ms, budget_ms)
+
+    def test_cold_queries_do_not_grow(self):
+        """Filling the caches costs the same number of queries on twice the data"""
+        before = self.cold_counts()
+        add_entities(SCALE, batch=1)
+        after = self.cold_counts()
+        for (name, role), count in before.items():
+            with self.subTest(view=name, role=role):
+                self.assertEqual(after[name, role], count)
+
+
+# ==================== EXCLUSION INDEX ====================
+class ExclusionIndexTests(TransactionTestCase):
+    """Incompatible tests written by another connection reach the in-memory index"""
+
+    def setUp(self):
+        today = date.today()
+        self.donor = Donor.objects.create(
+            name='Exclusion Donor', date_of_birth=date(1980, 1, 1), blood_type='O+', donor_type='Deceased',
+            registration_date=today, medical_clearance_date=today, status='Deceased',
+        )
+        self.recipient = Recipient.objects.create(
+            name='Exclusion Recipient', date_of_birth=date(1970, 1, 1), blood_type='O+',
+            medical_urgency_level=3, registration_date=today, status='Waiting',
+        )
+
+    def tearDown(self):
+        # Compatibility_Test rows cascade with the donor and recipient
+        Donor.objects.filter(donor_id=self.donor.donor_id).delete()
+        Recipient.objects.filter(recipient_id=self.recipient.recipient_id).delete()
+
+    def insert_elsewhere(self, result):
+        """Raw INSERT on another thread's connection: no signal, no version bump"""
+        def insert():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO Compatibility_Test (Donor_ID, Recipient_ID, Test_Type, Test_Date, Test_Result) "
+                        "VALUES (%s, %s, 'Crossmatch', CURDATE(), %s)",
+                        [self.donor.donor_id, self.recipient.recipient_id, result],
+                    )
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=insert)
+        thread.start()
+        thread.join()
+
+    def test_insert_from_another_connection_is_excluded(self):
+        self.assertNotIn(self.recipient.recipient_id, excluded_recipients(self.donor.donor_id))
+        self.insert_elsewhere('Incompatible')
+        self.assertIn(self.recipient.recipient_id, excluded_recipients(self.donor.donor_id))
+
+    def test_compatible_insert_is_not_excluded(self):
+        excluded_recipients(self.donor.donor_id)
+        self.insert_elsewhere('Compatible')
+        self.assertNotIn(self.recipient.recipient_id, excluded_recipients(self.donor.donor_id))
+
+
+# ==================== PRIORITY REFRESH ====================
+class PriorityRefreshTests(TestCase):
+    """A refresh_priorities run reaches the waitlist queue of a web process"""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        OrganType.objects.create(type_name='Kidney', typical_viability_hours=36, cold_ischemia_time_max=30)
+        Recipient.objects.bulk_create(
+            Recipient(recipient_id=i, name=f'Recipient {i}', date_of_birth=date(1970, 1, 1), blood_type='O+',
+                      medical_urgency_level=urgency, primary_diagnosis='End-stage renal disease',
+                      registration_date=today, status='Waiting')
+            for i, urgency in ((1, 1), (2, 5))
+        )
+        # Stored scores the other way round from what the urgency levels give
+        RecipientWaitlist.objects.bulk_create(
+            RecipientWaitlist(recipient_id=i, type_name_id='Kidney', priority_score=Decimal(score),
+                              wait_list_date=today, status='Waiting')
+            for i, score in ((1, 90), (2, 1))
+        )
+
+    def queue_order(self):
+        return [recipient_id for recipient_id, _ in queues.top(organ_type='Kidney')]
+
+    def test_command_reorders_the_queue(self):
+        # bulk_create announces nothing; start from queues built on this fixture
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_tables_changed(*QUEUE_TABLES)
+        self.assertEqual(self.queue_order(), [1, 2])
+
+        # As if the command ran in its own process: the signal does not reach
+        # this queue, only the table versions in the shared cache change
+        tables_changed.disconnect(waitlist_tables_changed)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('refresh_priorities', stdout=StringIO())
+        finally:
+            tables_changed.connect(waitlist_tables_changed)
+        self.assertEqual(self.queue_order(), [2, 1])
+
+    def test_counts_due_and_changed_rows(self):
+        # Due (no boundary yet) but already scored as the refresh scores it:
+        # urgency 3 x 8, no wait points, 15 points for a Kidney without CPRA
+        recipient = Recipient.objects.create(
+            name='Recipient 3', date_of_birth=date(1970, 1, 1), blood_type='O+', medical_urgency_level=3,
+            primary_diagnosis='End-stage renal disease', registration_date=date.today(), status='Waiting',
+        )
+        RecipientWaitlist.objects.create(recipient=recipient, type_name_id='Kidney', priority_score=Decimal(39),
+                                         wait_list_date=date.today(), status='Waiting')
+
+        stats = refresh_priorities()
+        self.assertEqual((stats['rows_scanned'], stats['rows_updated']), (3, 2))
+        # Every boundary moved past today
+        stats = refresh_priorities()
+        self.assertEqual((stats['rows_scanned'], stats['rows_updated']), (0, 0))
+        stats = refresh_priorities(incremental=False)
+        self.assertEqual((stats['rows_scanned'], stats['rows_updated']), (3, 0))
+
+
+# ==================== MATCHING ====================
+# (hospital_id, zipcode, latitude, longitude); hospital 6 is not geocoded
+PARITY_HOSPITALS = (
+    (1, '02114', 42.361, -71.069),
+    (2, '10001', 40.750, -73.997),
+    (3, '20001', 38.910, -77.017),
+    (4, '60601', 41.886, -87.618),
+    (5, '80202', 39.753, -104.998),
+    (6, None, None, None),
+)
+# (blood type, HLA typing, urgency, days on the list, listing hospital)
+PARITY_RECIPIENTS = (
+    ('O+', 'A1 A2 B7 B8 DR3 DR4', 3, 400, 1),
+    ('A+', 'A1 A3 B7 B44 DR3 DR7', 5, 35, 2),
+    ('B+', '', 2, 900, 3),
+    ('AB+', 'A2 A24 B8 B13 DR4 DR15', 1, 120, 4),
+    ('O+', 'A11 B35 DR1', 4, 61, 5),
+    ('A+', 'A2 B8 DR4', 2, 10, 6),
+    ('O+', 'A1 B7 DR3', 5, 700, None),
+    ('O-', 'A1 A2 B7 B8 DR3 DR4', 5, 1000, 1),
+    ('AB+', 'A1 A2 B7 B8 DR3 DR4', 5, 800, 2),
+)
+
+
+class MatchingParityTests(TestCase):
+    """rank_recipients scores and orders like MatchOrganToRecipients"""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        procured = datetime.now() - timedelta(hours=1)
+        OrganType.objects.create(type_name='Kidney', typical_viability_hours=36, cold_ischemia_time_max=30)
+        with connection.cursor() as cursor:
+            for hospital_id, zipcode, lat, lon in PARITY_HOSPITALS:
+                Hospital.objects.create(hospital_id=hospital_id, name=f'Hospital {hospital_id}', zipcode=zipcode)
+                HospitalCapabilities.objects.create(hospital_id=hospital_id, type_name_id='Kidney')
+                if zipcode:
+                    cursor.execute('INSERT INTO Zip_Centroid (Zipcode, Latitude, Longitude) VALUES (%s, %s, %s)',
+                                   [zipcode, lat, lon])
+        donor = Donor.objects.create(
+            name='Parity Donor', date_of_birth=date(1980, 1, 1), blood_type='O+', donor_type='Deceased',
+            registration_date=today, medical_clearance_date=today, status='Deceased',
+        )
+        organ_fields = {'type_name_id': 'Kidney', 'donor': donor, 'procurement_date': procured.date(),
+                        'procurement_time': procured.time().replace(microsecond=0), 'status': 'Available'}
+        cls.located = Organ.objects.create(hla_type='A1 A2 B7 B8 DR3 DR4', procuring_hospital_id=1, **organ_fields)
+        cls.unlocated = Organ.objects.create(hla_type='', **organ_fields)
+
+        recipients = []
+        for i, (blood_type, hla_type, urgency, days, hospital_id) in enumerate(PARITY_RECIPIENTS, start=1):
+            recipient = Recipient.objects.create(
+                name=f'Parity Recipient {i}', date_of_birth=date(1970, 1, 1), blood_type=blood_type,
+                hla_type=hla_type, medical_urgency_level=urgency, registration_date=today - timedelta(days=days),
+                status='Waiting', listing_hospital_id=hospital_id,
+            )
+            RecipientWaitlist.objects.create(recipient=recipient, type_name_id='Kidney', status='Waiting',
+                                             priority_score=Decimal(urgency * 8),
+                                             wait_list_date=today - timedelta(days=days))
+            recipients.append(recipient)
+        # The best-scoring candidate is ruled out for this donor
+        CompatibilityTest.objects.create(donor=donor, recipient=recipients[0], test_type='Crossmatch',
+                                         test_date=today, test_result='Incompatible')
+
+    def setUp(self):
+        expire_caches(self)
+
+    def assertParity(self, organ):
+        organ = Organ.objects.select_related('donor').get(organ_id=organ.organ_id)
+        expected = call_procedure('MatchOrganToRecipients', [organ.organ_id])
+        ranked = rank_recipients(organ)
+        self.assertEqual([row['Recipient_ID'] for row in ranked], [row['Recipient_ID'] for row in expected])
+        for ours, theirs in zip(ranked, expected):
+            with self.subTest(recipient=theirs['Recipient_ID']):
+                for column in ('Blood_Type_Score', 'HLA_Score', 'Geographic_Score', 'Urgency_Score',
+                               'Total_Match_Score'):
+                    self.assertAlmostEqual(ours[column], float(theirs[column]), places=3, msg=column)
+                self.assertEqual(ours['Days_Waiting'], theirs['Days_Waiting'])
+
+    def test_located_typed_organ(self):
+        self.assertParity(self.located)
+
+    def test_unlocated_untyped_organ(self):
+        self.assertParity(self.unlocated)
+
+
+# ==================== WAITLIST QUEUE ====================
+class OrganTypeQueueTests(SimpleTestCase):
+    """iter_after resumes the merged queue order exactly after a cursor"""
+
+    def setUp(self):
+        listed = date(2024, 1, 1)
+        self.queues = {organ_type: OrganTypeQueue(organ_type) for organ_type in ('Heart', 'Kidney')}
+        # Recipients 2 and 5 are on both lists with the same key
+        for organ_type, entries in (
+            ('Heart', [(1, 30, 0), (2, 20, 5), (5, 20, 5), (6, 10, 2)]),
+            ('Kidney', [(2, 20, 5), (3, 25, 1), (4, 20, 5), (5, 20, 5), (7, 5, 9)]),
+        ):
+            for recipient_id, priority, days in entries:
+                self.queues[organ_type].put(recipient_id, priority, listed - timedelta(days=days))
+
+    def merged(self, after=None):
+        return list(heapq.merge(*(queue.iter_after(after) for queue in self.queues.values())))
+
+    def test_iter_after_resumes_the_merged_order(self):
+        everything = self.merged()
+        self.assertEqual(everything, sorted(everything))
+        for position, entry in enumerate(everything):
+            with self.subTest(after=entry):
+                self.assertEqual(self.merged(entry), everything[position + 1:])
+
+    def test_put_replaces_and_discard_removes(self):
+        kidney = self.queues['Kidney']
+        kidney.put(7, 50, date(2024, 1, 1))
+        self.assertEqual(next(iter(kidney))[0][2], 7)
+        kidney.discard(7)
+        kidney.discard(99)
+        self.assertEqual([key[2] for key, _ in kidney], [3, 2, 4, 5])
+
+
+# ==================== PAGINATION ====================
+class SeekTests(SimpleTestCase):
+    """seek_q / seek_sql pick the rows after a cursor, NULL sort keys included"""
+
+    # (id, score); NULLs sort first ascending and last descending, as in MySQL
+    ROWS = [(1, None), (2, 5), (3, None), (4, 5), (5, 7), (6, 1), (7, None), (8, 7)]
+
+    def setUp(self):
+        # SQLite orders NULLs like MySQL, so the generated SQL can be run as is
+        self.db = sqlite3.connect(':memory:')
+        self.db.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, score INTEGER)')
+        self.db.executemany('INSERT INTO t VALUES (?, ?)', self.ROWS)
+
+    def tearDown(self):
+        self.db.close()
+
+    def select(self, ordering, condition='1 = 1', params=(), reverse=False):
+        sql = f'SELECT id FROM t WHERE {condition} ORDER BY {order_by_sql(ordering, reverse)}'
+        return [row[0] for row in self.db.execute(sql.replace('%s', '?'), list(params))]
+
+    def test_seek_sql_matches_the_order(self):
+        for ordering in (['score', 'id'], ['-score', 'id'], ['-score', '-id']):
+            ordered = self.select(ordering)
+            rows = dict(self.ROWS)
+            for position, row_id in enumerate(ordered):
+                values = [rows[row_id], row_id]
+                with self.subTest(ordering=ordering, after=values):
+                    self.assertEqual(self.select(ordering, *seek_sql(ordering, values)), ordered[position + 1:])
+                    self.assertEqual(
+                        self.select(ordering, *seek_sql(ordering, values, reverse=True), reverse=True),
+                        ordered[:position][::-1],
+                    )
+
+    def test_seek_q_null_key(self):
+        # Ascending, NULL first: every non-NULL score, then the NULLs with a higher id
+        self.assertEqual(
+            seek_q(['score', 'id'], [None, 3]),
+            Q(score__isnull=False) | (Q(score__isnull=True) & Q(id__gt=3)),
+        )
+        # Descending, NULL last: only the NULLs with a higher id
+        self.assertEqual(seek_q(['-score', 'id'], [None, 3]), Q(score__isnull=True) & Q(id__gt=3))
+
+    def test_seek_q_descending_value(self):
+        # A descending seek past a value also reaches the NULLs after it
+        self.assertEqual(
+            seek_q(['-score', 'id'], [5, 2]),
+            (Q(score__lt=5) | Q(score__isnull=True)) | (Q(score=5) & Q(id__gt=2)),
+        )
+
+
+# ==================== ALLOCATION ====================
+class ConcurrentAllocationTests(TransactionTestCase):
+    """Coordinators allocating the same organ at once: exactly one wins"""
+
+    COORDINATORS = 6
+
+    def setUp(self):
+        today = date.today()
+        procured = datetime.now() - timedelta(hours=1)
+        self.organ_type, self.created_type = OrganType.objects.get_or_create(
+            type_name='Kidney', defaults={'typical_viability_hours': 36, 'cold_ischemia_time_max': 30}
+        )
+        self.donor = Donor.objects.create(
+            name='Race Donor', date_of_birth=date(1980, 1, 1), blood_type='O+', donor_type='Deceased',
+            registration_date=today, medical_clearance_date=today, status='Deceased',
+        )
+        self.organ = Organ.objects.create(
+            type_name=self.organ_type, donor=self.donor, hla_type='', procurement_date=procured.date(),
+            procurement_time=procured.time().replace(microsecond=0), status='Available',
+        )
+        self.recipients = []
+        for i in range(self.COORDINATORS):
+            recipient = Recipient.objects.create(
+                name=f'Race Recipient {i}', date_of_birth=date(1970, 1, 1), blood_type='O+',
+                medical_urgency_level=3, registration_date=today, status='Waiting',
+            )
+            RecipientWaitlist.objects.create(recipient=recipient, type_name=self.organ_type, status='Waiting',
+                                             priority_score=Decimal(24), wait_list_date=today)
+            self.recipients.append(recipient.recipient_id)
+
+    def tearDown(self):
+        OrganAllocation.objects.filter(organ_id=self.organ.organ_id).delete()
+        Organ.objects.filter(organ_id=self.organ.organ_id).delete()
+        Donor.objects.filter(donor_id=self.donor.donor_id).delete()
+        RecipientWaitlist.objects.filter(recipient_id__in=self.recipients).delete()
+        Recipient.objects.filter(recipient_id__in=self.recipients).delete()
+        if self.created_type:
+            self.organ_type.delete()
+
+    def test_one_allocation_wins(self):
+        barrier = threading.Barrier(self.COORDINATORS)
+        outcomes = []
+
+        def coordinator(recipient_id):
+            try:
+                barrier.wait()
+                allocate(self.organ.organ_id, recipient_id)
+                outcomes.append('allocated')
+            except AllocationError as e:
+                outcomes.append(str(e))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=coordinator, args=(recipient_id,)) for recipient_id in self.recipients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('allocated'), 1, outcomes)
+        self.assertTrue(all(outcome.startswith('Organ is not available') for outcome in outcomes
+                            if outcome != 'allocated'), outcomes)
+        self.assertEqual(OrganAllocation.objects.filter(organ_id=self.organ.organ_id).count(), 1)
+        self.assertEqual(Organ.objects.get(organ_id=self.organ.organ_id).status, 'Allocated')
+
+
+class RespondTests(TestCase):
+    """respond() records the answer and the organ's status together"""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        procured = datetime.now() - timedelta(hours=1)
+        kidney = OrganType.objects.create(type_name='Kidney', typical_viability_hours=36, cold_ischemia_time_max=30)
+        donor = Donor.objects.create(
+            name='Respond Donor', date_of_birth=date(1980, 1, 1), blood_type='O+', donor_type='Deceased',
+            registration_date=today, medical_clearance_date=today, status='Deceased',
+        )
+        cls.organ = Organ.objects.create(
+            type_name=kidney, donor=donor, hla_type='', procurement_date=procured.date(),
+            procurement_time=procured.time().replace(microsecond=0), status='Allocated',
+        )
+        cls.recipients = [
+            Recipient.objects.create(
+                name=f'Respond Recipient {i}', date_of_birth=date(1970, 1, 1), blood_type='O+',
+                medical_urgency_level=3, registration_date=today, status='Waiting',
+            )
+            for i in range(2)
+        ]
+
+    def offer(self, recipient, status):
+        now = timezone.now()
+        return OrganAllocation.objects.create(organ=self.organ, recipient=recipient, allocation_date=now,
+                                              match_score=Decimal('75.00'), status=status,
+                                              response_deadline=now + timedelta(hours=6))
+
+    def organ_status(self):
+        return Organ.objects.get(organ_id=self.organ.organ_id).status
+
+    def test_accept(self):
+        allocation = self.offer(self.recipients[0], 'Pending')
+        respond(allocation.allocation_id, 'Accepted')
+        self.assertEqual(OrganAllocation.objects.get(allocation_id=allocation.allocation_id).status, 'Accepted')
+        self.assertEqual(self.organ_status(), 'Allocated')
+
+    def test_accept_after_another_acceptance(self):
+        self.offer(self.recipients[0], 'Accepted')
+        allocation = self.offer(self.recipients[1], 'Pending')
+        with self.assertRaisesMessage(AllocationError, 'already been accepted by another recipient'):
+            respond(allocation.allocation_id, 'Accepted')
+        self.assertEqual(OrganAllocation.objects.get(allocation_id=allocation.allocation_id).status, 'Pending')
+
+    def reject_beside(self, holder):
+        """Reject one offer while another for the organ is ``holder``; the organ's status after"""
+        self.offer(self.recipients[0], holder)
+        allocation = self.offer(self.recipients[1], 'Pending')
+        respond(allocation.allocation_id, 'Rejected')
+        self.assertEqual(OrganAllocation.objects.get(allocation_id=allocation.allocation_id).status, 'Rejected')
+        return self.organ_status()
+
+    def test_reject_beside_a_pending_offer(self):
+        self.assertEqual(self.reject_beside('Pending'), 'Allocated')
+
+    def test_reject_beside_an_accepted_offer(self):
+        self.assertEqual(self.reject_beside('Accepted'), 'Allocated')
+
+    def test_reject_by_the_last_holder_offers_the_organ_again(self):
+        self.assertEqual(self.reject_beside('Rejected'), 'Available')
+
+
+# ==================== HLA ====================
+class HLATests(SimpleTestCase):
+    """Typings parse to broad antigen bitsets; mismatches count donor antigens"""
+
+    def test_broad_antigen_bits(self):
+        a, b, dr = parse_hla('A1,A2,B7,B8,DR3,DR4')
+        self.assertEqual(antigen_names((a, b, dr)), ['A1', 'A2', 'B7', 'B8', 'DR3', 'DR4'])
+        self.assertEqual(a, 0b11)
+
+    def test_splits_and_alleles_map_to_broad(self):
+        broad = parse_hla('A9 A2 B12 DR2')
+        self.assertEqual(parse_hla('A24; A203 / B44 DR15'), broad)
+        self.assertEqual(parse_hla('HLA-A*24:02, A*02:01, B*44:02, DRB1*15:01'), broad)
+        self.assertEqual(parse_hla('A24-B44-DR15 A2'), broad)
+
+    def test_other_loci_are_ignored(self):
+        self.assertEqual(parse_hla('A1 Cw7 B8 DQ2 DR3 DR52'), parse_hla('A1 B8 DR3'))
+
+    def test_untyped(self):
+        self.assertEqual(parse_hla(''), UNTYPED)
+        self.assertEqual(parse_hla(None), UNTYPED)
+        self.assertFalse(is_typed(parse_hla('A1 B8')))
+
+    def test_unknown_antigens_raise(self):
+        for typing in ('A99', 'XYZ', 'B*999'):
+            with self.subTest(typing=typing), self.assertRaises(HLAError):
+                parse_hla(typing)
+
+    def test_mismatch_counts(self):
+        donor = parse_hla('A1 A2 B7 B8 DR3 DR4')
+        recipients = [parse_hla(typing) for typing in (
+            'A1 A2 B7 B8 DR3 DR4',    # identical
+            'A1 A3 B7 B44 DR3 DR7',   # A2, B8, DR4 missing
+            'A3 A11 B13 B14 DR1 DR7', # nothing shared
+            'A2 A24 B8 DR17 DR4',     # split DR17 is broad DR3
+        )]
+        columns = [np.array(column, dtype=np.int64) for column in zip(*recipients)]
+        self.assertEqual(mismatch_counts(donor, *columns).tolist(), [0, 3, 6, 2])
+
+
+class CompatibilityScoreTests(TestCase):
+    """CalculateCompatibilityScore's HLA points equal the engine's, typed or not"""
+
+    DONOR_TYPINGS = ('A1 A2 B7 B8 DR3 DR4', 'A2 B44 DR15', 'A1 B8', '')
+    RECIPIENT_TYPINGS = (
+        'A1 A2 B7 B8 DR3 DR4',
+        'A1 A3 B7 B44 DR3 DR7',
+        'A3 A11 B13 B14 DR1 DR7',
+        'A2 A24 B8 DR17 DR4',
+        'A1 B7',        # DR untyped
+        '',
+        'A99 B8 DR3',   # does not parse: stored as untyped
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        procured = datetime.now() - timedelta(hours=1)
+        kidney = OrganType.objects.create(type_name='Kidney', typical_viability_hours=36, cold_ischemia_time_max=30)
+        # Same blood type and age on both sides: 30 blood + 20 age + 15 size points
+        person = {'date_of_birth': date(1980, 1, 1), 'blood_type': 'O+'}
+        cls.donors = []
+        for i, typing in enumerate(cls.DONOR_TYPINGS):
+            donor = Donor.objects.create(name=f'HLA Donor {i}', donor_type='Deceased', registration_date=today,
+                                         medical_clearance_date=today, status='Deceased', **person)
+            Organ.objects.create(type_name=kidney, donor=donor, hla_type=typing, procurement_date=procured.date(),
+                                 procurement_time=procured.time().replace(microsecond=0), status='Available')
+            cls.donors.append((donor.donor_id, typing))
+        cls.recipients = [
+            (Recipient.objects.create(name=f'HLA Recipient {i}', hla_type=typing, medical_urgency_level=3,
+                                      registration_date=today, status='Waiting', **person).recipient_id, typing)
+            for i, typing in enumerate(cls.RECIPIENT_TYPINGS)
+        ]
+
+    def expected_hla_points(self, donor_typing, recipient_typing):
+        def bits(typing):
+            try:
+                return parse_hla(typing)
+            except HLAError:
+                return UNTYPED
+
+        donor, recipient = bits(donor_typing), bits(recipient_typing)
+        if not (is_typed(donor) and is_typed(recipient)):
+            return HLA_UNTYPED_SCORE
+        return HLA_MAX_SCORE - HLA_MISMATCH_PENALTY * mismatch_count(donor, recipient)
+
+    def test_hla_points_match_the_engine(self):
+        with connection.cursor() as cursor:
+            for donor_id, donor_typing in self.donors:
+                for recipient_id, recipient_typing in self.recipients:
+                    with self.subTest(donor=donor_typing, recipient=recipient_typing):
+                        cursor.execute("SELECT CalculateCompatibilityScore(%s, %s, 'Kidney')", [donor_id, recipient_id])
+                        total = float(cursor.fetchone()[0])
+                        self.assertEqual(total - 65, self.expected_hla_points(donor_typing, recipient_typing))
+
+
+# ==================== GEO ====================
+class HospitalLocationsTests(SimpleTestCase):
+    """within() finds exactly the hospitals a full distance pass finds"""
+
+    def test_within_matches_a_full_pass(self):
+        rng = random.Random(7)
+        rows = [(i, rng.uniform(-89, 89), rng.uniform(-180, 180)) for i in range(1, 400)]
+        # Clusters at the antimeridian and near a pole, where the grid wraps and widens
+        rows += [(1000 + i, rng.uniform(-5, 5), rng.choice((-1, 1)) * rng.uniform(178, 180)) for i in range(50)]
+        rows += [(2000 + i, rng.uniform(80, 89.9), rng.uniform(-180, 180)) for i in range(50)]
+        geo = HospitalLocations(rows, None)
+        for origin in [0, geo.position(1000), geo.position(1001), geo.position(2000)] + rng.sample(range(geo.size), 20):
+            for miles in (50, 250, 1000, 3000):
+                with self.subTest(origin=origin, miles=miles):
+                    expected = np.flatnonzero(geo.distances(origin) <= miles)
+                    self.assertEqual(sorted(geo.within(origin, miles).tolist()), expected.tolist())
+
+    def test_positions(self):
+        geo = HospitalLocations([(5, 40.0, -70.0), (2, 41.0, -71.0)], None)
+        self.assertEqual(geo.positions([2, 3, 5]).tolist(), [0, -1, 1])
+        self.assertEqual(geo.position(None), -1)
+        self.assertAlmostEqual(float(geo.distances(0, [0])[0]), 0.0)
+
+
+class ZipCentroidLoadTests(TestCase):
+    """load_zip_centroids reaches the hospital locations of a running process"""
+
+    GAZETTEER = (
+        'GEOID\tALAND\tINTPTLAT\tINTPTLONG              \n'
+        '02114\t1436398\t42.361\t-71.069\n'
+        'ABCDE\t0\t1.0\t1.0\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        Hospital.objects.create(hospital_id=1, name='Hospital 1', zipcode='02114-2696')
+
+    def test_load_bumps_the_version_and_locations_reload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_tables_changed(*GEO_TABLES)
+        self.assertEqual(locations().position(1), -1)
+        version = table_versions('zip_centroid')[0]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'gazetteer.txt')
+            with open(path, 'w', encoding='utf-8') as gazetteer:
+                gazetteer.write(self.GAZETTEER)
+            out = StringIO()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('load_zip_centroids', path, stdout=out)
+        self.assertIn('1 zip centroids loaded, 1 rows skipped', out.getvalue())
+
+        # Only the version in the shared cache tells this process to reload
+        self.assertGreater(table_versions('zip_centroid')[0], version)
+        geo = locations()
+        position = geo.position(1)
+        self.assertGreaterEqual(position, 0)
+        self.assertAlmostEqual(float(geo.latitude[position]), 42.361)
+        self.assertAlmostEqual(float(geo.longitude[position]), -71.069)
+
+
+# ==================== FEASIBILITY ====================
+class FeasibilityMatrixTests(SimpleTestCase):
+    """An incremental refresh equals a full build; lookups honour elapsed time"""
+
+    BUDGETS = {'Heart': 6, 'Kidney': 30, 'Liver': 12}
+
+    def setUp(self):
+        rng = random.Random(3)
+        # Continental US bounding box
+        self.rows = [(i, rng.uniform(25, 49), rng.uniform(-124, -67)) for i in range(1, 301)]
+        self.capabilities = [(i, type_name) for i in range(1, 301, 7) for type_name in self.BUDGETS]
+        self.matrix = FeasibilityMatrix(HospitalLocations(self.rows, None), self.capabilities, self.BUDGETS, None)
+
+    def assertSameMatrix(self, rows, capabilities):
+        full = FeasibilityMatrix(HospitalLocations(rows, None), capabilities, self.BUDGETS, None)
+        incremental = FeasibilityMatrix(HospitalLocations(rows, None), capabilities, self.BUDGETS, None,
+                                        previous=self.matrix)
+        self.assertLess(incremental.measured, full.measured)
+        self.assertEqual(incremental.centre_ids.tolist(), full.centre_ids.tolist())
+        np.testing.assert_allclose(incremental.hours, full.hours, rtol=1e-5)
+        np.testing.assert_array_equal(incremental.feasible, full.feasible)
+
+    def test_hospital_moves(self):
+        rows = list(self.rows)
+        rows[0] = (rows[0][0], rows[0][1] + 1.5, rows[0][2])  # a centre
+        rows[1] = (rows[1][0], rows[1][1], rows[1][2] - 2.0)  # not a centre
+        self.assertSameMatrix(rows, self.capabilities)
+
+    def test_hospitals_added_and_removed(self):
+        rows = self.rows[5:] + [(1000, 42.36, -71.06), (1001, 34.05, -118.24)]
+        self.assertSameMatrix(rows, self.capabilities + [(1001, 'Heart')])
+
+    def test_programs_opened_and_closed(self):
+        capabilities = [pair for pair in self.capabilities if pair[0] != 8] + [(2, 'Kidney'), (3, 'Heart')]
+        self.assertSameMatrix(self.rows, capabilities)
+
+    def test_elapsed_hours_shrink_the_reachable_centres(self):
+        for elapsed in (0.0, 2.0, 4.0, 5.9):
+            with self.subTest(elapsed=elapsed):
+                centres = self.matrix.centres(1, 'Heart', elapsed)
+                self.assertTrue(all(hours <= 6 - elapsed for _, hours in centres))
+                mask = self.matrix.listing_mask(1, 'Heart', elapsed)
+                self.assertEqual(sorted(self.matrix.geo.hospital_ids[mask].tolist()),
+                                 sorted(hospital_id for hospital_id, _ in centres))
+                for hospital_id, _ in centres:
+                    self.assertEqual(self.matrix.allows(1, hospital_id, 'Heart', elapsed), (True, True))
+        self.assertEqual(self.matrix.centres(1, 'Heart', 7.0), [])
+        self.assertEqual(self.matrix.allows(1, 2, 'Heart'), (False, False))
+
+
+class ListingMaskTests(SimpleTestCase):
+    """WaitlistSnapshot.top drops candidates listed where the organ cannot go"""
+
+    # (hospital_id, lat, lon): 1 and 3 have a heart program, 2 only a kidney
+    # program, 3 is too far for a heart; 4 has a heart program but no location
+    LOCATIONS = [(1, 42.36, -71.06), (2, 42.37, -71.11), (3, 34.05, -118.24)]
+    CAPABILITIES = [(1, 'Heart'), (2, 'Kidney'), (3, 'Heart'), (4, 'Heart')]
+    # Recipient 50 has no listing hospital
+    LISTINGS = {10: 1, 20: 2, 30: 3, 40: 4, 50: None}
+
+    def setUp(self):
+        self.matrix = FeasibilityMatrix(HospitalLocations(self.LOCATIONS, None), self.CAPABILITIES,
+                                        {'Heart': 6, 'Kidney': 30}, None)
+        rows = [
+            (recipient_id, f'Recipient {recipient_id}', 'O+', 3, Decimal(24), date(2024, 1, 1), 0, 0, 0, hospital_id)
+            for recipient_id, hospital_id in self.LISTINGS.items()
+        ]
+        self.snapshot = WaitlistSnapshot('Heart', rows, None)
+
+    def candidates(self, origin_hospital_id, elapsed_hours=0.0):
+        with mock.patch('apps.core.matching.feasibility', return_value=self.matrix):
+            ranked = self.snapshot.top('O+', origin_hospital_id=origin_hospital_id, elapsed_hours=elapsed_hours)
+        return sorted(row['Recipient_ID'] for row in ranked)
+
+    def test_located_non_centres_are_dropped(self):
+        # 20 is listed at a located hospital without the program, 30 out of reach
+        self.assertEqual(self.candidates(1), [10, 40, 50])
+
+    def test_elapsed_hours_drop_reachable_centres(self):
+        # 0.2 hours left is less than the hand-off at the procuring hospital itself
+        self.assertEqual(self.candidates(1, elapsed_hours=5.8), [40, 50])
+
+    def test_unlocated_origin_prunes_nothing(self):
+        self.assertEqual(self.candidates(4), [10, 20, 30, 40, 50])
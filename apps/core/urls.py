@@ -17,6 +17,7 @@ urlpatterns = [
     path('organs/available-view/', views.available_organs_mysql_view, name='available_organs_mysql_view'),
     path('organs/match/<int:organ_id>/', views.match_organ, name='match_organ'),
     path('organs/create/', views.create_organ, name='create_organ'),
+    path('organs/create-batch/', views.create_organ_batch, name='create_organ_batch'),
     path('organs/<int:organ_id>/update/', views.update_organ, name='update_organ'),
     path('organs/<int:organ_id>/viability/', views.check_organ_viability, name='check_organ_viability'),
     path('organs/<int:organ_id>/allocate/', views.allocate_organ_page, name='allocate_organ_page'),
@@ -52,4 +53,10 @@ urlpatterns = [
     # Reports
     path('reports/hospital-performance/', views.hospital_performance, name='hospital_performance'),
     path('reports/waiting-time/', views.waiting_time_analysis, name='waiting_time_analysis'),
+    path('reports/cache-stats/', views.report_cache_stats_view, name='report_cache_stats'),
+    path('reports/db-pool/', views.db_pool_stats_view, name='db_pool_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
+    
+    # Exports
+    path('exports/<str:dataset>/', views.export_dataset, name='export_dataset'),
 ]
\ No newline at end of file
@@ -1,14 +1,77 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib import messages
-from django.contrib.auth.hashers import make_password, check_password
-from django.db import connection
-from datetime import datetime, date
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import BooleanField, Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import Now
+from datetime import datetime, date, time, timedelta
 from .models import (
     Donor, Recipient, Organ, OrganType, Hospital, MedicalStaff,
     Surgery, RecipientWaitlist, OrganAllocation, RecipientMedication,
-    User, FollowUpAppointment, HospitalCapabilities
+    User, FollowUpAppointment
 )
+from .accounts import LoginError, authenticate
+from .allocation import AllocationError, allocate, respond
+from .counters import dashboard_counters
+from .db.pool import pool_stats
 from .decorators import login_required_custom, role_required
+from .exports import EXPORTS, FORMATS, astream_export, export_columns, export_filters, stream_export
+from .feasibility import elapsed_hours, feasibility
+from .hla import HLAError, parse_hla
+from .intake import MAX_BATCH_ORGANS, record_procurement
+from .matching import BLOOD_TYPES, RADIUS_CHOICES, cached_rank_recipients, remaining_viable_hours
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics, scrape_authorized
+from .offers import DEFAULT_MODE as OFFER_MODE, schedule_offers
+from .procedures import cached_procedure_row, call_procedure_row
+from .pagination import filter_fields, paginate_queryset, paginate_sql, selected_filters
+from .replicas import read_connection, read_replica, replica_stats
+from .report_cache import cached_report, report_cache_stats
+from .signals import notify_tables_changed
+from .waitlist_queue import queue_page
+
+# List page filters: (GET parameter, label, choices)
+DONOR_FILTERS = (
+    ('status', 'Status', ('Active', 'Inactive', 'Deceased')),
+    ('blood_type', 'Blood Type', BLOOD_TYPES),
+    ('donor_type', 'Type', ('Living', 'Deceased')),
+)
+RECIPIENT_FILTERS = (
+    ('status', 'Status', ('Waiting', 'Transplanted', 'Deceased', 'Inactive')),
+    ('blood_type', 'Blood Type', BLOOD_TYPES),
+    ('medical_urgency_level', 'Urgency', range(5, 0, -1)),
+)
+ALLOCATION_FILTERS = (
+    ('status', 'Status', ('Pending', 'Accepted', 'Rejected', 'Expired')),
+)
+SURGERY_FILTERS = (
+    ('outcome', 'Outcome', ('Success', 'Complications', 'Failed')),
+)
+SURGERY_LOOKUPS = {'outcome': 'outcome', 'organ_type': 'organ__type_name'}
+CRITICAL_FILTERS = (
+    ('urgency', 'Urgency', (5, 4)),
+    ('blood_type', 'Blood Type', BLOOD_TYPES),
+)
+CRITICAL_COLUMNS = {'urgency': 'Medical_Urgency_Level', 'blood_type': 'Blood_Type', 'organ': 'Organ_Needed'}
+FOLLOWUP_FILTERS = (
+    ('urgency', 'When', ('Today', 'Tomorrow', 'This Week', 'Next Week', 'Later This Month')),
+)
+FOLLOWUP_COLUMNS = {'urgency': 'Appointment_Urgency', 'organ': 'Transplanted_Organ'}
+
+
+def organ_type_names():
+    return cached_report('organ_type_names', lambda: list(OrganType.objects.values_list('type_name', flat=True)))
+
+
+def hospital_choices():
+    return cached_report('hospital_choices', lambda: list(
+        Hospital.objects.order_by('name').values('hospital_id', 'name', 'city', 'state')))
+
+
+def fetch_page(source, ordering, query_params, filters):
+    with read_connection().cursor() as cursor:
+        return paginate_sql(cursor, source, ordering, query_params, filters=filters)
 
 
 # ==================== AUTHENTICATION ====================
@@ -19,25 +82,17 @@ def user_login(request):
         password = request.POST.get('password')
         
         try:
-            user = User.objects.get(username=username)
-            if user.account_status != 'Active':
-                messages.error(request, 'Account is not active')
-                return render(request, 'core/login.html')
-                
-            if user.password_hash == password or check_password(password, user.password_hash):
-                request.session['user_id'] = user.user_id
-                request.session['username'] = user.username
-                request.session['role'] = user.role
-                
-                user.last_login = datetime.now()
-                user.save()
-                
-                messages.success(request, f'Welcome back, {user.username}!')
-                return redirect('core:dashboard')
-            else:
-                messages.error(request, 'Invalid password')
-        except User.DoesNotExist:
-            messages.error(request, 'User not found')
+            user = authenticate(username, password)
+        except LoginError as e:
+            messages.error(request, str(e))
+        else:
+            request.session.cycle_key()
+            request.session['user_id'] = user.user_id
+            request.session['username'] = user.username
+            request.session['role'] = user.role
+            
+            messages.success(request, f'Welcome back, {user.username}!')
+            return redirect('core:dashboard')
     
     return render(request, 'core/login.html')
 
@@ -110,7 +165,7 @@ def dashboard(request):
                 'my_waitlist': my_waitlist,
                 'my_allocations': my_allocations,
                 'my_surgeries': my_surgeries,
-                'total_available_organs': Organ.objects.filter(status='Available').count(),
+                'total_available_organs': dashboard_counters(user_role)['available_organs'],
                 'organ_types': OrganType.objects.all(),
             }
             return render(request, 'core/recipient_dashboard.html', context)
@@ -126,58 +181,75 @@ def dashboard(request):
     
     # STAFF/COORDINATOR/ADMIN get full system dashboard
     else:
+        # All tiles come from one cached aggregate query (counters.py)
         context = {
-            'total_donors': Donor.objects.count(),
-            'total_recipients': Recipient.objects.count(),
-            'total_organs': Organ.objects.count(),
-            'total_hospitals': Hospital.objects.count(),
-            'available_organs': Organ.objects.filter(status='Available').count(),
-            'waiting_recipients': Recipient.objects.filter(status='Waiting').count(),
+            **dashboard_counters(user_role),
             'organ_types': OrganType.objects.all(),
             'user_id': user_id,
             'username': request.session.get('username'),
             'role': user_role,
         }
         
-        if user_role in ['Administrator', 'Medical_Staff', 'Coordinator']:
-            context['total_staff'] = MedicalStaff.objects.count()
-            context['total_surgeries'] = Surgery.objects.count()
-            context['pending_allocations'] = OrganAllocation.objects.filter(status='Pending').count()
-            context['active_waitlist'] = RecipientWaitlist.objects.filter(status='Waiting').count()
-        
         return render(request, 'core/dashboard.html', context)
 
 
 # ==================== ORGANS ====================
+# Viability buckets as Viability_Expires_At ranges, in hours from NOW()
+VIABILITY_BUCKETS = {
+    'Expired': {'viability_expires_at__lt': 0},
+    'Critical': {'viability_expires_at__gte': 0, 'viability_expires_at__lt': 2},
+    'Urgent': {'viability_expires_at__gte': 2, 'viability_expires_at__lte': 6},
+    'Normal': {'viability_expires_at__gt': 6},
+}
+
+VIABILITY_BUCKET_SQL = {
+    'Expired': "Viability_Expires_At < NOW()",
+    'Critical': "Viability_Expires_At >= NOW() AND Viability_Expires_At < NOW() + INTERVAL 2 HOUR",
+    'Urgent': "Viability_Expires_At >= NOW() + INTERVAL 2 HOUR AND Viability_Expires_At <= NOW() + INTERVAL 6 HOUR",
+    'Normal': "Viability_Expires_At > NOW() + INTERVAL 6 HOUR",
+}
+
+
+def viability_bucket_filter(bucket):
+    """Range on viability_expires_at for one bucket - same edges as the available_organs view"""
+    return Q(**{
+        lookup: Now() + timedelta(hours=hours)
+        for lookup, hours in VIABILITY_BUCKETS[bucket].items()
+    })
+
+
+def viability_bucket(remaining_hours):
+    if remaining_hours < 0:
+        return 'Expired'
+    if remaining_hours < 2:
+        return 'Critical'
+    if remaining_hours <= 6:
+        return 'Urgent'
+    return 'Normal'
+
+
 @login_required_custom
+@read_replica
 def available_organs(request):
     """All users can VIEW available organs"""
     organs = Organ.objects.filter(
         status__in=['Available', 'Allocated']
-    ).select_related('donor', 'type_name').order_by('-procurement_date', '-procurement_time')
-    
+    ).select_related('donor', 'type_name').annotate(
+        remaining=ExpressionWrapper(F('viability_expires_at') - Now(), output_field=DurationField())
+    ).order_by('viability_expires_at')
+
+    selected_viability = request.GET.get('viability')
+    if selected_viability in VIABILITY_BUCKETS:
+        organs = organs.filter(viability_bucket_filter(selected_viability))
+    else:
+        selected_viability = None
+
     organs_with_viability = []
     for organ in organs:
-        procurement_datetime = datetime.combine(organ.procurement_date, organ.procurement_time)
-        now = datetime.now()
-        elapsed = now - procurement_datetime
-        elapsed_hours = elapsed.total_seconds() / 3600
         max_viability = organ.type_name.typical_viability_hours
-        remaining_hours = max_viability - elapsed_hours
-        
-        if remaining_hours < 0:
-            viability_status = 'Expired'
-            viability_class = 'expired'
-        elif remaining_hours < 2:
-            viability_status = 'Critical'
-            viability_class = 'critical'
-        elif remaining_hours <= 6:
-            viability_status = 'Urgent'
-            viability_class = 'urgent'
-        else:
-            viability_status = 'Normal'
-            viability_class = 'normal'
-        
+        remaining_hours = organ.remaining.total_seconds() / 3600 if organ.remaining is not None else 0
+        elapsed_hours = max_viability - remaining_hours
+        viability_status = viability_bucket(remaining_hours)
         viability_percentage = (remaining_hours / max_viability * 100) if remaining_hours > 0 else 0
         
         organs_with_viability.append({
@@ -185,7 +257,7 @@ def available_organs(request):
             'remaining_hours': round(remaining_hours, 1),
             'max_hours': max_viability,
             'viability_status': viability_status,
-            'viability_class': viability_class,
+            'viability_class': viability_status.lower(),
             'viability_percentage': round(viability_percentage, 1),
             'elapsed_hours': round(elapsed_hours, 1),
         })
@@ -194,20 +266,36 @@ def available_organs(request):
         'organs_with_viability': organs_with_viability,
         'total_available': len([o for o in organs_with_viability if o['organ'].status == 'Available']),
         'total_allocated': len([o for o in organs_with_viability if o['organ'].status == 'Allocated']),
+        'viability_buckets': list(VIABILITY_BUCKETS),
+        'selected_viability': selected_viability,
     }
     return render(request, 'core/available_organs.html', context)
 
 
 @login_required_custom
+@read_replica
 def available_organs_mysql_view(request):
     """All users can VIEW - uses MySQL view"""
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT * FROM available_organs")
-        columns = [col[0] for col in cursor.description]
-        results = cursor.fetchall()
-        organs = [dict(zip(columns, row)) for row in results]
+    filters = (
+        ('viability', 'Viability', list(VIABILITY_BUCKETS)),
+        ('organ_type', 'Organ', organ_type_names()),
+        ('status', 'Status', ('Available', 'Allocated')),
+    )
+    selected = selected_filters(request.GET, filters)
+    conditions = []
+    if 'viability' in selected:
+        conditions.append((VIABILITY_BUCKET_SQL[selected['viability']], []))
+    if 'organ_type' in selected:
+        conditions.append(('Organ_Type = %s', [selected['organ_type']]))
+    if 'status' in selected:
+        conditions.append(('Status = %s', [selected['status']]))
+
+    with read_connection().cursor() as cursor:
+        organs = paginate_sql(
+            cursor, 'available_organs', ['Viability_Expires_At', 'Organ_ID'], request.GET, filters=conditions
+        )
     
-    context = {'organs': organs}
+    context = {'organs': organs, 'page': organs, 'filter_fields': filter_fields(filters, selected)}
     return render(request, 'core/available_organs_view.html', context)
 
 
@@ -218,18 +306,10 @@ def check_organ_viability(request, organ_id):
     organ = get_object_or_404(Organ, organ_id=organ_id)
     viability_data = None
     
-    with connection.cursor() as cursor:
-        try:
-            cursor.callproc('CheckOrganViability', [organ_id])
-            columns = [col[0] for col in cursor.description]
-            result = cursor.fetchone()
-            viability_data = dict(zip(columns, result)) if result else None
-            
-            while cursor.nextset():
-                cursor.fetchall()
-                
-        except Exception as e:
-            messages.error(request, f'Error: {str(e)}')
+    try:
+        viability_data = cached_procedure_row('CheckOrganViability', [organ_id])
+    except Exception as e:
+        messages.error(request, f'Error: {str(e)}')
     
     context = {
         'organ': organ,
@@ -241,39 +321,26 @@ def check_organ_viability(request, organ_id):
 @login_required_custom
 @role_required('Medical_Staff', 'Administrator')
 def match_organ(request, organ_id):
-    """Medical staff and admin only - Call MatchOrganToRecipients procedure
+    """Medical staff and admin only - Rank recipients with the matching engine
     CONSTRAINT: Only for non-expired organs"""
-    organ = get_object_or_404(Organ, organ_id=organ_id)
+    organ = get_object_or_404(
+        Organ.objects.select_related('donor', 'type_name', 'procuring_hospital'), organ_id=organ_id
+    )
     
     if organ.status == 'Expired':
         messages.error(request, 'Cannot match expired organ')
         return redirect('core:available_organs')
     
-    matches = []
-    
-    with connection.cursor() as cursor:
-        try:
-            cursor.callproc('MatchOrganToRecipients', [organ_id])
-            columns = [col[0] for col in cursor.description]
-            results = cursor.fetchall()
-            
-            if results and len(results) > 0:
-                first_row = results[0]
-                if columns[0] == 'Message' and isinstance(first_row[0], str) and 'Error' in first_row[0]:
-                    messages.error(request, first_row[0])
-                else:
-                    matches = [dict(zip(columns, row)) for row in results]
-            
-            while cursor.nextset():
-                cursor.fetchall()
-                
-        except Exception as e:
-            messages.error(request, f'Error calling procedure: {str(e)}')
+    within = request.GET.get('within_miles', '')
+    within_miles = int(within) if within.isdigit() and int(within) in RADIUS_CHOICES else None
+    matches = cached_rank_recipients(organ, within_miles=within_miles)
     
     context = {
         'organ': organ,
         'matches': matches,
         'match_count': len(matches),
+        'radius_choices': RADIUS_CHOICES,
+        'within_miles': within_miles,
     }
     return render(request, 'core/match_organ.html', context)
 
@@ -281,87 +348,32 @@ def match_organ(request, organ_id):
 @login_required_custom
 @role_required('Medical_Staff', 'Administrator')
 def allocate_organ_page(request, organ_id):
-    """Medical staff and admin only - Call AllocateOrgan procedure
+    """Medical staff and admin only - Allocate through the locking allocation service, candidates ranked by the matching engine
     CONSTRAINT: Only for AVAILABLE organs"""
-    organ = get_object_or_404(Organ, organ_id=organ_id)
+    organ = get_object_or_404(Organ.objects.select_related('donor', 'type_name'), organ_id=organ_id)
     
     if organ.status != 'Available':
         messages.error(request, f'Cannot allocate organ. Current status: {organ.status}')
         return redirect('core:available_organs')
     
-    procurement_datetime = datetime.combine(organ.procurement_date, organ.procurement_time)
-    elapsed_hours = (datetime.now() - procurement_datetime).total_seconds() / 3600
-    remaining_hours = organ.type_name.typical_viability_hours - elapsed_hours
-    
-    if remaining_hours <= 0:
+    if remaining_viable_hours(organ) <= 0:
         messages.error(request, 'Cannot allocate expired organ')
         return redirect('core:available_organs')
     
     if request.method == 'POST':
-        recipient_id = request.POST.get('recipient_id')
-        
-        if not RecipientWaitlist.objects.filter(
-            recipient_id=recipient_id,
-            type_name=organ.type_name,
-            status='Waiting'
-        ).exists():
-            messages.error(request, 'Recipient is not on waitlist for this organ type')
+        recipient_id = request.POST.get('recipient_id', '')
+        if not recipient_id.isdigit():
+            messages.error(request, 'Select a recipient')
             return redirect('core:allocate_organ_page', organ_id=organ_id)
         
-        allocation_result = None
-        with connection.cursor() as cursor:
-            try:
-                cursor.callproc('AllocateOrgan', [organ_id, recipient_id])
-                
-                if cursor.description:
-                    columns = [col[0] for col in cursor.description]
-                    result = cursor.fetchone()
-                    allocation_result = dict(zip(columns, result)) if result else None
-                
-                while True:
-                    if not cursor.nextset():
-                        break
-                    if cursor.description:
-                        cursor.fetchall()
-                        
-            except Exception as e:
-                messages.error(request, f'Error during allocation: {str(e)}')
-                allocation_result = None
-        
-        if allocation_result and 'Success' in str(allocation_result.get('Message', '')):
-            messages.success(request, f"Organ allocated successfully! Allocation ID: {allocation_result.get('Allocation_ID')}")
+        try:
+            allocation = allocate(organ_id, int(recipient_id))
+            messages.success(request, f"Organ allocated successfully! Allocation ID: {allocation.allocation_id}")
             return redirect('core:allocation_list')
-        else:
-            error_msg = allocation_result.get('Message', 'Allocation failed') if allocation_result else 'Allocation failed'
-            messages.error(request, error_msg)
-    
-    potential_recipients = []
-    
-    waitlist_entries = RecipientWaitlist.objects.filter(
-        type_name=organ.type_name,
-        status='Waiting',
-        recipient__status='Waiting'
-    ).select_related('recipient').order_by('-priority_score')[:10]
-    
-    for entry in waitlist_entries:
-        donor_blood = organ.donor.blood_type
-        recip_blood = entry.recipient.blood_type
-        
-        blood_score = 30 if donor_blood == recip_blood else 20
-        wait_score = min((datetime.now().date() - entry.wait_list_date).days / 30, 20)
-        urgency_score = entry.recipient.medical_urgency_level * 2
-        total_score = blood_score + 15 + wait_score + 15 + urgency_score
-        
-        potential_recipients.append({
-            'Recipient_ID': entry.recipient.recipient_id,
-            'Recipient_Name': entry.recipient.name,
-            'Recipient_Blood': entry.recipient.blood_type,
-            'Medical_Urgency_Level': entry.recipient.medical_urgency_level,
-            'Days_Waiting': (datetime.now().date() - entry.wait_list_date).days,
-            'Total_Match_Score': round(total_score, 1),
-        })
+        except AllocationError as e:
+            messages.error(request, f'Error: {str(e)}')
     
-    potential_recipients.sort(key=lambda x: x['Total_Match_Score'], reverse=True)
+    potential_recipients = cached_rank_recipients(organ)
     
     context = {
         'organ': organ,
@@ -382,6 +394,7 @@ def create_organ(request):
         procurement_time = request.POST.get('procurement_time')
         hla_type = request.POST.get('hla_type')
         size_weight = request.POST.get('size_weight')
+        procuring_hospital_id = request.POST.get('procuring_hospital_id')
         
         proc_date = datetime.strptime(procurement_date, '%Y-%m-%d').date()
         if proc_date > date.today():
@@ -389,16 +402,25 @@ def create_organ(request):
             return redirect('core:create_organ')
         
         try:
-            Organ.objects.create(
-                donor_id=donor_id,
-                type_name_id=organ_type,
-                procurement_date=procurement_date,
-                procurement_time=procurement_time,
-                hla_type=hla_type if hla_type else None,
-                size_weight=size_weight if size_weight else None,
-                status='Available'
-            )
-            messages.success(request, 'Organ recorded! Triggers fired: validation ✓, auto-matching ✓')
+            parse_hla(hla_type)
+        except HLAError as e:
+            messages.error(request, str(e))
+            return redirect('core:create_organ')
+        
+        try:
+            with transaction.atomic():
+                organ = Organ.objects.create(
+                    donor_id=donor_id,
+                    type_name_id=organ_type,
+                    procurement_date=proc_date,
+                    procurement_time=time.fromisoformat(procurement_time),
+                    hla_type=hla_type if hla_type else None,
+                    size_weight=size_weight if size_weight else None,
+                    procuring_hospital_id=procuring_hospital_id if procuring_hospital_id else None,
+                    status='Available'
+                )
+                schedule_offers([organ])
+            messages.success(request, 'Organ recorded! Trigger validation ✓, initial offers ✓')
             return redirect('core:available_organs')
         except Exception as e:
             messages.error(request, f'Trigger validation failed: {str(e)}')
@@ -409,10 +431,57 @@ def create_organ(request):
             medical_clearance_date__isnull=False
         ).order_by('-registration_date'),
         'organ_types': OrganType.objects.all(),
+        'hospitals': hospital_choices(),
     }
     return render(request, 'core/organ_form.html', context)
 
 
+@login_required_custom
+@role_required('Medical_Staff', 'Administrator')
+def create_organ_batch(request):
+    """Medical staff and admin only - Record every organ procured from a donor in one submission
+    CONSTRAINTS: Donor must be Active/Deceased with medical clearance (checked once for the batch)"""
+    if request.method == 'POST':
+        donor_id = request.POST.get('donor_id')
+        procurement_date = request.POST.get('procurement_date')
+        procurement_time = request.POST.get('procurement_time')
+        hla_type = request.POST.get('hla_type')
+
+        proc_date = datetime.strptime(procurement_date, '%Y-%m-%d').date()
+        if proc_date > date.today():
+            messages.error(request, 'Procurement date cannot be in the future')
+            return redirect('core:create_organ_batch')
+
+        organs = [
+            {'type_name': organ_type, 'hla_type': hla_type, 'size_weight': size_weight}
+            for organ_type, size_weight in zip(request.POST.getlist('organ_type'), request.POST.getlist('size_weight'))
+            if organ_type
+        ]
+        try:
+            created, offers = record_procurement(
+                donor_id, organs, proc_date, time.fromisoformat(procurement_time),
+                procuring_hospital_id=request.POST.get('procuring_hospital_id') or None,
+            )
+            if OFFER_MODE == 'deferred':
+                messages.success(request, f'{len(created)} organ(s) recorded, initial offers queued ✓')
+            else:
+                messages.success(request, f'{len(created)} organ(s) recorded with {len(offers)} initial offer(s) ✓')
+            return redirect('core:available_organs')
+        except Exception as e:
+            messages.error(request, f'Intake failed: {str(e)}')
+
+    context = {
+        'donors': Donor.objects.filter(
+            status__in=['Active', 'Deceased'],
+            medical_clearance_date__isnull=False
+        ).order_by('-registration_date'),
+        'organ_types': OrganType.objects.all(),
+        'organ_rows': range(MAX_BATCH_ORGANS),
+        'hospitals': hospital_choices(),
+    }
+    return render(request, 'core/organ_batch_form.html', context)
+
+
 @login_required_custom
 @role_required('Medical_Staff', 'Administrator')
 def update_organ(request, organ_id):
@@ -442,11 +511,17 @@ def update_organ(request, organ_id):
 # ==================== DONORS ====================
 @login_required_custom
 @role_required('Medical_Staff', 'Coordinator', 'Administrator')
+@read_replica
 def donor_list(request):
     """Staff, coordinators, and admin can view donors
     Shows organ count for each donor"""
-    donors = Donor.objects.prefetch_related('organ_set').all().order_by('-registration_date')
-    context = {'donors': donors}
+    selected = selected_filters(request.GET, DONOR_FILTERS)
+    donors = paginate_queryset(
+        Donor.objects.filter(**selected).annotate(organ_count=Count('organ')),
+        ['-registration_date', 'donor_id'],
+        request.GET
+    )
+    context = {'donors': donors, 'page': donors, 'filter_fields': filter_fields(DONOR_FILTERS, selected)}
     return render(request, 'core/donor_list.html', context)
 
 
@@ -508,10 +583,16 @@ def update_donor(request, donor_id):
 # ==================== RECIPIENTS ====================
 @login_required_custom
 @role_required('Medical_Staff', 'Coordinator', 'Administrator')
+@read_replica
 def recipient_list(request):
     """Staff, coordinators, and admin can view all recipients"""
-    recipients = Recipient.objects.all().order_by('-medical_urgency_level', '-registration_date')
-    context = {'recipients': recipients}
+    selected = selected_filters(request.GET, RECIPIENT_FILTERS)
+    recipients = paginate_queryset(
+        Recipient.objects.filter(**selected),
+        ['-medical_urgency_level', '-registration_date', 'recipient_id'],
+        request.GET
+    )
+    context = {'recipients': recipients, 'page': recipients, 'filter_fields': filter_fields(RECIPIENT_FILTERS, selected)}
     return render(request, 'core/recipient_list.html', context)
 
 
@@ -527,6 +608,13 @@ def create_recipient(request):
             messages.error(request, 'Medical urgency level must be between 1 and 5')
             return redirect('core:create_recipient')
         
+        hla_type = request.POST.get('hla_type')
+        try:
+            parse_hla(hla_type)
+        except HLAError as e:
+            messages.error(request, str(e))
+            return redirect('core:create_recipient')
+        
         Recipient.objects.create(
             name=request.POST.get('name'),
             date_of_birth=request.POST.get('date_of_birth'),
@@ -538,12 +626,14 @@ def create_recipient(request):
             medical_urgency_level=urgency,
             registration_date=request.POST.get('registration_date'),
             status='Waiting',
-            insurance_info=request.POST.get('insurance_info')
+            insurance_info=request.POST.get('insurance_info'),
+            hla_type=hla_type if hla_type else None,
+            listing_hospital_id=request.POST.get('listing_hospital_id') or None
         )
         messages.success(request, 'Recipient registered successfully!')
         return redirect('core:recipient_list')
     
-    return render(request, 'core/recipient_form.html')
+    return render(request, 'core/recipient_form.html', {'hospitals': hospital_choices()})
 
 
 @login_required_custom
@@ -566,11 +656,20 @@ def update_recipient(request, recipient_id):
             messages.error(request, 'Cannot manually set to Transplanted. Use surgery scheduling.')
             return redirect('core:update_recipient', recipient_id=recipient_id)
         
+        hla_type = request.POST.get('hla_type')
+        try:
+            parse_hla(hla_type)
+        except HLAError as e:
+            messages.error(request, str(e))
+            return redirect('core:update_recipient', recipient_id=recipient_id)
+        
         old_urgency = recipient.medical_urgency_level
         recipient.medical_urgency_level = new_urgency
         recipient.status = new_status
         recipient.contact_info = request.POST.get('contact_info')
         recipient.insurance_info = request.POST.get('insurance_info')
+        recipient.hla_type = hla_type if hla_type else None
+        recipient.listing_hospital_id = request.POST.get('listing_hospital_id') or None
         recipient.save()
         
         if old_urgency != new_urgency:
@@ -579,17 +678,18 @@ def update_recipient(request, recipient_id):
             messages.success(request, 'Recipient updated successfully!')
         return redirect('core:recipient_list')
     
-    context = {'recipient': recipient}
+    context = {'recipient': recipient, 'hospitals': hospital_choices()}
     return render(request, 'core/recipient_update.html', context)
 
 
 @login_required_custom
+@read_replica
 def recipient_history(request, recipient_id):
     """Recipients can view their own, staff can view all"""
     user_role = request.session.get('role')
     user_id = request.session.get('user_id')
     
-    recipient = get_object_or_404(Recipient, recipient_id=recipient_id)
+    recipient = get_object_or_404(Recipient.objects.select_related('user'), recipient_id=recipient_id)
     
     if user_role == 'Recipient':
         if not recipient.user or recipient.user.user_id != user_id:
@@ -609,40 +709,71 @@ def recipient_history(request, recipient_id):
 
 @login_required_custom
 @role_required('Medical_Staff', 'Coordinator', 'Administrator')
+@read_replica
 def critical_recipients(request):
     """Staff, coordinators, and admin only - Query critical_recipients MySQL VIEW"""
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT * FROM critical_recipients")
-        columns = [col[0] for col in cursor.description]
-        results = cursor.fetchall()
-        critical_patients = [dict(zip(columns, row)) for row in results]
+    filters = CRITICAL_FILTERS + (('organ', 'Organ', organ_type_names()),)
+    selected = selected_filters(request.GET, filters)
+    critical_patients = cached_report(
+        'critical_recipients',
+        lambda: fetch_page(
+            'critical_recipients',
+            ['-Medical_Urgency_Level', '-Priority_Score', 'Wait_List_Date', 'Recipient_ID', 'Organ_Needed'],
+            request.GET,
+            [(f'{CRITICAL_COLUMNS[param]} = %s', [value]) for param, value in selected.items()]
+        ),
+        role=request.session.get('role'),
+        params=request.GET.urlencode(),
+    )
     
-    context = {'critical_patients': critical_patients}
+    context = {
+        'critical_patients': critical_patients,
+        'page': critical_patients,
+        'filter_fields': filter_fields(filters, selected),
+    }
     return render(request, 'core/critical_recipients.html', context)
 
 
 # ==================== WAITLIST ====================
 @login_required_custom
+@read_replica
 def waitlist(request):
-    """All users can VIEW waitlist"""
-    waitlist_entries = RecipientWaitlist.objects.filter(
-        status='Waiting'
-    ).select_related('recipient', 'type_name').order_by('-priority_score', 'wait_list_date')
+    """All users can VIEW waitlist - top entries served from the in-memory priority queue"""
+    organ_type = request.GET.get('organ_type') or None
+    waitlist_entries = queue_page(request.GET, organ_type)
     
-    context = {'waitlist_entries': waitlist_entries}
+    context = {
+        'waitlist_entries': waitlist_entries,
+        'page': waitlist_entries,
+        'organ_types': OrganType.objects.all(),
+        'selected_organ_type': organ_type,
+    }
     return render(request, 'core/waitlist.html', context)
 
 
 @login_required_custom
+@read_replica
 def active_waitlist_mysql_view(request):
-    """All users can VIEW - uses MySQL active_wait_list VIEW"""
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT * FROM active_wait_list")
-        columns = [col[0] for col in cursor.description]
-        results = cursor.fetchall()
-        waitlist = [dict(zip(columns, row)) for row in results]
-    
-    context = {'waitlist': waitlist}
+    """All users can VIEW - uses MySQL active_wait_list VIEW for a page of the queue"""
+    def view_rows(entries):
+        if not entries:
+            return []
+        recipient_ids = sorted({key[2] for key, _ in entries})
+        placeholders = ', '.join(['%s'] * len(recipient_ids))
+        with read_connection().cursor() as cursor:
+            cursor.execute(f"SELECT * FROM active_wait_list WHERE Recipient_ID IN ({placeholders})", recipient_ids)
+            columns = [col[0] for col in cursor.description]
+            results = cursor.fetchall()
+            rows = {(row['Recipient_ID'], row['Organ_Type_Needed']): row for row in (dict(zip(columns, r)) for r in results)}
+        return [rows[(key[2], organ_type)] for key, organ_type in entries if (key[2], organ_type) in rows]
+
+    filters = (('organ_type', 'Organ', organ_type_names()),)
+    selected = selected_filters(request.GET, filters)
+    waitlist = queue_page(
+        request.GET, selected.get('organ_type'), waiting_recipients_only=True, rows_for=view_rows
+    )
+    
+    context = {'waitlist': waitlist, 'page': waitlist, 'filter_fields': filter_fields(filters, selected)}
     return render(request, 'core/active_waitlist_view.html', context)
 
 
@@ -694,18 +825,11 @@ def calculate_priority(request, recipient_id, organ_type):
     """Staff, coordinators, and admin - Call CalculatePriorityScore procedure"""
     priority_data = None
     
-    with connection.cursor() as cursor:
-        try:
-            cursor.callproc('CalculatePriorityScore', [recipient_id, organ_type])
-            columns = [col[0] for col in cursor.description]
-            result = cursor.fetchone()
-            priority_data = dict(zip(columns, result)) if result else None
-            
-            while cursor.nextset():
-                cursor.fetchall()
-                
-        except Exception as e:
-            messages.error(request, f'Error: {str(e)}')
+    try:
+        priority_data = call_procedure_row('CalculatePriorityScore', [recipient_id, organ_type])
+    except Exception as e:
+        messages.error(request, f'Error: {str(e)}')
+    notify_tables_changed('recipient_waitlist', recipient_ids={recipient_id})
     
     recipient = get_object_or_404(Recipient, recipient_id=recipient_id)
     
@@ -743,25 +867,23 @@ def remove_from_waitlist(request, recipient_id, organ_type):
 
 # ==================== ALLOCATIONS ====================
 @login_required_custom
+@read_replica
 def allocation_list(request):
     """Recipients see their own, staff see all"""
     user_role = request.session.get('role')
     user_id = request.session.get('user_id')
     
+    selected = selected_filters(request.GET, ALLOCATION_FILTERS)
+    allocations = OrganAllocation.objects.filter(**selected).select_related('organ__type_name', 'recipient', 'organ__donor')
     if user_role == 'Recipient':
         try:
             recipient = Recipient.objects.get(user_id=user_id)
-            allocations = OrganAllocation.objects.filter(
-                recipient=recipient
-            ).select_related('organ', 'recipient', 'organ__donor').order_by('-allocation_date')
+            allocations = allocations.filter(recipient=recipient)
         except Recipient.DoesNotExist:
             allocations = OrganAllocation.objects.none()
-    else:
-        allocations = OrganAllocation.objects.select_related(
-            'organ', 'recipient', 'organ__donor'
-        ).order_by('-allocation_date')
     
-    context = {'allocations': allocations}
+    allocations = paginate_queryset(allocations, ['-allocation_date', '-allocation_id'], request.GET)
+    context = {'allocations': allocations, 'page': allocations, 'filter_fields': filter_fields(ALLOCATION_FILTERS, selected)}
     return render(request, 'core/allocation_list.html', context)
 
 
@@ -772,16 +894,21 @@ def respond_to_allocation(request, allocation_id):
     user_role = request.session.get('role')
     user_id = request.session.get('user_id')
     
-    allocation = get_object_or_404(OrganAllocation, allocation_id=allocation_id)
+    # Deadlines are in server time (NOW() in the procedures), so they are compared there
+    allocation = get_object_or_404(
+        OrganAllocation.objects.select_related('organ__donor', 'recipient__user').annotate(
+            lapsed=ExpressionWrapper(Q(response_deadline__lt=Now()), output_field=BooleanField())
+        ),
+        allocation_id=allocation_id
+    )
     
     if allocation.status != 'Pending':
         messages.error(request, f'Cannot respond - allocation is already {allocation.status}')
         return redirect('core:allocation_list')
     
-    if allocation.response_deadline and datetime.now() > allocation.response_deadline.replace(tzinfo=None):
+    # Lapsed allocations are marked Expired by the expiry sweeper, not here
+    if allocation.lapsed:
         messages.error(request, 'Response deadline has passed')
-        allocation.status = 'Expired'
-        allocation.save()
         return redirect('core:allocation_list')
     
     if allocation.recipient.status != 'Waiting':
@@ -795,14 +922,14 @@ def respond_to_allocation(request, allocation_id):
     
     if request.method == 'POST':
         response = request.POST.get('response')
-        allocation.status = response
-        allocation.save()
+        try:
+            respond(allocation_id, response)
+        except AllocationError as e:
+            messages.error(request, f'Error: {str(e)}')
+            return redirect('core:allocation_list')
         
         if response == 'Rejected':
-            organ = allocation.organ
-            organ.status = 'Available'
-            organ.save()
-            messages.success(request, 'Allocation rejected. Organ is available again.')
+            messages.success(request, 'Allocation rejected. Organ is offered again.')
         else:
             messages.success(request, f'Allocation {response}!')
         
@@ -815,13 +942,18 @@ def respond_to_allocation(request, allocation_id):
 # ==================== SURGERY ====================
 @login_required_custom
 @role_required('Medical_Staff', 'Administrator')
+@read_replica
 def surgery_list(request):
     """Medical staff and admin only"""
-    surgeries = Surgery.objects.select_related(
-        'recipient', 'organ', 'hospital', 'primary_surgeon'
-    ).order_by('-surgery_date')
+    filters = SURGERY_FILTERS + (('organ_type', 'Organ', organ_type_names()),)
+    selected = selected_filters(request.GET, filters)
+    surgeries = paginate_queryset(
+        Surgery.objects.filter(**{SURGERY_LOOKUPS[param]: value for param, value in selected.items()}).select_related('recipient', 'organ__type_name', 'hospital', 'primary_surgeon'),
+        ['-surgery_date', '-surgery_id'],
+        request.GET
+    )
     
-    context = {'surgeries': surgeries}
+    context = {'surgeries': surgeries, 'page': surgeries, 'filter_fields': filter_fields(filters, selected)}
     return render(request, 'core/surgery_list.html', context)
 
 
@@ -855,12 +987,20 @@ def create_surgery(request):
             messages.error(request, f'Organ must be Allocated. Current status: {organ.status}')
             return redirect('core:create_surgery')
         
-        if not HospitalCapabilities.objects.filter(
-            hospital_id=hospital_id,
-            type_name=organ.type_name
-        ).exists():
+        if not (hospital_id or '').isdigit():
+            messages.error(request, 'Please select a hospital')
+            return redirect('core:create_surgery')
+        
+        capable, reachable = feasibility().allows(
+            organ.procuring_hospital_id, int(hospital_id), organ.type_name_id, elapsed_hours(organ)
+        )
+        if not capable:
             messages.error(request, 'Selected hospital cannot perform this organ type transplant')
             return redirect('core:create_surgery')
+        if not reachable:
+            messages.error(request, f'Selected hospital cannot be reached within what is left of the '
+                                    f'{organ.type_name.cold_ischemia_time_max}-hour cold ischemia limit')
+            return redirect('core:create_surgery')
         
         try:
             surgeon = MedicalStaff.objects.get(staff_id=surgeon_id)
@@ -908,14 +1048,26 @@ def create_surgery(request):
         organ__status='Allocated'
     ).select_related('organ', 'organ__donor', 'organ__type_name', 'recipient')
     
+    # Each pair lists only the centres its organ can reach in time, nearest first
+    matrix = feasibility()
+    hospitals = {hospital['hospital_id']: hospital for hospital in hospital_choices()}
     for alloc in accepted_allocations:
+        organ = alloc.organ
+        centres = [
+            {**hospitals[hospital_id], 'transport_hours': hours}
+            for hospital_id, hours in matrix.centres(organ.procuring_hospital_id, organ.type_name_id,
+                                                     elapsed_hours(organ))
+            if hospital_id in hospitals
+        ]
+        centres.sort(key=lambda centre: (centre['transport_hours'] is None, centre['transport_hours'] or 0,
+                                         centre['name']))
         organ_recipient_pairs.append({
-            'organ': alloc.organ,
+            'organ': organ,
             'recipient': alloc.recipient,
+            'hospitals': centres,
         })
     
     context = {
-        'hospitals': Hospital.objects.all(),
         'organ_recipient_pairs': organ_recipient_pairs,
         'surgeons': MedicalStaff.objects.filter(
             specialization='Transplant_Surgeon'
@@ -927,56 +1079,117 @@ def create_surgery(request):
 
 @login_required_custom
 @role_required('Medical_Staff', 'Coordinator', 'Administrator')
+@read_replica
 def upcoming_followups(request):
     """Staff, coordinators, and admin - Query upcoming_follow_ups MySQL VIEW"""
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT * FROM upcoming_follow_ups")
-        columns = [col[0] for col in cursor.description]
-        results = cursor.fetchall()
-        followups = [dict(zip(columns, row)) for row in results]
+    filters = FOLLOWUP_FILTERS + (('organ', 'Organ', organ_type_names()),)
+    selected = selected_filters(request.GET, filters)
+    followups = cached_report(
+        'upcoming_followups',
+        lambda: fetch_page(
+            'upcoming_follow_ups',
+            ['Appointment_Date', 'Appointment_Time', 'Appointment_ID'],
+            request.GET,
+            [(f'{FOLLOWUP_COLUMNS[param]} = %s', [value]) for param, value in selected.items()]
+        ),
+        role=request.session.get('role'),
+        params=request.GET.urlencode(),
+    )
     
-    context = {'followups': followups}
+    context = {'followups': followups, 'page': followups, 'filter_fields': filter_fields(filters, selected)}
     return render(request, 'core/upcoming_followups.html', context)
 
 
 # ==================== REPORTS ====================
 @login_required_custom
 @role_required('Medical_Staff', 'Coordinator', 'Administrator')
+@read_replica
 def hospital_performance(request):
     """Staff, coordinators, and admin - Query transplant_success_rate_by_hospital VIEW"""
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT * FROM transplant_success_rate_by_hospital")
-        columns = [col[0] for col in cursor.description]
-        results = cursor.fetchall()
-        hospitals = [dict(zip(columns, row)) for row in results]
+    def build():
+        with read_connection().cursor() as cursor:
+            cursor.execute("SELECT * FROM transplant_success_rate_by_hospital")
+            columns = [col[0] for col in cursor.description]
+            results = cursor.fetchall()
+            return [dict(zip(columns, row)) for row in results]
     
+    hospitals = cached_report('hospital_performance', build, role=request.session.get('role'))
     context = {'hospitals': hospitals}
     return render(request, 'core/hospital_performance.html', context)
 
 
 @login_required_custom
 @role_required('Medical_Staff', 'Coordinator', 'Administrator')
+@read_replica
 def waiting_time_analysis(request):
-    """Staff, coordinators, and admin - Complex query with CalculateWaitTimeDays function"""
-    with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT 
-                ot.Type_Name as Organ_Type,
-                r.Blood_Type,
-                AVG(CalculateWaitTimeDays(r.Recipient_ID, ot.Type_Name)) as Avg_Wait_Days,
-                COUNT(*) as Recipient_Count,
-                MIN(CalculateWaitTimeDays(r.Recipient_ID, ot.Type_Name)) as Min_Wait_Days,
-                MAX(CalculateWaitTimeDays(r.Recipient_ID, ot.Type_Name)) as Max_Wait_Days
-            FROM Recipient r
-            JOIN Recipient_Waitlist rw ON r.Recipient_ID = rw.Recipient_ID
-            JOIN Organ_Type ot ON rw.Type_Name = ot.Type_Name
-            WHERE r.Status = 'Waiting' AND rw.Status = 'Waiting'
-            GROUP BY ot.Type_Name, r.Blood_Type
-            ORDER BY Avg_Wait_Days DESC
-        """)
-        columns = [col[0] for col in cursor.description]
-        results = cursor.fetchall()
-        wait_times = [dict(zip(columns, row)) for row in results]
+    """Staff, coordinators, and admin - Wait times from the Wait_Time_Rollup table"""
+    # One row per (organ type, blood type), kept current by the waitlist
+    # triggers; wait days are derived from today's date
+    def build():
+        with read_connection().cursor() as cursor:
+            cursor.execute("""
+                SELECT 
+                    Type_Name as Organ_Type,
+                    Blood_Type,
+                    TO_DAYS(CURDATE()) - Wait_List_Day_Sum / Recipient_Count as Avg_Wait_Days,
+                    Recipient_Count,
+                    DATEDIFF(CURDATE(), Max_Wait_List_Date) as Min_Wait_Days,
+                    DATEDIFF(CURDATE(), Min_Wait_List_Date) as Max_Wait_Days
+                FROM Wait_Time_Rollup
+                WHERE Recipient_Count > 0
+                ORDER BY Avg_Wait_Days DESC
+            """)
+            columns = [col[0] for col in cursor.description]
+            results = cursor.fetchall()
+            return [dict(zip(columns, row)) for row in results]
+    
+    wait_times = cached_report('waiting_time_analysis', build, role=request.session.get('role'))
     
     context = {'wait_times': wait_times}
-    return render(request, 'core/waiting_time_analysis.html', context)
\ No newline at end of file
+    return render(request, 'core/waiting_time_analysis.html', context)
+
+@login_required_custom
+@role_required('Administrator')
+def report_cache_stats_view(request):
+    """Admin only - Report cache hit/miss/rebuild stats as JSON"""
+    return JsonResponse(report_cache_stats())
+
+
+def metrics_view(request):
+    """Admin, or Prometheus with the METRICS_TOKEN bearer token - Request and database metrics"""
+    if not (scrape_authorized(request) or request.session.get('role') == 'Administrator'):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
+@login_required_custom
+@role_required('Administrator')
+def db_pool_stats_view(request):
+    """Admin only - Connection pool size, utilisation and wait times, and replica routing, as JSON"""
+    return JsonResponse({'pools': pool_stats(), 'replicas': replica_stats()})
+
+
+# ==================== EXPORTS ====================
+@login_required_custom
+@role_required('Medical_Staff', 'Coordinator', 'Administrator')
+def export_dataset(request, dataset):
+    """Staff, coordinators, and admin - Stream a full extract as CSV or NDJSON"""
+    export = EXPORTS.get(dataset)
+    if export is None:
+        return HttpResponseBadRequest(f"Unknown export. Available: {', '.join(EXPORTS)}")
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest(f"Unknown format. Available: {', '.join(FORMATS)}")
+    try:
+        columns = export_columns(export, request.GET.get('columns'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    # An async iterator under ASGI, which would otherwise buffer a sync one whole
+    stream = astream_export if isinstance(request, ASGIRequest) else stream_export
+    response = StreamingHttpResponse(
+        stream(export, columns, export_filters(export, request.GET), fmt),
+        content_type=FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{dataset}-{date.today().isoformat()}.{fmt}"'
+    return response
@@ -0,0 +1,219 @@
+"""Maintained per-organ-type priority order of the waitlist.
+
+Each organ type keeps its Waiting entries in a sorted list keyed by
+(-Priority_Score, Wait_List_Date, Recipient_ID) - the ORDER BY of the waitlist
+page and the active_wait_list view - so the top-k is a slice instead of a
+database sort. Rows are patched per recipient whenever a write names the
+recipients it touched (waitlist add/remove, urgency changes recalculated by
+after_recipient_update, surgeries removing a recipient from every list);
+any other change to the tables marks the queues stale and they are rebuilt on
+the next read. Writes from other processes show up as a version change; as a
+backstop for writes nobody announces (raw SQL, triggers fired from a MySQL
+client) the queues are also rebuilt once they are ``MAX_AGE_SECONDS`` old.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS
+from django.dispatch import receiver
+
+from .models import RecipientWaitlist
+from .pagination import PAGE_SIZE, KeysetPage, decode_cursor, encode_cursor
+from .signals import tables_changed, table_versions
+
+QUEUE_TABLES = ('recipient_waitlist', 'recipient')
+DEFAULT_LIMIT = 100
+MAX_AGE_SECONDS = 300
+
+
+def _sort_key(recipient_id, priority_score, wait_list_date):
+    return (-float(priority_score or 0), wait_list_date.toordinal(), recipient_id)
+
+
+class OrganTypeQueue:
+    """Sorted Waiting entries of one organ type"""
+
+    def __init__(self, organ_type):
+        self.organ_type = organ_type
+        self.keys = []
+        self.by_recipient = {}
+
+    def put(self, recipient_id, priority_score, wait_list_date):
+        self.discard(recipient_id)
+        key = _sort_key(recipient_id, priority_score, wait_list_date)
+        insort(self.keys, key)
+        self.by_recipient[recipient_id] = key
+
+    def discard(self, recipient_id):
+        key = self.by_recipient.pop(recipient_id, None)
+        if key is not None:
+            del self.keys[bisect_left(self.keys, key)]
+
+    def __iter__(self):
+        return self.iter_after()
+
+    def iter_after(self, after=None):
+        """Entries strictly after ``after`` = (key, organ_type) in merged queue order"""
+        start = 0
+        if after is not None:
+            key, organ_type = after
+            start = (bisect_right if self.organ_type <= organ_type else bisect_left)(self.keys, key)
+        return ((self.keys[i], self.organ_type) for i in range(start, len(self.keys)))
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class WaitlistQueues:
+    """All organ type queues plus the table versions they reflect"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._queues = None
+        self._versions = None
+        self._built_at = 0.0
+        self._recipient_types = defaultdict(set)
+        self._inactive_recipients = set()
+
+    def _rows(self, **filters):
+        # The queues outlive the request, so they are always loaded from the primary
+        return RecipientWaitlist.objects.using(DEFAULT_DB_ALIAS).filter(status='Waiting', **filters).values_list(
+            'recipient_id', 'type_name_id', 'priority_score', 'wait_list_date', 'recipient__status'
+        )
+
+    def _put(self, row):
+        recipient_id, organ_type, priority_score, wait_list_date, recipient_status = row
+        queue = self._queues.get(organ_type)
+        if queue is None:
+            queue = self._queues[organ_type] = OrganTypeQueue(organ_type)
+        queue.put(recipient_id, priority_score, wait_list_date)
+        self._recipient_types[recipient_id].add(organ_type)
+        if recipient_status != 'Waiting':
+            self._inactive_recipients.add(recipient_id)
+
+    def _rebuild(self, versions):
+        self._queues = {}
+        self._recipient_types = defaultdict(set)
+        self._inactive_recipients = set()
+        for row in self._rows():
+            self._put(row)
+        self._versions = dict(zip(QUEUE_TABLES, versions))
+        self._built_at = time.monotonic()
+
+    def _ensure_current(self):
+        """Rebuild stale queues; call with ``self._lock`` held, in the same
+        block as the read, so a concurrent apply_change cannot drop them in between"""
+        current = table_versions(*QUEUE_TABLES)
+        if (self._queues is None or tuple(self._versions[t] for t in QUEUE_TABLES) != current
+                or time.monotonic() - self._built_at > MAX_AGE_SECONDS):
+            self._rebuild(current)
+
+    def refresh_recipients(self, recipient_ids):
+        """Reload every waitlist entry of the given recipients"""
+        with self._lock:
+            if self._queues is None:
+                return
+            for recipient_id in recipient_ids:
+                for organ_type in self._recipient_types.pop(recipient_id, ()):
+                    self._queues[organ_type].discard(recipient_id)
+                self._inactive_recipients.discard(recipient_id)
+            for row in self._rows(recipient_id__in=list(recipient_ids)):
+                self._put(row)
+
+    def apply_change(self, versions, recipient_ids):
+        """Patch the queues for a committed write, or mark them stale when the
+        write is not the next one after the versions they reflect"""
+        with self._lock:
+            if self._queues is None:
+                return
+            changed = [t for t in QUEUE_TABLES if t in versions]
+            in_sequence = all(versions[t] == self._versions[t] + 1 for t in changed)
+            if recipient_ids is None or not in_sequence:
+                self._queues = None
+                return
+            self.refresh_recipients(recipient_ids)
+            for table in changed:
+                self._versions[table] = versions[table]
+
+    def page(self, limit=DEFAULT_LIMIT, organ_type=None, after=None, waiting_recipients_only=False):
+        """Highest priority (key, organ_type) entries, starting after ``after``"""
+        with self._lock:
+            self._ensure_current()
+            if organ_type is not None:
+                queue = self._queues.get(organ_type)
+                entries = queue.iter_after(after) if queue else iter(())
+            else:
+                entries = heapq.merge(*(queue.iter_after(after) for queue in self._queues.values()))
+
+            result = []
+            for key, entry_type in entries:
+                if waiting_recipients_only and key[2] in self._inactive_recipients:
+                    continue
+                result.append((key, entry_type))
+                if len(result) >= limit:
+                    break
+            return result
+
+    def top(self, limit=DEFAULT_LIMIT, organ_type=None, waiting_recipients_only=False):
+        """Highest priority (recipient_id, organ_type) pairs"""
+        return [
+            (key[2], entry_type)
+            for key, entry_type in self.page(limit, organ_type, waiting_recipients_only=waiting_recipients_only)
+        ]
+
+    def counts(self):
+        with self._lock:
+            self._ensure_current()
+            return {organ_type: len(queue) for organ_type, queue in self._queues.items()}
+
+
+queues = WaitlistQueues()
+
+
+@receiver(tables_changed)
+def waitlist_tables_changed(sender, tables, versions, recipient_ids=None, **kwargs):
+    if any(table in tables for table in QUEUE_TABLES):
+        queues.apply_change(versions, recipient_ids)
+
+
+def _rows_for(keys):
+    rows = RecipientWaitlist.objects.filter(
+        recipient_id__in={key[2] for key, _ in keys},
+        status='Waiting'
+    ).select_related('recipient', 'type_name')
+    by_key = {(row.recipient_id, row.type_name_id): row for row in rows}
+    return [by_key[(key[2], organ_type)] for key, organ_type in keys if (key[2], organ_type) in by_key]
+
+
+def top_entries(limit=DEFAULT_LIMIT, organ_type=None):
+    """RecipientWaitlist rows for the top of the queue, in queue order"""
+    return _rows_for(queues.page(limit, organ_type))
+
+
+def _decode_queue_cursor(token):
+    values = decode_cursor(token, 5)
+    if values is None:
+        return None, 0
+    priority, wait_ordinal, recipient_id, organ_type, offset = values
+    return ((priority, wait_ordinal, recipient_id), organ_type), offset
+
+
+def queue_page(query_params, organ_type=None, page_size=PAGE_SIZE, waiting_recipients_only=False, rows_for=_rows_for):
+    """Keyset page of the queue; ``rows_for`` turns (key, organ_type) entries into rows.
+
+    The cursor is the last entry's queue key plus its rank, so pages can keep
+    numbering ranks from 1. Forward only - the queue has no reverse iterator.
+    """
+    after, offset = _decode_queue_cursor(query_params.get('after'))
+    entries = queues.page(page_size + 1, organ_type, after, waiting_recipients_only)
+    has_next = len(entries) > page_size
+    entries = entries[:page_size]
+
+    next_cursor = None
+    if has_next:
+        key, entry_type = entries[-1]
+        next_cursor = encode_cursor([*key, entry_type, offset + len(entries)])
+    return KeysetPage(rows_for(entries), query_params, next_cursor=next_cursor, is_first=after is None, offset=offset)
@@ -44,8 +44,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'apps.core.replicas.ReplicaPinMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -78,7 +80,8 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # django.db.backends.mysql with pooled connections (apps/core/db/pool.py)
+        'ENGINE': 'apps.core.db',
         'NAME': 'organ_donation_db',
         'USER': 'root',  # Your MySQL username
         'PASSWORD': 'mahek2310',  # Your MySQL password
@@ -88,10 +91,36 @@ DATABASES = {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'charset': 'utf8mb4',
         },
+        # Per process; keep MAX_SIZE x processes below MySQL's max_connections.
+        # CONN_MAX_AGE stays 0 so every request hands its connection back.
+        'POOL': {
+            'MIN_SIZE': 2,
+            'MAX_SIZE': 20,
+            'MAX_IDLE': 300,     # seconds idle before a connection above MIN_SIZE is closed
+            'CHECK_AFTER': 1,    # seconds idle before a connection is pinged on checkout
+            'TIMEOUT': 10,       # seconds to wait for a free connection
+        },
     }
 }
 
 
+# Read replicas for the report and list pages (apps/core/replicas.py): every
+# alias other than 'default'. To try the routing locally, add a second alias
+# for the same database:
+#
+#   DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+#
+# A real replica's user needs REPLICATION CLIENT for the lag check.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['apps.core.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10     # primary-only reads after a session writes
+REPLICA_MAX_LAG_SECONDS = 5  # replicas further behind are skipped
+
+# Lets Prometheus scrape /metrics with "Authorization: Bearer <token>";
+# without it only Administrators can read the endpoint
+METRICS_TOKEN = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -140,3 +169,27 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Media files (User uploads)  
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Initial offers for new organs: 'inline' (in the recording request) or
+# 'deferred' (background worker after commit) - see apps/core/offers.py
+OFFER_GENERATION = 'inline'
+
+# Shared cache - required, also for a single server process. Besides the
+# sessions it holds the table version counters (apps/core/signals.py) that
+# every in-process cache (matching snapshots, waitlist queues, report and
+# procedure caches, geo and feasibility matrices) compares against, so a write
+# made by another worker or a management command (refresh_priorities,
+# run_expiry_sweeper, load_zip_centroids, ...) is seen everywhere. A
+# per-process cache (LocMemCache) would hide those writes. Run Redis with a
+# maxmemory-policy that never evicts keys without a TTL (noeviction or
+# volatile-lru): the version counters have none.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'KEY_PREFIX': 'organ_donation',
+    }
+}
+
+# Sessions are read from the shared cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
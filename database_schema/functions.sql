@@ -126,8 +126,12 @@ BEGIN
     DECLARE recipient_blood VARCHAR(3);
     DECLARE donor_age INT;
     DECLARE recipient_age INT;
-    DECLARE donor_hla VARCHAR(50);
-    DECLARE recipient_hla VARCHAR(50);
+    DECLARE donor_a BIGINT UNSIGNED DEFAULT 0;
+    DECLARE donor_b BIGINT UNSIGNED DEFAULT 0;
+    DECLARE donor_dr BIGINT UNSIGNED DEFAULT 0;
+    DECLARE recipient_a BIGINT UNSIGNED DEFAULT 0;
+    DECLARE recipient_b BIGINT UNSIGNED DEFAULT 0;
+    DECLARE recipient_dr BIGINT UNSIGNED DEFAULT 0;
     DECLARE blood_score DECIMAL(5,2) DEFAULT 0;
     DECLARE hla_score DECIMAL(5,2) DEFAULT 0;
     DECLARE age_score DECIMAL(5,2) DEFAULT 0;
@@ -139,8 +143,8 @@ BEGIN
     FROM Donor
     WHERE Donor_ID = p_donor_id;
     -- Get recipient information  
-    SELECT Blood_Type, TIMESTAMPDIFF(YEAR, Date_of_Birth, CURDATE())
-    INTO recipient_blood, recipient_age
+    SELECT Blood_Type, TIMESTAMPDIFF(YEAR, Date_of_Birth, CURDATE()), HLA_A_Bits, HLA_B_Bits, HLA_DR_Bits
+    INTO recipient_blood, recipient_age, recipient_a, recipient_b, recipient_dr
     FROM Recipient
     WHERE Recipient_ID = p_recipient_id;
     -- If either donor or recipient not found, return 0
@@ -159,18 +163,23 @@ BEGIN
     ELSE
         SET blood_score = 20.00;
     END IF;
-    -- Calculate HLA Score (25 points max)
-    -- Simplified: Get HLA types from organ (donor HLA) and check similarity
-    SELECT HLA_Type INTO donor_hla
+    -- Calculate HLA Score (15 points max)
+    -- Antigen bitsets per locus (apps/core/hla.py): each donor antigen the
+    -- recipient lacks is a mismatch, 2.5 points off per A/B/DR mismatch
+    SELECT HLA_A_Bits, HLA_B_Bits, HLA_DR_Bits INTO donor_a, donor_b, donor_dr
     FROM Organ
     WHERE Donor_ID = p_donor_id AND Type_Name = p_organ_type
     LIMIT 1;
-    -- Simplified HLA matching (in real system, this would be more complex)
-    -- For now, assume partial match gives 15 points, no data gives 10 points
-    IF donor_hla IS NOT NULL THEN
-        SET hla_score = 15.00;
+    -- Either side not typed at every locus: neutral 7.5 (3 mismatches)
+    IF donor_a = 0 OR donor_b = 0 OR donor_dr = 0
+       OR recipient_a = 0 OR recipient_b = 0 OR recipient_dr = 0 THEN
+        SET hla_score = 7.50;
     ELSE
-        SET hla_score = 10.00;
+        SET hla_score = 15.00 - 2.50 * (
+            BIT_COUNT(donor_a & ~recipient_a) +
+            BIT_COUNT(donor_b & ~recipient_b) +
+            BIT_COUNT(donor_dr & ~recipient_dr)
+        );
     END IF;
     -- Calculate Age Compatibility Score (20 points max)
     -- Closer ages are better
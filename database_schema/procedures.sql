@@ -56,8 +56,8 @@ BEGIN
     -- Urgency level 1-5, multiply by 8 to get 8-40 points
     SET urgency_points = urgency_level * 8;
     -- Calculate wait time points (30% of total, max 30 points)
-    -- 1 point per 30 days waiting, capped at 30 points
-    SET wait_points = LEAST(wait_days / 30, 30);
+    -- 1 point per full 30 days waiting, capped at 30 points
+    SET wait_points = LEAST(GREATEST(FLOOR(wait_days / 30), 0), 30);
     -- Calculate organ-specific points (30% of total, max 30 points)
     IF p_organ_type = 'Liver' AND meld_score IS NOT NULL THEN
         -- MELD score ranges 6-40, normalize to 0-30 points
@@ -73,7 +73,11 @@ BEGIN
     SET new_priority_score = urgency_points + wait_points + organ_specific_points;
     -- UPDATE the waitlist with new priority score
     UPDATE Recipient_Waitlist
-    SET Priority_Score = new_priority_score
+    SET Priority_Score = new_priority_score,
+        Next_Wait_Boundary = CASE
+            WHEN wait_points >= 30 THEN '9999-12-31'
+            ELSE DATE_ADD(Wait_List_Date, INTERVAL (wait_points + 1) * 30 DAY)
+        END
     WHERE Recipient_ID = p_recipient_id AND Type_Name = p_organ_type;
     -- Return the calculated score
     SELECT 
@@ -101,10 +105,12 @@ BEGIN
     DECLARE match_score DECIMAL(5,2);
     -- Start transaction for data consistency
     START TRANSACTION;
-    -- Check if organ exists and is available
+    -- Check if organ exists and is available; the row lock makes concurrent
+    -- calls for the same organ wait here and see the first one's result
     SELECT Status, Type_Name INTO organ_status, organ_type_name
     FROM Organ
-    WHERE Organ_ID = p_organ_id;
+    WHERE Organ_ID = p_organ_id
+    FOR UPDATE;
     IF organ_status IS NULL THEN
         ROLLBACK;
         SELECT 'Error: Organ not found' as Message;
@@ -213,14 +219,29 @@ BEGIN
             ELSE 0.00
         END as Blood_Type_Score,
         
-        -- HLA Score (25 points - simplified)
-        15.00 as HLA_Score,
+        -- HLA Score (15 points, 2.5 off per A/B/DR mismatch; 7.5 when untyped)
+        CASE
+            WHEN o.HLA_A_Bits = 0 OR o.HLA_B_Bits = 0 OR o.HLA_DR_Bits = 0
+              OR r.HLA_A_Bits = 0 OR r.HLA_B_Bits = 0 OR r.HLA_DR_Bits = 0 THEN 7.50
+            ELSE 15.00 - 2.50 * (
+                BIT_COUNT(o.HLA_A_Bits & ~r.HLA_A_Bits) +
+                BIT_COUNT(o.HLA_B_Bits & ~r.HLA_B_Bits) +
+                BIT_COUNT(o.HLA_DR_Bits & ~r.HLA_DR_Bits)
+            )
+        END as HLA_Score,
         
         -- Wait Time Score (20 points max)
         LEAST(DATEDIFF(CURDATE(), wl.Wait_List_Date) / 30, 20) as Wait_Time_Score,
         
-        -- Geographic Score (15 points - simplified)
-        15.00 as Geographic_Score,
+        -- Geographic Score (15/10/5/0 within 250/500/1000 miles of the
+        -- procuring hospital; 7.5 when either hospital is not geocoded)
+        CASE
+            WHEN pz.Zipcode IS NULL OR lz.Zipcode IS NULL THEN 7.50
+            WHEN ST_Distance_Sphere(POINT(pz.Longitude, pz.Latitude), POINT(lz.Longitude, lz.Latitude)) / 1609.344 <= 250 THEN 15.00
+            WHEN ST_Distance_Sphere(POINT(pz.Longitude, pz.Latitude), POINT(lz.Longitude, lz.Latitude)) / 1609.344 <= 500 THEN 10.00
+            WHEN ST_Distance_Sphere(POINT(pz.Longitude, pz.Latitude), POINT(lz.Longitude, lz.Latitude)) / 1609.344 <= 1000 THEN 5.00
+            ELSE 0.00
+        END as Geographic_Score,
         
         -- Urgency Score (10 points)
         r.Medical_Urgency_Level * 2 as Urgency_Score,
@@ -239,9 +260,23 @@ BEGIN
                 WHEN r.Blood_Type = 'AB+' THEN 20.00
                 ELSE 0.00
             END +
-            15.00 +  -- HLA
+            CASE
+                WHEN o.HLA_A_Bits = 0 OR o.HLA_B_Bits = 0 OR o.HLA_DR_Bits = 0
+                  OR r.HLA_A_Bits = 0 OR r.HLA_B_Bits = 0 OR r.HLA_DR_Bits = 0 THEN 7.50
+                ELSE 15.00 - 2.50 * (
+                    BIT_COUNT(o.HLA_A_Bits & ~r.HLA_A_Bits) +
+                    BIT_COUNT(o.HLA_B_Bits & ~r.HLA_B_Bits) +
+                    BIT_COUNT(o.HLA_DR_Bits & ~r.HLA_DR_Bits)
+                )
+            END +  -- HLA
             LEAST(DATEDIFF(CURDATE(), wl.Wait_List_Date) / 30, 20) +  -- Wait time
-            15.00 +  -- Geographic
+            CASE
+                WHEN pz.Zipcode IS NULL OR lz.Zipcode IS NULL THEN 7.50
+                WHEN ST_Distance_Sphere(POINT(pz.Longitude, pz.Latitude), POINT(lz.Longitude, lz.Latitude)) / 1609.344 <= 250 THEN 15.00
+                WHEN ST_Distance_Sphere(POINT(pz.Longitude, pz.Latitude), POINT(lz.Longitude, lz.Latitude)) / 1609.344 <= 500 THEN 10.00
+                WHEN ST_Distance_Sphere(POINT(pz.Longitude, pz.Latitude), POINT(lz.Longitude, lz.Latitude)) / 1609.344 <= 1000 THEN 5.00
+                ELSE 0.00
+            END +  -- Geographic
             (r.Medical_Urgency_Level * 2)  -- Urgency
         ) as Total_Match_Score
         
@@ -249,6 +284,10 @@ BEGIN
     JOIN Donor d ON o.Donor_ID = d.Donor_ID
     JOIN Recipient_Waitlist wl ON wl.Type_Name = o.Type_Name
     JOIN Recipient r ON r.Recipient_ID = wl.Recipient_ID
+    LEFT JOIN Hospital ph ON ph.Hospital_ID = o.Procuring_Hospital_ID
+    LEFT JOIN Zip_Centroid pz ON pz.Zipcode = LEFT(ph.Zipcode, 5)
+    LEFT JOIN Hospital lh ON lh.Hospital_ID = r.Listing_Hospital_ID
+    LEFT JOIN Zip_Centroid lz ON lz.Zipcode = LEFT(lh.Zipcode, 5)
     WHERE o.Organ_ID = p_organ_id
       AND wl.Status = 'Waiting'
       AND r.Status = 'Waiting'
@@ -275,4 +314,82 @@ BEGIN
     
 END$$
 
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
+
+-- =====================================================
+-- Wait-time rollup maintenance (Wait_Time_Rollup in schema.sql)
+-- Called by the Recipient_Waitlist and Recipient triggers. A NULL blood type
+-- means the recipient is not Waiting, so the entry is not counted.
+-- =====================================================
+DELIMITER //
+CREATE PROCEDURE WaitRollupAdd(IN p_type VARCHAR(30), IN p_blood VARCHAR(3), IN p_date DATE)
+BEGIN
+    IF p_blood IS NOT NULL THEN
+        INSERT INTO Wait_Time_Rollup (Type_Name, Blood_Type, Recipient_Count, Wait_List_Day_Sum, Min_Wait_List_Date, Max_Wait_List_Date)
+        VALUES (p_type, p_blood, 1, TO_DAYS(p_date), p_date, p_date)
+        ON DUPLICATE KEY UPDATE
+            Recipient_Count = Recipient_Count + 1,
+            Wait_List_Day_Sum = Wait_List_Day_Sum + TO_DAYS(p_date),
+            Min_Wait_List_Date = LEAST(COALESCE(Min_Wait_List_Date, p_date), p_date),
+            Max_Wait_List_Date = GREATEST(COALESCE(Max_Wait_List_Date, p_date), p_date);
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE PROCEDURE WaitRollupRemove(IN p_type VARCHAR(30), IN p_blood VARCHAR(3), IN p_date DATE)
+BEGIN
+    IF p_blood IS NOT NULL THEN
+        UPDATE Wait_Time_Rollup
+        SET Recipient_Count = Recipient_Count - 1,
+            Wait_List_Day_Sum = Wait_List_Day_Sum - TO_DAYS(p_date)
+        WHERE Type_Name = p_type AND Blood_Type = p_blood;
+        -- The extremes only move when the removed entry was one of them; the
+        -- replacement is the first match walking idx_waitlist_type_status_date
+        UPDATE Wait_Time_Rollup
+        SET Min_Wait_List_Date = (
+                SELECT wl.Wait_List_Date
+                FROM Recipient_Waitlist wl
+                JOIN Recipient r ON r.Recipient_ID = wl.Recipient_ID
+                WHERE wl.Type_Name = p_type AND wl.Status = 'Waiting'
+                  AND r.Blood_Type = p_blood AND r.Status = 'Waiting'
+                ORDER BY wl.Wait_List_Date ASC
+                LIMIT 1
+            ),
+            Max_Wait_List_Date = (
+                SELECT wl.Wait_List_Date
+                FROM Recipient_Waitlist wl
+                JOIN Recipient r ON r.Recipient_ID = wl.Recipient_ID
+                WHERE wl.Type_Name = p_type AND wl.Status = 'Waiting'
+                  AND r.Blood_Type = p_blood AND r.Status = 'Waiting'
+                ORDER BY wl.Wait_List_Date DESC
+                LIMIT 1
+            )
+        WHERE Type_Name = p_type AND Blood_Type = p_blood
+          AND (Min_Wait_List_Date = p_date OR Max_Wait_List_Date = p_date);
+    END IF;
+END //
+DELIMITER ;
+
+-- Recompute the whole rollup (initial fill, or after bulk changes that bypass
+-- triggers such as ON DELETE CASCADE from Recipient)
+DELIMITER //
+CREATE PROCEDURE RebuildWaitTimeRollup()
+BEGIN
+    DELETE FROM Wait_Time_Rollup;
+    INSERT INTO Wait_Time_Rollup (Type_Name, Blood_Type, Recipient_Count, Wait_List_Day_Sum, Min_Wait_List_Date, Max_Wait_List_Date)
+    SELECT
+        wl.Type_Name,
+        r.Blood_Type,
+        COUNT(*),
+        SUM(TO_DAYS(wl.Wait_List_Date)),
+        MIN(wl.Wait_List_Date),
+        MAX(wl.Wait_List_Date)
+    FROM Recipient_Waitlist wl
+    JOIN Recipient r ON r.Recipient_ID = wl.Recipient_ID
+    WHERE wl.Status = 'Waiting' AND r.Status = 'Waiting'
+    GROUP BY wl.Type_Name, r.Blood_Type;
+END //
+DELIMITER ;
+
+CALL RebuildWaitTimeRollup();
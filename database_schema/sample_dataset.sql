@@ -165,6 +165,26 @@ INSERT INTO Organ (Type_Name, Donor_ID, HLA_Type, Procurement_Date, Procurement_
 ('Kidney', 7, 'A1-B35-DR3', CURDATE(), '14:00:00', 148.00, 'Available'),  -- B- kidney
 ('Heart', 1, 'A2-B8-DR7', CURDATE(), '10:30:00', 305.50, 'Available');    -- O+ heart
 
+-- =====================================================
+-- 11. LOCATIONS (zip centroids; recipients listed and organs procured
+-- at the hospital in their city)
+-- =====================================================
+INSERT INTO Zip_Centroid (Zipcode, Latitude, Longitude) VALUES
+('02114', 42.361200, -71.068300),
+('21287', 39.297500, -76.592700),
+('55905', 44.022000, -92.466300),
+('44195', 41.502000, -81.621000),
+('90095', 34.068900, -118.445200);
+
+UPDATE Recipient r
+JOIN Hospital h ON r.Contact_Info = CONCAT(h.City, ' ', h.State)
+SET r.Listing_Hospital_ID = h.Hospital_ID;
+
+UPDATE Organ o
+JOIN Donor d ON o.Donor_ID = d.Donor_ID
+JOIN Hospital h ON d.Contact_Info = CONCAT(h.City, ' ', h.State)
+SET o.Procuring_Hospital_ID = h.Hospital_ID;
+
 -- =====================================================
 -- VERIFICATION
 -- =====================================================
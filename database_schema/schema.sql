@@ -280,3 +280,102 @@ ADD CONSTRAINT fk_recipient_user
 FOREIGN KEY (User_ID) REFERENCES User(User_ID)
     ON DELETE SET NULL
     ON UPDATE CASCADE;
+
+-- Priority refresh bookkeeping: the date an entry's wait-time points next
+-- increase (every 30 days). NULL = never refreshed, 9999-12-31 = points capped.
+ALTER TABLE Recipient_Waitlist
+ADD COLUMN Next_Wait_Boundary DATE;
+
+ALTER TABLE Recipient_Waitlist
+ADD INDEX idx_waitlist_next_boundary (Status, Next_Wait_Boundary);
+
+-- Viability deadline: procurement datetime + the organ type's Typical_Viability_Hours,
+-- kept by the before_organ_insert / before_organ_update / after_organ_type_update
+-- triggers. Stored in server time like Procurement_Date/Time, so compare it with NOW().
+ALTER TABLE Organ
+ADD COLUMN Viability_Expires_At DATETIME;
+
+ALTER TABLE Organ
+ADD INDEX idx_organ_status_expires (Status, Viability_Expires_At);
+
+UPDATE Organ o
+JOIN Organ_Type ot ON o.Type_Name = ot.Type_Name
+SET o.Viability_Expires_At = TIMESTAMP(o.Procurement_Date, o.Procurement_Time) + INTERVAL ot.Typical_Viability_Hours HOUR;
+
+-- Expiry sweeper (apps/core/expiry.py): next Pending allocation to lapse
+ALTER TABLE Organ_Allocation
+ADD INDEX idx_allocation_status_deadline (Status, Response_Deadline);
+
+-- Keyset pagination (apps/core/pagination.py): one index per list page sort
+-- key. InnoDB appends the primary key, which is each ordering's tie-breaker.
+ALTER TABLE Donor
+ADD INDEX idx_donor_registration (Registration_Date DESC);
+
+ALTER TABLE Recipient
+ADD INDEX idx_recipient_urgency_registration (Medical_Urgency_Level DESC, Registration_Date DESC);
+
+ALTER TABLE Organ_Allocation
+ADD INDEX idx_allocation_date (Allocation_Date);
+
+ALTER TABLE Surgery
+ADD INDEX idx_surgery_date (Surgery_Date);
+
+ALTER TABLE Follow_Up_Appointment
+ADD INDEX idx_followup_appointment (Appointment_Date, Appointment_Time);
+
+-- Wait-time rollup (waiting_time_analysis): Waiting entries of Waiting
+-- recipients per (organ type, recipient blood type), kept current by the
+-- Recipient_Waitlist and Recipient triggers. Wait days are derived at read
+-- time: average = TO_DAYS(CURDATE()) - Wait_List_Day_Sum / Recipient_Count.
+-- Filled by RebuildWaitTimeRollup (procedures.sql).
+CREATE TABLE Wait_Time_Rollup (
+    Type_Name VARCHAR(30) NOT NULL,
+    Blood_Type VARCHAR(3) NOT NULL,
+    Recipient_Count INT NOT NULL DEFAULT 0,
+    Wait_List_Day_Sum BIGINT NOT NULL DEFAULT 0,
+    Min_Wait_List_Date DATE,
+    Max_Wait_List_Date DATE,
+    PRIMARY KEY (Type_Name, Blood_Type),
+    FOREIGN KEY (Type_Name) REFERENCES Organ_Type(Type_Name) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- Next oldest/newest Waiting entry of a type when a rollup extreme is removed
+ALTER TABLE Recipient_Waitlist
+ADD INDEX idx_waitlist_type_status_date (Type_Name, Status, Wait_List_Date);
+
+-- Incompatible-pair probe of MatchOrganToRecipients' NOT EXISTS (the web app
+-- keeps these pairs in memory, apps/core/exclusions.py)
+ALTER TABLE Compatibility_Test
+ADD INDEX idx_compat_donor_recipient_result (Donor_ID, Recipient_ID, Test_Result);
+
+-- HLA typings as per-locus antigen bitsets (apps/core/hla.py), written with
+-- HLA_Type by the application; 0 = locus not typed. Existing rows are filled
+-- by `python manage.py encode_hla`.
+ALTER TABLE Organ
+ADD COLUMN HLA_A_Bits BIGINT UNSIGNED NOT NULL DEFAULT 0,
+ADD COLUMN HLA_B_Bits BIGINT UNSIGNED NOT NULL DEFAULT 0,
+ADD COLUMN HLA_DR_Bits BIGINT UNSIGNED NOT NULL DEFAULT 0;
+
+ALTER TABLE Recipient
+ADD COLUMN HLA_Type VARCHAR(50),
+ADD COLUMN HLA_A_Bits BIGINT UNSIGNED NOT NULL DEFAULT 0,
+ADD COLUMN HLA_B_Bits BIGINT UNSIGNED NOT NULL DEFAULT 0,
+ADD COLUMN HLA_DR_Bits BIGINT UNSIGNED NOT NULL DEFAULT 0;
+
+-- Geographic matching (apps/core/geo.py): hospitals are located by the
+-- centroid of their 5-digit zipcode, organs at their procuring hospital and
+-- recipients at their listing hospital. Zip_Centroid is filled by
+-- `python manage.py load_zip_centroids <Census ZCTA gazetteer file>`.
+CREATE TABLE Zip_Centroid (
+    Zipcode CHAR(5) PRIMARY KEY,
+    Latitude DECIMAL(9,6) NOT NULL,
+    Longitude DECIMAL(9,6) NOT NULL
+);
+
+ALTER TABLE Organ
+ADD COLUMN Procuring_Hospital_ID INT NULL,
+ADD FOREIGN KEY (Procuring_Hospital_ID) REFERENCES Hospital(Hospital_ID) ON DELETE SET NULL;
+
+ALTER TABLE Recipient
+ADD COLUMN Listing_Hospital_ID INT NULL,
+ADD FOREIGN KEY (Listing_Hospital_ID) REFERENCES Hospital(Hospital_ID) ON DELETE SET NULL;
@@ -25,54 +25,20 @@ BEGIN
         SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'Error: Donor has no medical clearance date';
     END IF;
-    -- All validations passed - organ will be inserted
+    -- All validations passed - stamp the viability deadline
+    SET NEW.Viability_Expires_At = (
+        SELECT TIMESTAMP(NEW.Procurement_Date, NEW.Procurement_Time) + INTERVAL Typical_Viability_Hours HOUR
+        FROM Organ_Type
+        WHERE Type_Name = NEW.Type_Name
+    );
 END //
 DELIMITER ;
 
 -- after organ insert
-DELIMITER //
-CREATE TRIGGER after_organ_insert
-AFTER INSERT ON Organ
-FOR EACH ROW
-BEGIN
-    -- Automatically create allocation offers for top 3 matched recipients
-    -- This uses a temporary table to store matching results
-    -- Insert allocation offers for top matches
-    INSERT INTO Organ_Allocation (Organ_ID, Recipient_ID, Allocation_Date, Match_Score, Status, Response_Deadline)
-    SELECT 
-        NEW.Organ_ID,
-        r.Recipient_ID,
-        NOW(),
-        -- Calculate match score
-        CASE 
-            WHEN CheckBloodTypeCompatibility(d.Blood_Type, r.Blood_Type) = FALSE THEN 0
-            ELSE (
-                CASE WHEN d.Blood_Type = r.Blood_Type THEN 30.00 ELSE 20.00 END +
-                15.00 +
-                LEAST(CalculateWaitTimeDays(r.Recipient_ID, NEW.Type_Name) / 30, 20) +
-                15.00 +
-                r.Medical_Urgency_Level * 2
-            )
-        END as match_score,
-        'Pending',
-        DATE_ADD(NOW(), INTERVAL (GetRemainingViableHours(NEW.Organ_ID) * 0.5) HOUR)
-    FROM Recipient r
-    JOIN Recipient_Waitlist wl ON r.Recipient_ID = wl.Recipient_ID
-    JOIN Donor d ON d.Donor_ID = NEW.Donor_ID
-    WHERE wl.Type_Name = NEW.Type_Name
-      AND wl.Status = 'Waiting'
-      AND r.Status = 'Waiting'
-      AND CheckBloodTypeCompatibility(d.Blood_Type, r.Blood_Type) = TRUE
-      AND NOT EXISTS (
-          SELECT 1 FROM Compatibility_Test ct
-          WHERE ct.Donor_ID = NEW.Donor_ID
-            AND ct.Recipient_ID = r.Recipient_ID
-            AND ct.Test_Result = 'Incompatible'
-      )
-    ORDER BY match_score DESC
-    LIMIT 3;
-END //
-DELIMITER ;
+-- Initial offers for the top 3 matches are created by the application
+-- (apps/core/matching.py create_initial_offers) so they are ranked by the same
+-- scoring as the match and allocation pages. Drop the old trigger if present.
+DROP TRIGGER IF EXISTS after_organ_insert;
 
 -- before organ update
 DELIMITER //
@@ -90,6 +56,31 @@ BEGIN
         SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'Error: Cannot revert expired organ to available status';
     END IF;
+    -- Re-stamp the viability deadline when procurement or type changes
+    IF NOT (NEW.Procurement_Date <=> OLD.Procurement_Date)
+       OR NOT (NEW.Procurement_Time <=> OLD.Procurement_Time)
+       OR NOT (NEW.Type_Name <=> OLD.Type_Name) THEN
+        SET NEW.Viability_Expires_At = (
+            SELECT TIMESTAMP(NEW.Procurement_Date, NEW.Procurement_Time) + INTERVAL Typical_Viability_Hours HOUR
+            FROM Organ_Type
+            WHERE Type_Name = NEW.Type_Name
+        );
+    END IF;
+END //
+DELIMITER ;
+
+-- after organ type update
+DELIMITER //
+CREATE TRIGGER after_organ_type_update
+AFTER UPDATE ON Organ_Type
+FOR EACH ROW
+BEGIN
+    -- Move every organ of this type to the new viability deadline
+    IF NOT (NEW.Typical_Viability_Hours <=> OLD.Typical_Viability_Hours) THEN
+        UPDATE Organ
+        SET Viability_Expires_At = TIMESTAMP(Procurement_Date, Procurement_Time) + INTERVAL NEW.Typical_Viability_Hours HOUR
+        WHERE Type_Name = NEW.Type_Name;
+    END IF;
 END //
 DELIMITER ;
 
@@ -108,8 +99,8 @@ BEGIN
         SET Priority_Score = (
             -- Urgency points (40%)
             (NEW.Medical_Urgency_Level * 8) +
-            -- Wait time points (30%)
-            LEAST(CalculateWaitTimeDays(NEW.Recipient_ID, Type_Name) / 30, 30) +
+            -- Wait time points (30%): 1 per full 30 days
+            LEAST(GREATEST(FLOOR(DATEDIFF(CURDATE(), Wait_List_Date) / 30), 0), 30) +
             -- Organ-specific points (30%)
             CASE 
                 WHEN Type_Name = 'Liver' AND MELD_Score IS NOT NULL THEN
@@ -119,10 +110,104 @@ BEGIN
                 ELSE
                     15
             END
-        )
+        ),
+        Next_Wait_Boundary = CASE
+            WHEN FLOOR(DATEDIFF(CURDATE(), Wait_List_Date) / 30) >= 30 THEN '9999-12-31'
+            ELSE DATE_ADD(Wait_List_Date, INTERVAL (GREATEST(FLOOR(DATEDIFF(CURDATE(), Wait_List_Date) / 30), 0) + 1) * 30 DAY)
+        END
         WHERE Recipient_ID = NEW.Recipient_ID
           AND Status = 'Waiting';
     END IF;
+    -- Move this recipient's Waiting entries in Wait_Time_Rollup when their
+    -- status or blood type changes
+    IF NOT (OLD.Status <=> NEW.Status) OR NOT (OLD.Blood_Type <=> NEW.Blood_Type) THEN
+        BEGIN
+            DECLARE done INT DEFAULT FALSE;
+            DECLARE v_type VARCHAR(30);
+            DECLARE v_date DATE;
+            DECLARE entries CURSOR FOR
+                SELECT Type_Name, Wait_List_Date
+                FROM Recipient_Waitlist
+                WHERE Recipient_ID = NEW.Recipient_ID
+                  AND Status = 'Waiting';
+            DECLARE CONTINUE HANDLER FOR NOT FOUND SET done = TRUE;
+            OPEN entries;
+            entry_loop: LOOP
+                FETCH entries INTO v_type, v_date;
+                IF done THEN
+                    LEAVE entry_loop;
+                END IF;
+                IF OLD.Status = 'Waiting' THEN
+                    CALL WaitRollupRemove(v_type, OLD.Blood_Type, v_date);
+                END IF;
+                IF NEW.Status = 'Waiting' THEN
+                    CALL WaitRollupAdd(v_type, NEW.Blood_Type, v_date);
+                END IF;
+            END LOOP;
+            CLOSE entries;
+        END;
+    END IF;
+END //
+DELIMITER ;
+
+-- Wait-time rollup: Waiting entries of Waiting recipients by organ type and
+-- recipient blood type (Wait_Time_Rollup in schema.sql). The blood type is
+-- looked up only for Waiting recipients; NULL makes the call a no-op.
+DELIMITER //
+CREATE TRIGGER after_waitlist_insert
+AFTER INSERT ON Recipient_Waitlist
+FOR EACH ROW
+BEGIN
+    IF NEW.Status = 'Waiting' THEN
+        CALL WaitRollupAdd(
+            NEW.Type_Name,
+            (SELECT Blood_Type FROM Recipient WHERE Recipient_ID = NEW.Recipient_ID AND Status = 'Waiting'),
+            NEW.Wait_List_Date
+        );
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER after_waitlist_update
+AFTER UPDATE ON Recipient_Waitlist
+FOR EACH ROW
+BEGIN
+    -- Priority refreshes rewrite every row; only these columns matter here
+    IF NOT (OLD.Status <=> NEW.Status)
+       OR NOT (OLD.Wait_List_Date <=> NEW.Wait_List_Date)
+       OR NOT (OLD.Type_Name <=> NEW.Type_Name)
+       OR NOT (OLD.Recipient_ID <=> NEW.Recipient_ID) THEN
+        IF OLD.Status = 'Waiting' THEN
+            CALL WaitRollupRemove(
+                OLD.Type_Name,
+                (SELECT Blood_Type FROM Recipient WHERE Recipient_ID = OLD.Recipient_ID AND Status = 'Waiting'),
+                OLD.Wait_List_Date
+            );
+        END IF;
+        IF NEW.Status = 'Waiting' THEN
+            CALL WaitRollupAdd(
+                NEW.Type_Name,
+                (SELECT Blood_Type FROM Recipient WHERE Recipient_ID = NEW.Recipient_ID AND Status = 'Waiting'),
+                NEW.Wait_List_Date
+            );
+        END IF;
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER after_waitlist_delete
+AFTER DELETE ON Recipient_Waitlist
+FOR EACH ROW
+BEGIN
+    IF OLD.Status = 'Waiting' THEN
+        CALL WaitRollupRemove(
+            OLD.Type_Name,
+            (SELECT Blood_Type FROM Recipient WHERE Recipient_ID = OLD.Recipient_ID AND Status = 'Waiting'),
+            OLD.Wait_List_Date
+        );
+    END IF;
 END //
 DELIMITER ;
 
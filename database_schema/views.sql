@@ -58,11 +58,12 @@ SELECT
     o.Procurement_Date,
     o.Procurement_Time,
     CONCAT(o.Procurement_Date, ' ', o.Procurement_Time) as Procurement_DateTime,
-    GetRemainingViableHours(o.Organ_ID) as Hours_Remaining,
+    o.Viability_Expires_At,
+    ROUND(TIMESTAMPDIFF(MINUTE, NOW(), o.Viability_Expires_At) / 60, 2) as Hours_Remaining,
     CASE 
-        WHEN GetRemainingViableHours(o.Organ_ID) < 0 THEN 'Expired'
-        WHEN GetRemainingViableHours(o.Organ_ID) < 2 THEN 'Critical'
-        WHEN GetRemainingViableHours(o.Organ_ID) <= 6 THEN 'Urgent'
+        WHEN o.Viability_Expires_At < NOW() THEN 'Expired'
+        WHEN o.Viability_Expires_At < NOW() + INTERVAL 2 HOUR THEN 'Critical'
+        WHEN o.Viability_Expires_At <= NOW() + INTERVAL 6 HOUR THEN 'Urgent'
         ELSE 'Normal'
     END as Viability_Status,
     o.HLA_Type,
@@ -72,12 +73,12 @@ SELECT
     d.Blood_Type as Donor_Blood_Type,
     d.Donor_Type,
     ot.Typical_Viability_Hours as Max_Viability_Hours,
-    ROUND((GetRemainingViableHours(o.Organ_ID) / ot.Typical_Viability_Hours) * 100, 2) as Viability_Percentage
+    ROUND((TIMESTAMPDIFF(MINUTE, NOW(), o.Viability_Expires_At) / 60 / ot.Typical_Viability_Hours) * 100, 2) as Viability_Percentage
 FROM Organ o
 JOIN Donor d ON o.Donor_ID = d.Donor_ID
 JOIN Organ_Type ot ON o.Type_Name = ot.Type_Name
 WHERE o.Status IN ('Available', 'Allocated')
-ORDER BY GetRemainingViableHours(o.Organ_ID) ASC;
+ORDER BY o.Viability_Expires_At ASC;
 
 -- =====================================================
 -- VIEW 3: transplant_success_rate_by_hospital (lowercase)